@@ -16,6 +16,7 @@ import pytest
 from respy.config import ROOT_DIR
 from respy.interface import get_example_model  # noqa: F401
 from respy.interface import get_parameter_constraints  # noqa: F401
+from respy.likelihood import get_crit_and_grad_func  # noqa: F401
 from respy.likelihood import get_crit_func  # noqa: F401
 from respy.method_of_simulated_moments import get_diag_weighting_matrix  # noqa: F401
 from respy.method_of_simulated_moments import get_flat_moments  # noqa: F401
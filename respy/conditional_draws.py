@@ -3,6 +3,7 @@ import numpy as np
 from estimagic.optimization.utilities import robust_cholesky
 from numba import guvectorize
 
+from respy.config import ESTIMATION_DRAWS_CHUNK_SIZE
 from respy.config import MAX_FLOAT
 from respy.config import MAX_LOG_FLOAT
 
@@ -30,8 +31,10 @@ def create_draws_and_log_prob_wages(
         Array with shape (n_obs * n_types, n_choices) containing systematic wages. Can
         contain numpy.nan or any number for non-wage choices. The non-wage choices only
         have to be there to not raise index errors.
-    base_draws : numpy.ndarray
-        Array with shape (n_draws, n_choices) with standard normal random variables.
+    base_draws : numpy.ndarray or respy.shared.CounterBasedDraws
+        Array with shape (n_obs * n_types, n_draws, n_choices) with standard normal
+        random variables. Counter-based draws are generated for chunks of observations
+        and are never held in memory for all observations.
     choices : numpy.ndarray
         Array with shape (n_obs * n_types,) containing observed choices. Is used to
         select columns of systematic wages. Therefore it has to be coded starting at
@@ -57,8 +60,70 @@ def create_draws_and_log_prob_wages(
         of the observed wages, correcting for measurement error if necessary.
 
     """
-    n_obs, n_choices = wages_systematic.shape
+    n_obs = wages_systematic.shape[0]
+
+    (
+        updated_means,
+        updated_chols,
+        chol_indices,
+        log_prob_wages,
+    ) = create_conditional_distribution_and_log_prob_wages(
+        log_wage_observed,
+        wages_systematic,
+        choices,
+        shocks_cholesky,
+        n_wages,
+        meas_sds,
+        has_meas_error,
+    )
+
+    draws = np.empty((n_obs, *base_draws.shape[1:]))
+    for start in range(0, n_obs, ESTIMATION_DRAWS_CHUNK_SIZE):
+        chunk = slice(start, start + ESTIMATION_DRAWS_CHUNK_SIZE)
+        calculate_conditional_draws(
+            np.asarray(base_draws[chunk]),
+            updated_means[chunk],
+            updated_chols,
+            chol_indices[chunk],
+            MAX_LOG_FLOAT,
+            draws[chunk],
+        )
+
+    return draws, log_prob_wages
+
+
+def create_conditional_distribution_and_log_prob_wages(
+    log_wage_observed,
+    wages_systematic,
+    choices,
+    shocks_cholesky,
+    n_wages,
+    meas_sds,
+    has_meas_error,
+):
+    """Evaluate likelihood of observed wages and update the distribution of shocks.
 
+    The conditional draws of an observation are ``updated_means[i] + base_draws[i] @
+    updated_chols[chol_indices[i]].T`` where the wage shocks are exponentiated. See
+    :func:`create_draws_and_log_prob_wages` for the parameters.
+
+    Returns
+    -------
+    updated_means : numpy.ndarray
+        Array with shape (n_obs * n_types, n_choices) containing the means of the shocks
+        conditional on the observed wages.
+    updated_chols : numpy.ndarray
+        Array with shape (n_wages + 1, n_choices, n_choices) containing the Cholesky
+        factors of the conditional covariance matrices. The last factor is used if no
+        wage is observed.
+    chol_indices : numpy.ndarray
+        Array with shape (n_obs * n_types,) containing the index of the relevant
+        Cholesky factor.
+    log_prob_wages : numpy.ndarray
+        Array with shape (n_obs * n_types,) containing the unconditional log likelihood
+        of the observed wages, correcting for measurement error if necessary.
+
+    """
     choices = choices.astype(np.uint16)
     relevant_systematic_wages = np.choose(choices, wages_systematic.T)
     log_wage_systematic = np.log(
@@ -78,11 +143,8 @@ def create_draws_and_log_prob_wages(
         updated_chols = update_cholcov(shocks_cholesky, n_wages)
 
     chol_indices = np.where(np.isfinite(log_wage_observed), choices, n_wages)
-    draws = calculate_conditional_draws(
-        base_draws, updated_means, updated_chols, chol_indices, MAX_LOG_FLOAT
-    )
 
-    return draws, log_prob_wages
+    return updated_means, updated_chols, chol_indices, log_prob_wages
 
 
 @guvectorize(
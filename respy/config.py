@@ -29,12 +29,15 @@ message.
 INADMISSIBILITY_PENALTY = -400_000
 """int : Penalty for choosing an inadmissible state.
 
-The penalty is applied to the non-pecuniary reward of choice which cannot be taken.
+The penalty is applied to the non-pecuniary reward of choice which cannot be taken. If
+``options["skip_inadmissible_choices"]`` is true, the penalty has no effect because the
+solution, the simulation and the likelihood ignore inadmissible choices.
 
 See Also
 --------
 respy.pre_processing.model_processing._parse_inadmissibility_penalty
 respy.state_space._create_is_inadmissible
+respy.state_space._warn_if_inadmissibility_penalty_is_missing
 respy.solve._create_choice_rewards
 
 """
@@ -53,6 +56,44 @@ dimension.
 
 """
 
+STATE_SPACE_CACHE_MAXSIZE = 8
+"""int : Maximum number of state spaces kept in the cache.
+
+The structural components of a state space like the core state space, the indexer and
+the indices of child states are cached across solve, simulate and criterion functions.
+If more models are created, the least recently used state space is evicted.
+
+See Also
+--------
+respy.state_space.get_state_space_structure
+
+"""
+
+CLARK_CHUNK_SIZE = 1024
+"""int : Number of states processed together by Clark's approximation.
+
+The approximation of the expected value functions with Clark's method needs temporary
+arrays for every state. The arrays are allocated once per chunk of states and chunks are
+processed in parallel.
+
+See Also
+--------
+respy.solve._calculate_expected_value_functions_with_clark
+
+"""
+
+ESTIMATION_DRAWS_CHUNK_SIZE = 4096
+"""int : Number of observations for which conditional draws are created together.
+
+If the base draws of the estimation are generated on demand, only the base draws of one
+chunk of observations are held in memory.
+
+See Also
+--------
+respy.shared.CounterBasedDraws
+
+"""
+
 # Some assert functions take rtol instead of decimals
 TOL_REGRESSION_TESTS = 1e-10
 
@@ -62,13 +103,22 @@ DEFAULT_OPTIONS = {
     "estimation_draws": 200,
     "estimation_seed": 1,
     "estimation_tau": 500,
+    "estimation_chunk_size": None,
+    "estimation_n_jobs": 1,
     "interpolation_points": -1,
     "simulation_agents": 1000,
     "simulation_seed": 2,
     "solution_draws": 200,
     "solution_seed": 3,
+    "solution_incremental": False,
+    "solution_integration": "monte_carlo",
+    "solution_quadrature_order": 2,
+    "solution_control_variate": False,
+    "solution_adaptive_tolerance": None,
+    "solution_adaptive_block_size": 25,
     "core_state_space_filters": [],
     "inadmissible_states": {},
+    "skip_inadmissible_choices": False,
     "monte_carlo_sequence": "sobol",
 }
 
@@ -0,0 +1,459 @@
+"""Compile formulas of the model specification.
+
+Filters of the core state space, inadmissible states and covariates are defined by the
+user as strings which have been evaluated with :meth:`pandas.DataFrame.eval`. Every
+call goes through the expression parser of pandas and allocates temporary arrays for
+each operation.
+
+This module parses the formulas once and translates them to Python code.
+
+- Filters and inadmissible states are boolean predicates which are evaluated once
+  on large state spaces. All predicates are compiled into a single numba function
+  which evaluates every formula in one pass over the states.
+- Covariates are evaluated many times on data of different sizes, e.g., the dense
+  state space grid or the simulated individuals in every period. They are translated
+  into one vectorized function operating on NumPy arrays which evaluates the
+  covariates in order. The function is available without the compilation latency of
+  numba.
+
+The compiled functions are cached for each combination of formulas and variables.
+Formulas which cannot be translated, e.g., because they contain function calls or
+membership tests, are evaluated with pandas as before.
+
+This module must not import from respy itself to prevent circular imports.
+
+"""
+import ast
+import functools
+import io
+import tokenize
+
+import numba as nb
+import numpy as np
+import pandas as pd
+
+
+_BOOLEAN_OPERATORS = {"&": "and", "|": "or"}
+"""dict: Replacements for ``&`` and ``|`` which mimic the precedence in pandas."""
+
+_BINARY_OPERATORS = {
+    ast.Add: "+",
+    ast.Sub: "-",
+    ast.Mult: "*",
+    ast.Div: "/",
+    ast.FloorDiv: "//",
+    ast.Mod: "%",
+    ast.Pow: "**",
+}
+
+_COMPARISON_OPERATORS = {
+    ast.Eq: "==",
+    ast.NotEq: "!=",
+    ast.Lt: "<",
+    ast.LtE: "<=",
+    ast.Gt: ">",
+    ast.GtE: ">=",
+}
+
+
+def parse_formula(formula):
+    """Parse a formula to an abstract syntax tree.
+
+    As in :func:`pandas.eval`, ``&`` and ``|`` are interpreted as ``and`` and ``or``
+    and have a lower precedence than comparisons.
+
+    Parameters
+    ----------
+    formula : str
+        Formula like ``"period > 0 and exp_a == 0"``.
+
+    Returns
+    -------
+    node : ast.expr
+        The root node of the expression.
+
+    Examples
+    --------
+    >>> node = parse_formula("period > 0 & exp_a == 0")
+    >>> type(node).__name__
+    'BoolOp'
+
+    """
+    tokens = []
+    for token in tokenize.generate_tokens(io.StringIO(formula.strip()).readline):
+        if token.type == tokenize.OP and token.string in _BOOLEAN_OPERATORS:
+            tokens.append((tokenize.NAME, _BOOLEAN_OPERATORS[token.string]))
+        else:
+            tokens.append((token.type, token.string))
+
+    node = ast.parse(tokenize.untokenize(tokens), mode="eval").body
+
+    return node
+
+
+@functools.lru_cache(maxsize=None)
+def get_variables_in_formula(formula):
+    """Get the names of all variables in a formula.
+
+    Examples
+    --------
+    >>> get_variables_in_formula("period > 0 and exp_a + exp_b == period")
+    ('exp_a', 'exp_b', 'period')
+
+    """
+    node = parse_formula(formula)
+    names = {child.id for child in ast.walk(node) if isinstance(child, ast.Name)}
+
+    return tuple(sorted(names))
+
+
+def evaluate_predicates(groups, data):
+    """Evaluate groups of boolean formulas.
+
+    The formulas within a group are combined with a logical or. All formulas are
+    evaluated with one compiled function in a single pass over the data.
+
+    Parameters
+    ----------
+    groups : list of list of str
+        Each inner list contains the formulas of one group.
+    data : dict or pandas.DataFrame
+        Mapping from variable names to one-dimensional arrays with equal lengths. Only
+        the variables used in the formulas are accessed.
+
+    Returns
+    -------
+    is_true : numpy.ndarray
+        Boolean array with shape (n_rows, n_groups) which is true if any formula of the
+        group is true.
+
+    Examples
+    --------
+    >>> data = {"period": np.arange(3), "exp_a": np.array([0, 0, 2])}
+    >>> evaluate_predicates([["period > 0 & exp_a == 0"], ["exp_a > period"]], data)
+    array([[False, False],
+           [ True, False],
+           [False, False]])
+
+    """
+    groups = tuple(tuple(group) for group in groups)
+    n_rows = len(data[next(iter(data))])
+
+    try:
+        names = sorted(
+            {
+                name
+                for group in groups
+                for f in group
+                for name in get_variables_in_formula(f)
+            }
+        )
+        arrays = [_get_array(data, name) for name in names]
+        variables = tuple(
+            (name, _get_kind(array.dtype)) for name, array in zip(names, arrays)
+        )
+        kernel = _compile_predicates(groups, variables)
+
+    except (KeyError, NotImplementedError, SyntaxError, tokenize.TokenError):
+        df = data if isinstance(data, pd.DataFrame) else pd.DataFrame(data)
+        is_true = np.zeros((n_rows, len(groups)), dtype=np.bool_)
+        for i, group in enumerate(groups):
+            for formula in group:
+                is_true[:, i] |= np.asarray(df.eval(formula))
+
+    else:
+        is_true = np.empty((n_rows, len(groups)), dtype=np.bool_)
+        kernel(is_true, *arrays)
+
+    return is_true
+
+
+def evaluate_formulas(formulas, data):
+    """Evaluate formulas which may depend on the results of previous formulas.
+
+    Parameters
+    ----------
+    formulas : list of tuple
+        Each tuple contains the name of the result and the formula. Formulas can use
+        the results of preceding formulas.
+    data : dict or pandas.DataFrame
+        Mapping from variable names to one-dimensional arrays with equal lengths. For
+        a :class:`pandas.DataFrame`, index levels can be used as variables, too.
+
+    Returns
+    -------
+    results : dict
+        Mapping from names to the results which are either arrays or scalars if the
+        formula is a constant.
+
+    Raises
+    ------
+    NotImplementedError
+        If a formula cannot be translated or a variable is missing or not numeric.
+
+    Examples
+    --------
+    >>> data = {"exp_a": np.array([0, 1, 2])}
+    >>> evaluate_formulas([("any_exp_a", "exp_a > 0"), ("x", "~any_exp_a")], data)
+    {'any_exp_a': array([False,  True,  True]), 'x': array([ True, False, False])}
+
+    """
+    formulas = tuple(formulas)
+    results = [name for name, _ in formulas]
+
+    try:
+        names = sorted(
+            {
+                name
+                for _, formula in formulas
+                for name in get_variables_in_formula(formula)
+            }.difference(results)
+        )
+        arrays = [_get_array(data, name) for name in names]
+    except (KeyError, SyntaxError, tokenize.TokenError) as e:
+        raise NotImplementedError(f"Formulas cannot be evaluated: {e}.") from e
+
+    variables = tuple(
+        (name, _get_kind(array.dtype)) for name, array in zip(names, arrays)
+    )
+    function = _compile_formulas(formulas, variables)
+
+    return dict(zip(results, function(*arrays)))
+
+
+@functools.lru_cache(maxsize=None)
+def _compile_predicates(groups, variables):
+    """Compile groups of formulas into a single numba function.
+
+    The generated function receives the boolean output array of shape (n_rows,
+    n_groups) and one array per variable. For each row, the variables are loaded into
+    local variables and every group is evaluated.
+
+    """
+    kinds = {name: kind for name, kind in variables}
+    local_names = {name: f"v_{i}" for i, (name, _) in enumerate(variables)}
+    translator = _Translator(kinds, local_names)
+
+    group_expressions = []
+    for group in groups:
+        codes = []
+        for formula in group:
+            code, kind = translator.translate(parse_formula(formula))
+            if kind != "b":
+                raise NotImplementedError(f"Formula '{formula}' is not boolean.")
+            codes.append(code)
+        group_expressions.append(" or ".join(codes) if codes else "False")
+
+    lines = [f"def kernel(out, {', '.join(f'a_{i}' for i in range(len(variables)))}):"]
+    lines.append("    for row in range(out.shape[0]):")
+    lines += _create_lines_to_load_variables(variables, indent=8)
+    lines += [
+        f"        out[row, {i}] = {expression}"
+        for i, expression in enumerate(group_expressions)
+    ]
+
+    return _compile_source("\n".join(lines))
+
+
+@functools.lru_cache(maxsize=None)
+def _compile_formulas(formulas, variables):
+    """Compile formulas into a single vectorized function.
+
+    The generated function receives one array per variable, evaluates the formulas in
+    order and returns a tuple with all results.
+
+    """
+    kinds = {name: kind for name, kind in variables}
+    local_names = {name: f"v_{i}" for i, (name, _) in enumerate(variables)}
+    translator = _Translator(kinds, local_names, vectorized=True)
+
+    lines = [f"def kernel({', '.join(f'v_{i}' for i in range(len(variables)))}):"]
+    for i, (name, formula) in enumerate(formulas):
+        code, kind = translator.translate(parse_formula(formula))
+        lines.append(f"    r_{i} = {code}")
+        # Subsequent formulas can refer to this result.
+        kinds[name] = kind
+        local_names[name] = f"r_{i}"
+    lines.append(f"    return ({''.join(f'r_{i}, ' for i in range(len(formulas)))})")
+
+    namespace = {}
+    exec(compile("\n".join(lines), "<respy-formula>", "exec"), namespace)
+
+    return namespace["kernel"]
+
+
+def _get_array(data, name):
+    """Get the values of a variable from the columns or index levels of the data.
+
+    Integers are cast to :class:`numpy.int64` like in the compiled predicates such that
+    formulas on downcasted columns do not overflow silently.
+
+    """
+    if isinstance(data, pd.DataFrame) and name not in data.columns:
+        values = data.index.get_level_values(name)
+    else:
+        values = data[name]
+
+    array = np.asarray(values)
+    if array.dtype.kind in "iu":
+        array = array.astype(np.int64, copy=False)
+
+    return array
+
+
+def _create_lines_to_load_variables(variables, indent):
+    """Create the lines which load the values of a row into local variables.
+
+    Integers are cast to :class:`numpy.int64` to prevent silent overflows and
+    unexpected promotions of unsigned integers after downcasting.
+
+    """
+    lines = []
+    for i, (_, kind) in enumerate(variables):
+        value = f"np.int64(a_{i}[row])" if kind == "i" else f"a_{i}[row]"
+        lines.append(" " * indent + f"v_{i} = {value}")
+
+    return lines
+
+
+def _compile_source(source):
+    namespace = {"np": np}
+    exec(compile(source, "<respy-formula>", "exec"), namespace)
+
+    # Use NumPy's error model such that divisions by zero do not raise errors.
+    return nb.njit(error_model="numpy")(namespace["kernel"])
+
+
+def _get_kind(dtype):
+    """Map a dtype to one of the kinds ``"b"``, ``"i"`` or ``"f"``."""
+    if dtype.kind == "b":
+        kind = "b"
+    elif dtype.kind in "iu":
+        kind = "i"
+    elif dtype.kind == "f":
+        kind = "f"
+    else:
+        raise NotImplementedError(f"Variables with dtype {dtype} are not supported.")
+
+    return kind
+
+
+class _Translator:
+    """Translate a subset of Python expressions to code.
+
+    The code either operates on scalars and is compiled with numba or, if
+    ``vectorized`` is true, on NumPy arrays.
+
+    The translator infers the kind of each expression, ``"b"`` for booleans, ``"i"`` for
+    integers and ``"f"`` for floats, to replicate the semantics of pandas where logical
+    operators are applied element-wise and ``~`` negates booleans, but inverts the bits
+    of integers. Unsupported expressions raise a :exc:`NotImplementedError`.
+
+    """
+
+    def __init__(self, kinds, local_names, vectorized=False):
+        self.kinds = kinds
+        self.local_names = local_names
+        self.vectorized = vectorized
+
+    def translate(self, node):
+        method = getattr(self, f"_translate_{type(node).__name__}", None)
+        if method is None:
+            raise NotImplementedError(f"{type(node).__name__} is not supported.")
+
+        return method(node)
+
+    def _translate_Constant(self, node):  # noqa: N802
+        # Python 3.7 stores numbers in ``ast.Num.n``.
+        value = node.n if isinstance(node, ast.Num) else node.value
+        if isinstance(value, bool):
+            kind = "b"
+        elif isinstance(value, int):
+            kind = "i"
+        elif isinstance(value, float):
+            kind = "f"
+        else:
+            raise NotImplementedError(f"Constant {value!r} is not supported.")
+
+        return repr(value), kind
+
+    # Python 3.7 uses separate nodes for numbers and booleans.
+    _translate_Num = _translate_Constant  # noqa: N815
+    _translate_NameConstant = _translate_Constant  # noqa: N815
+
+    def _translate_Name(self, node):  # noqa: N802
+        if node.id not in self.local_names:
+            raise NotImplementedError(f"Unknown variable '{node.id}'.")
+
+        return self.local_names[node.id], self.kinds[node.id]
+
+    def _translate_BoolOp(self, node):  # noqa: N802
+        if self.vectorized:
+            operator = " & " if isinstance(node.op, ast.And) else " | "
+        else:
+            operator = " and " if isinstance(node.op, ast.And) else " or "
+        codes = []
+        for value in node.values:
+            code, kind = self.translate(value)
+            # pandas applies bitwise operations to integers.
+            if kind != "b":
+                raise NotImplementedError("Logical operators require booleans.")
+            codes.append(code)
+
+        return "(" + operator.join(codes) + ")", "b"
+
+    def _translate_UnaryOp(self, node):  # noqa: N802
+        code, kind = self.translate(node.operand)
+
+        if isinstance(node.op, (ast.Not, ast.Invert)):
+            if kind == "f":
+                raise NotImplementedError("Floats cannot be inverted.")
+            elif self.vectorized:
+                out = f"(~{code})", kind
+            elif kind == "b":
+                out = f"(not {code})", "b"
+            else:
+                out = f"(-{code} - 1)", "i"
+        elif kind == "b":
+            raise NotImplementedError("Signs of booleans are not supported.")
+        elif isinstance(node.op, ast.USub):
+            out = f"(-{code})", "f" if kind == "f" else "i"
+        else:
+            out = f"(+{code})", "f" if kind == "f" else "i"
+
+        return out
+
+    def _translate_BinOp(self, node):  # noqa: N802
+        if type(node.op) not in _BINARY_OPERATORS:
+            raise NotImplementedError(f"{type(node.op).__name__} is not supported.")
+
+        left, left_kind = self.translate(node.left)
+        right, right_kind = self.translate(node.right)
+
+        # The results of arithmetic operations on two booleans differ from Python.
+        if left_kind == right_kind == "b":
+            raise NotImplementedError("Arithmetic operations on booleans.")
+
+        if isinstance(node.op, ast.Div) or "f" in (left_kind, right_kind):
+            kind = "f"
+        else:
+            kind = "i"
+
+        return f"({left} {_BINARY_OPERATORS[type(node.op)]} {right})", kind
+
+    def _translate_Compare(self, node):  # noqa: N802
+        operands = [self.translate(node.left)[0]] + [
+            self.translate(comparator)[0] for comparator in node.comparators
+        ]
+        comparisons = []
+        for i, operator in enumerate(node.ops):
+            if type(operator) not in _COMPARISON_OPERATORS:
+                raise NotImplementedError(
+                    f"{type(operator).__name__} is not supported."
+                )
+            symbol = _COMPARISON_OPERATORS[type(operator)]
+            comparisons.append(f"({operands[i]} {symbol} {operands[i + 1]})")
+
+        operator = " & " if self.vectorized else " and "
+
+        return "(" + operator.join(comparisons) + ")", "b"
@@ -4,24 +4,37 @@ import warnings
 import numba as nb
 import numpy as np
 
-from respy.config import MAX_LOG_FLOAT
 from respy.parallelization import combine_and_split_interpolation
 from respy.parallelization import parallelize_across_dense_dimensions
+from respy.shared import calculate_controlled_expected_value_functions
+from respy.shared import calculate_expected_shocks
 from respy.shared import calculate_expected_value_functions
 from respy.shared import calculate_value_functions_and_flow_utilities
 
 
-def interpolate(state_space, period_draws_emax_risk, period, optim_paras, options):
+def interpolate(
+    state_space,
+    period_draws_emax_risk,
+    weights_emax_risk,
+    period,
+    optim_paras,
+    options,
+):
     """Interface to switch between different interpolation routines."""
     period_expected_value_functions = _kw_94_interpolation(
-        state_space, period_draws_emax_risk, period, optim_paras, options
+        state_space,
+        period_draws_emax_risk,
+        weights_emax_risk,
+        period,
+        optim_paras,
+        options,
     )
 
     return period_expected_value_functions
 
 
 def _kw_94_interpolation(
-    state_space, period_draws_emax_risk, period, optim_paras, options
+    state_space, period_draws_emax_risk, weights_emax_risk, period, optim_paras, options
 ):
     r"""Calculate the approximate solution proposed by [1]_.
 
@@ -84,17 +97,22 @@ def _kw_94_interpolation(
         interp_points, n_core_states_in_period, seed
     )
 
-    # Create an array with the expected value of the shocks.
-    expected_shocks = np.zeros(len(optim_paras["choices"]))
-    var = np.diag(optim_paras["shocks_cholesky"].dot(optim_paras["shocks_cholesky"].T))
-    expected_shocks[:n_wages] = np.exp(np.clip(var[:n_wages], 0, MAX_LOG_FLOAT) / 2)
+    expected_shocks = calculate_expected_shocks(optim_paras["shocks_cholesky"], n_wages)
 
     wages = state_space.get_attribute_from_period("wages", period)
     nonpecs = state_space.get_attribute_from_period("nonpecs", period)
     continuation_values = state_space.get_continuation_values(period=period)
+    is_inadmissible = state_space.get_attribute_from_period("is_inadmissible", period)
+    skip_inadmissible = options["skip_inadmissible_choices"]
 
     exogenous, max_emax = _compute_rhs_variables(
-        wages, nonpecs, continuation_values, expected_shocks, optim_paras["delta"]
+        wages,
+        nonpecs,
+        continuation_values,
+        expected_shocks,
+        optim_paras["delta"],
+        is_inadmissible,
+        skip_inadmissible,
     )
 
     endogenous = _compute_lhs_variable(
@@ -104,7 +122,11 @@ def _kw_94_interpolation(
         max_emax,
         not_interpolated,
         period_draws_emax_risk,
+        weights_emax_risk,
+        expected_shocks if options["solution_control_variate"] else None,
         optim_paras["delta"],
+        is_inadmissible,
+        skip_inadmissible,
     )
 
     # Create prediction model based on the random subset of points where the EMAX is
@@ -177,13 +199,18 @@ def _get_not_interpolated_indicator(interpolation_points, n_states, seed):
 
 
 @parallelize_across_dense_dimensions
-def _compute_rhs_variables(wages, nonpec, emaxs, draws, delta):
+def _compute_rhs_variables(
+    wages, nonpec, emaxs, draws, delta, is_inadmissible, skip_inadmissible
+):
     """Compute right-hand side variables of the linear model.
 
     Constructing the exogenous variable for all states, including the ones where
     simulation will take place. All information will be used in either the construction
     of the prediction model or the prediction step.
 
+    If inadmissible choices are skipped, their differences to the maximum value function
+    are set to zero such that they do not contribute to the prediction.
+
     Parameters
     ----------
     wages : numpy.ndarray
@@ -196,6 +223,11 @@ def _compute_rhs_variables(wages, nonpec, emaxs, draws, delta):
         Array with shape (n_choices,).
     delta : float
         Discount factor.
+    is_inadmissible : numpy.ndarray
+        Array with shape (n_states_in_period, n_choices) indicating inadmissible
+        choices.
+    skip_inadmissible : bool
+        Indicator for whether inadmissible choices are skipped.
 
     Returns
     -------
@@ -208,11 +240,13 @@ def _compute_rhs_variables(wages, nonpec, emaxs, draws, delta):
 
     """
     value_functions, _ = calculate_value_functions_and_flow_utilities(
-        wages, nonpec, emaxs, draws, delta
+        wages, nonpec, emaxs, draws, delta, is_inadmissible, skip_inadmissible
     )
 
     max_value_functions = value_functions.max(axis=1)
     exogenous = max_value_functions.reshape(-1, 1) - value_functions
+    if skip_inadmissible:
+        exogenous[is_inadmissible] = 0
 
     exogenous = np.column_stack(
         (exogenous, np.sqrt(exogenous), np.ones(exogenous.shape[0]))
@@ -229,7 +263,11 @@ def _compute_lhs_variable(
     max_value_functions,
     not_interpolated,
     draws,
+    weights,
+    expected_shocks,
     delta,
+    is_inadmissible,
+    skip_inadmissible,
 ):
     """Calculate left-hand side variable for all states which are not interpolated.
 
@@ -253,17 +291,43 @@ def _compute_lhs_variable(
         continuation_values.
     draws : numpy.ndarray
         Array with shape (n_draws, n_choices) containing draws.
+    weights : numpy.ndarray
+        Array with shape (n_draws,) containing the weights of the draws.
+    expected_shocks : numpy.ndarray or None
+        Array with shape (n_choices,) containing the expected value of the shocks. If
+        given, the expected value functions are computed with a control variate.
     delta : float
         Discount factor.
+    is_inadmissible : numpy.ndarray
+        Array with shape (n_states_in_period, n_choices) indicating inadmissible
+        choices.
+    skip_inadmissible : bool
+        Indicator for whether inadmissible choices are skipped.
 
     """
-    expected_value_functions = calculate_expected_value_functions(
-        wages[not_interpolated],
-        nonpec[not_interpolated],
-        continuation_values[not_interpolated],
-        draws,
-        delta,
-    )
+    if expected_shocks is None:
+        expected_value_functions = calculate_expected_value_functions(
+            wages[not_interpolated],
+            nonpec[not_interpolated],
+            continuation_values[not_interpolated],
+            draws,
+            weights,
+            is_inadmissible[not_interpolated],
+            skip_inadmissible,
+            delta,
+        )
+    else:
+        expected_value_functions = calculate_controlled_expected_value_functions(
+            wages[not_interpolated],
+            nonpec[not_interpolated],
+            continuation_values[not_interpolated],
+            draws,
+            weights,
+            is_inadmissible[not_interpolated],
+            skip_inadmissible,
+            expected_shocks,
+            delta,
+        )
     endogenous = expected_value_functions - max_value_functions[not_interpolated]
 
     return endogenous
@@ -7,26 +7,37 @@ import numpy as np
 import pandas as pd
 from scipy import special
 
+from respy.conditional_draws import create_conditional_distribution_and_log_prob_wages
 from respy.conditional_draws import create_draws_and_log_prob_wages
 from respy.config import COVARIATES_DOT_PRODUCT_DTYPE
-from respy.config import INDEXER_INVALID_INDEX
+from respy.config import ESTIMATION_DRAWS_CHUNK_SIZE
 from respy.config import MAX_FLOAT
+from respy.config import MAX_LOG_FLOAT
 from respy.config import MIN_FLOAT
+from respy.parallelization import _split_dataframe
+from respy.parallelization import check_threading_layer_for_concurrent_kernels
+from respy.parallelization import parallelize_across_chunks
 from respy.parallelization import parallelize_across_dense_dimensions
-from respy.parallelization import split_and_combine_df
 from respy.parallelization import split_and_combine_likelihood
 from respy.pre_processing.data_checking import check_estimation_data
+from respy.pre_processing.model_processing import _read_params
 from respy.pre_processing.model_processing import process_params_and_options
 from respy.pre_processing.process_covariates import identify_necessary_covariates
+from respy.shared import CounterBasedDraws
 from respy.shared import aggregate_keane_wolpin_utility
 from respy.shared import compute_covariates
 from respy.shared import convert_labeled_variables_to_codes
 from respy.shared import create_base_draws
 from respy.shared import create_core_state_space_columns
+from respy.shared import create_dense_state_space_columns
 from respy.shared import downcast_to_smallest_dtype
 from respy.shared import generate_column_dtype_dict_for_estimation
 from respy.shared import rename_labels_to_internal
+from respy.solve import _get_periods_with_interpolation
+from respy.solve import _set_solution_attributes
+from respy.solve import _solve_derivatives_of_expected_value_functions
 from respy.solve import get_solve_func
+from respy.solve import solve_many
 
 
 def get_crit_func(
@@ -63,10 +74,16 @@ def get_crit_func(
     ------
     AssertionError
         If data has not the expected format.
+    ValueError
+        If the chunks of the likelihood are evaluated in multiple threads without a
+        threadsafe threading layer of numba.
 
     """
     optim_paras, options = process_params_and_options(params, options)
 
+    if options["estimation_n_jobs"] > 1:
+        check_threading_layer_for_concurrent_kernels()
+
     optim_paras = _adjust_optim_paras_for_estimation(optim_paras, df)
 
     check_estimation_data(df, optim_paras)
@@ -77,20 +94,38 @@ def get_crit_func(
     df, type_covariates = _process_estimation_data(
         df, state_space, optim_paras, options
     )
+    plan = _create_estimation_plan(df, type_covariates, optim_paras, options)
 
-    base_draws_est = create_base_draws(
-        (
-            df.shape[0] * optim_paras["n_types"],
-            options["estimation_draws"],
-            len(optim_paras["choices"]),
-        ),
-        next(options["estimation_seed_startup"]),
-        options["monte_carlo_sequence"],
+    shape = (
+        df.shape[0] * optim_paras["n_types"],
+        options["estimation_draws"],
+        len(optim_paras["choices"]),
     )
+    seed = next(options["estimation_seed_startup"])
+    # Counter-based draws are generated on demand instead of being stored for the whole
+    # panel. The draws of an observation and type are labeled with the identifier, the
+    # period and the type such that they do not depend on other individuals.
+    if options["monte_carlo_sequence"] == "philox":
+        n_types = optim_paras["n_types"]
+        labels = np.column_stack(
+            (
+                np.repeat(df.index.get_level_values("identifier"), n_types),
+                np.repeat(df.index.get_level_values("period"), n_types),
+                np.tile(np.arange(n_types), df.shape[0]),
+            )
+        )
+        base_draws_est = CounterBasedDraws(shape, seed, labels)
+    else:
+        base_draws_est = create_base_draws(shape, seed, options["monte_carlo_sequence"])
+    # Order the draws like the observations in the plan such that the draws of each
+    # group of observations are a contiguous block.
+    if plan["draw_rows"] is not None:
+        base_draws_est = base_draws_est[plan["draw_rows"]]
 
     criterion_function = partial(
         log_like,
         df=df,
+        plan=plan,
         base_draws_est=base_draws_est,
         solve=solve,
         type_covariates=type_covariates,
@@ -105,6 +140,7 @@ def get_crit_func(
 def log_like(
     params,
     df,
+    plan,
     base_draws_est,
     solve,
     type_covariates,
@@ -123,37 +159,282 @@ def log_like(
     df : pandas.DataFrame
         The DataFrame contains choices, log wages, the indices of the states for the
         different types.
-    base_draws_est : numpy.ndarray
-        Set of draws to calculate the probability of observed wages.
+    plan : dict
+        Arrays of the estimation data which do not depend on the parameters, see
+        :func:`_create_estimation_plan`.
+    base_draws_est : numpy.ndarray or respy.shared.CounterBasedDraws
+        Set of draws to calculate the probability of observed wages. The draws are
+        ordered like the observations in the plan.
     solve : :func:`~respy.solve.solve`
         Function which solves the model with new parameters.
     options : dict
         Contains model options.
 
     """
-    optim_paras, options = process_params_and_options(params, options)
+    state_space = solve(params)
+
+    out = _log_like_with_solution(
+        params,
+        state_space,
+        df,
+        plan,
+        base_draws_est,
+        type_covariates,
+        options,
+        return_scalar,
+        return_comparison_plot_data,
+    )
+
+    return out
+
+
+def log_like_many(
+    params_list,
+    df,
+    plan,
+    base_draws_est,
+    solve,
+    type_covariates,
+    options,
+    return_scalar,
+    return_comparison_plot_data,
+):
+    """Criterion function for many parameter vectors.
+
+    The function accepts the same arguments as :func:`log_like` except for a list of
+    parameter vectors. The model is solved for all parameter vectors at once with
+    :func:`~respy.solve.solve_many`. A criterion function for many parameter vectors is
+    created from the output of :func:`get_crit_func` with
+    ``functools.partial(log_like_many, **criterion_function.keywords)``.
+
+    Returns
+    -------
+    out : list
+        The output of :func:`log_like` for every parameter vector.
+
+    """
+    state_space = solve.keywords["state_space"]
+    solution = solve_many(params_list, options, state_space)
+
+    out = []
+    for i, params in enumerate(params_list):
+        _set_solution_attributes(
+            state_space,
+            solution["wages"][i],
+            solution["nonpecs"][i],
+            solution["expected_value_functions_w_sentinel"][i],
+        )
+        out.append(
+            _log_like_with_solution(
+                params,
+                state_space,
+                df,
+                plan,
+                base_draws_est,
+                type_covariates,
+                options,
+                return_scalar,
+                return_comparison_plot_data,
+            )
+        )
+
+    # The attributes of the state space do not belong to the previous solution anymore.
+    state_space._previous_solution = None
+
+    return out
+
+
+def get_crit_and_grad_func(params, options, df):
+    """Get the criterion function and its gradient.
+
+    Return :func:`log_like_and_gradient` where all arguments except the parameter vector
+    are fixed with :func:`functools.partial`. The function returns the mean log
+    likelihood, its gradient and the scores of individuals.
 
+    The derivatives with respect to the coefficients of wages and non-pecuniary rewards
+    are computed analytically. The derivatives of the rewards are propagated through
+    the backward induction and the simulated choice probabilities such that the costs
+    are a few solutions of the model instead of one solution for every coefficient.
+    The derivatives of the type probabilities are analytic as well.
+
+    The gradient is not fully analytic. The derivatives with respect to the discount
+    factor and the shocks are computed with forward differences which require one
+    solution of the model per parameter. See :func:`log_like_and_gradient` for details.
+
+    Parameters
+    ----------
+    params : pandas.DataFrame
+        DataFrame containing model parameters.
+    options : dict
+        Dictionary containing model options.
+    df : pandas.DataFrame
+        The model is fit to this dataset.
+
+    Returns
+    -------
+    criterion_and_gradient_function : :func:`log_like_and_gradient`
+        Criterion function where all arguments except the parameter vector are set.
+
+    Raises
+    ------
+    NotImplementedError
+        If the expected value functions are interpolated, approximated with Clark's
+        method or computed with a control variate or adaptive draws.
+
+    """
+    criterion_function = get_crit_func(params, options, df)
+    kwargs = {
+        key: value
+        for key, value in criterion_function.keywords.items()
+        if not key.startswith("return_")
+    }
+
+    options = kwargs["options"]
+    state_space = kwargs["solve"].keywords["state_space"]
+    if (
+        options["solution_integration"] == "clark"
+        or options["solution_control_variate"]
+        or options["solution_adaptive_tolerance"] is not None
+        or _get_periods_with_interpolation(state_space, options).any()
+    ):
+        raise NotImplementedError(
+            "The gradient of the log likelihood is only available for the full "
+            "solution without a control variate and adaptive draws."
+        )
+
+    return partial(log_like_and_gradient, **kwargs)
+
+
+def log_like_and_gradient(
+    params, df, plan, base_draws_est, solve, type_covariates, options
+):
+    """Criterion function and its gradient for the likelihood maximization.
+
+    The derivatives of the log likelihood contributions with respect to the
+    coefficients of wages, non-pecuniary rewards and type probabilities are computed
+    analytically. The other derivatives are computed with forward differences.
+
+    - The derivatives with respect to the measurement errors and type probabilities
+      which are specified as probabilities reuse the solution of the model and cost one
+      evaluation of the likelihood each.
+    - The derivatives with respect to the discount factor and the shocks change the
+      solution and cost one solution of the model and one evaluation of the likelihood
+      each. Thus, the costs of the gradient still grow with the number of shock
+      parameters.
+
+    Parameters which do not enter the likelihood like the maximum experience or the
+    probabilities of initial conditions have missing derivatives.
+
+    The function accepts the same arguments as :func:`log_like` except for the
+    arguments controlling the return values.
+
+    Returns
+    -------
+    value : float
+        Mean log likelihood.
+    gradient : pandas.Series
+        Gradient of the mean log likelihood with the index of the parameters.
+    scores : pandas.DataFrame
+        DataFrame with individuals as rows and parameters as columns containing the
+        derivatives of the log likelihood contributions of individuals.
+
+    """
+    params = _read_params(params)
     state_space = solve(params)
+    optim_paras, options = process_params_and_options(params, options)
 
-    contribs, df, log_type_probabilities = _internal_log_like_obs(
-        state_space, df, base_draws_est, type_covariates, optim_paras, options
+    derivatives = _solve_derivatives_of_expected_value_functions(
+        state_space, optim_paras, options
+    )
+    contribs, scores = _internal_log_like_obs_and_scores(
+        state_space, plan, base_draws_est, derivatives, optim_paras, options
+    )
+    scores = scores.reindex(columns=params.index)
+
+    # Parameters which do not change the solution come first such that they reuse the
+    # solution of the model with the original parameters.
+    is_numerical = _is_parameter_with_numerical_derivative(params.index)
+    changes_solution = _is_parameter_of_solution(params.index)
+    for is_parameter_of_solution in [False, True]:
+        mask = is_numerical & (changes_solution == is_parameter_of_solution)
+        for index in params.index[mask]:
+            step = np.sqrt(np.finfo(float).eps) * max(abs(params[index]), 0.1)
+            params_ = params.copy()
+            params_[index] += step
+
+            if is_parameter_of_solution:
+                state_space = solve(params_)
+            contribs_ = _log_like_with_solution(
+                params_,
+                state_space,
+                df,
+                plan,
+                base_draws_est,
+                type_covariates,
+                options,
+                return_scalar=False,
+                return_comparison_plot_data=False,
+            )
+            scores[index] = (contribs_ - contribs) / step
+
+    return contribs.mean(), scores.mean(), scores
+
+
+def _is_parameter_with_numerical_derivative(index):
+    """Indicate parameters whose derivatives are computed with finite differences.
+
+    The derivatives of type probabilities are only computed with finite differences if
+    the types are specified with probabilities instead of logit coefficients.
+
+    """
+    categories = index.get_level_values("category")
+    names = index.get_level_values("name")
+    return categories.str.match(r"(delta|meas_error|shocks_\w+)$") | (
+        categories.str.match(r"type_[0-9]+$") & (names == "probability")
+    )
+
+
+def _is_parameter_of_solution(index):
+    """Indicate parameters among the finite differences which change the solution."""
+    categories = index.get_level_values("category")
+    return categories.str.match(r"(delta|shocks_\w+)$")
+
+
+def _log_like_with_solution(
+    params,
+    state_space,
+    df,
+    plan,
+    base_draws_est,
+    type_covariates,
+    options,
+    return_scalar,
+    return_comparison_plot_data,
+):
+    """Calculate the criterion function with a solved state space."""
+    optim_paras, options = process_params_and_options(params, options)
+
+    contribs, loglikes, log_type_probabilities = _internal_log_like_obs(
+        state_space, plan, base_draws_est, optim_paras, options
     )
 
     # Return mean log likelihood or log likelihood contributions.
     out = contribs.mean() if return_scalar else contribs
 
     if return_comparison_plot_data:
+        if log_type_probabilities is not None:
+            log_type_probabilities = pd.DataFrame(
+                log_type_probabilities, index=type_covariates.index
+            )
         comparison_plot_data = _create_comparison_plot_data(
-            df, log_type_probabilities, optim_paras
+            df, loglikes, log_type_probabilities, optim_paras
         )
         out = (out, comparison_plot_data)
 
     return out
 
 
-def _internal_log_like_obs(
-    state_space, df, base_draws_est, type_covariates, optim_paras, options
-):
+def _internal_log_like_obs(state_space, plan, base_draws_est, optim_paras, options):
     """Calculate the likelihood contribution of each individual in the sample.
 
     The function calculates all likelihood contributions for all observations in the
@@ -163,19 +444,19 @@ def _internal_log_like_obs(
     After that, the result is multiplied with the type-specific shares which yields the
     contribution to the likelihood for each individual.
 
+    The computations are done for every chunk of individuals in the plan and only the
+    results of the chunks are concatenated.
+
     Parameters
     ----------
     state_space : :class:`~respy.state_space.StateSpace`
         Class of state space.
-    df : pandas.DataFrame
-        The DataFrame contains choices, log wages, the indices of the states for the
-        different types.
+    plan : dict
+        Arrays of the estimation data which do not depend on the parameters, see
+        :func:`_create_estimation_plan`.
     base_draws_est : numpy.ndarray
-        Array with shape (n_periods, n_draws, n_choices) containing i.i.d. draws from
-        standard normal distributions.
-    type_covariates : pandas.DataFrame or None
-        If the model includes types, this is a :class:`pandas.DataFrame` containing the
-        covariates to compute the type probabilities.
+        Array with shape (n_obs * n_types, n_draws, n_choices) containing i.i.d. draws
+        from standard normal distributions ordered like the observations in the plan.
     optim_paras : dict
         Dictionary with quantities that were extracted from the parameter vector.
     options : dict
@@ -186,71 +467,491 @@ def _internal_log_like_obs(
     contribs : numpy.ndarray
         Array with shape (n_individuals,) containing contributions of individuals in the
         empirical data.
-    df : pandas.DataFrame
-        Contains log wages, choices and
+    loglikes : numpy.ndarray
+        Array with shape (n_obs, n_types, 2) containing the log likelihoods of the
+        choices and the wages of every observation and type.
+    log_type_probabilities : numpy.ndarray or None
+        Array with shape (n_individuals, n_types) containing the log type probabilities
+        of individuals if the model has types.
 
     """
-    df = df.copy()
+    contribs, loglikes, log_type_probabilities = _compute_log_likelihood_of_chunk(
+        plan,
+        base_draws_est,
+        state_space.get_attribute("wages"),
+        state_space.get_attribute("nonpecs"),
+        state_space.get_attribute("expected_value_functions_w_sentinel"),
+        state_space.get_attribute("is_inadmissible"),
+        optim_paras=optim_paras,
+        options=options,
+    )
 
-    n_types = optim_paras["n_types"]
+    return contribs, loglikes, log_type_probabilities
 
-    wages = state_space.get_attribute("wages")
-    nonpecs = state_space.get_attribute("nonpecs")
-    expected_value_functions = state_space.get_attribute("expected_value_functions")
 
-    df = _compute_wage_and_choice_likelihood_contributions(
-        df,
+def _internal_log_like_obs_and_scores(
+    state_space, plan, base_draws_est, derivatives, optim_paras, options
+):
+    """Calculate the likelihood contributions and the scores of individuals.
+
+    The function computes the same contributions as :func:`_internal_log_like_obs`.
+    The derivatives of the log likelihoods of observations are summed within each
+    individual and type. With types, the derivatives are weighted with the posterior
+    probabilities of the types.
+
+    Parameters
+    ----------
+    derivatives : dict
+        Derivatives of the expected value functions from
+        :func:`~respy.solve._solve_derivatives_of_expected_value_functions`.
+
+    Returns
+    -------
+    contribs : numpy.ndarray
+        Array with shape (n_individuals,) containing contributions of individuals in the
+        empirical data.
+    scores : pandas.DataFrame
+        DataFrame with individuals as rows and the coefficients of the rewards as
+        columns containing the derivatives of the contributions.
+
+    """
+    contribs, scores = _compute_log_likelihood_and_scores_of_chunk(
+        plan,
+        base_draws_est,
+        state_space.get_attribute("wages"),
+        state_space.get_attribute("nonpecs"),
+        state_space.get_attribute("expected_value_functions_w_sentinel"),
+        state_space.get_attribute("is_inadmissible"),
+        _split_array_across_dense_dimensions(state_space, derivatives["covariates"]),
+        _split_array_across_dense_dimensions(
+            state_space, derivatives["expected_value_functions_w_sentinel"]
+        ),
+        derivatives["columns"],
+        optim_paras=optim_paras,
+        options=options,
+    )
+
+    scores = pd.DataFrame(
+        scores,
+        index=pd.Index(plan["identifiers"], name="identifier"),
+        columns=pd.MultiIndex.from_tuples(
+            derivatives["index"] + _create_index_of_type_scores(optim_paras),
+            names=["category", "name"],
+        ),
+    )
+
+    return contribs, scores
+
+
+@parallelize_across_chunks
+def _compute_log_likelihood_of_chunk(
+    chunk,
+    base_draws_est,
+    wages,
+    nonpecs,
+    expected_value_functions,
+    is_inadmissible,
+    optim_paras,
+    options,
+):
+    """Compute the likelihood contributions of the individuals in a chunk."""
+    loglikes = _compute_wage_and_choice_likelihood_contributions(
+        chunk,
         base_draws_est,
         wages,
         nonpecs,
         expected_value_functions,
+        is_inadmissible,
         optim_paras=optim_paras,
         options=options,
     )
 
-    # Aggregate choice probabilities and wage densities to log likes per observation.
-    loglikes = (
-        df.groupby(["identifier", "period", "type"])[["loglike_choice", "loglike_wage"]]
-        .first()
-        .unstack("type")
-        if optim_paras["n_types"] >= 2
-        else df[["loglike_choice", "loglike_wage"]]
+    contribs, _, log_type_probabilities = _aggregate_log_likelihood_contributions(
+        loglikes, chunk, optim_paras
     )
-    per_observation_loglikes = loglikes["loglike_choice"] + loglikes["loglike_wage"]
-    per_individual_loglikes = per_observation_loglikes.groupby("identifier").sum()
+
+    return contribs, loglikes, log_type_probabilities
+
+
+@parallelize_across_chunks
+def _compute_log_likelihood_and_scores_of_chunk(
+    chunk,
+    base_draws_est,
+    wages,
+    nonpecs,
+    expected_value_functions,
+    is_inadmissible,
+    covariates,
+    derivatives,
+    columns,
+    optim_paras,
+    options,
+):
+    """Compute the likelihood contributions and scores of the individuals in a chunk."""
+    loglikes = _compute_wage_and_choice_likelihood_derivatives(
+        chunk,
+        base_draws_est,
+        wages,
+        nonpecs,
+        expected_value_functions,
+        is_inadmissible,
+        covariates,
+        derivatives,
+        columns,
+        optim_paras=optim_paras,
+        options=options,
+    )
+
+    (
+        contribs,
+        weighted_loglikes,
+        log_type_probabilities,
+    ) = _aggregate_log_likelihood_contributions(loglikes[..., :2], chunk, optim_paras)
+
+    # Sum the derivatives within each individual and type and weight the types with
+    # their posterior probabilities.
+    type_derivatives = np.add.reduceat(loglikes[..., 2:], chunk["offsets"], axis=0)
+    posteriors = np.exp(weighted_loglikes - contribs.reshape(-1, 1))
+    scores = np.einsum("it,itk->ik", posteriors, type_derivatives)
+
+    # The coefficients of type probabilities only enter the type probabilities. The
+    # derivative of an individual's contribution with respect to a coefficient of type
+    # t is the difference of the posterior and prior probability of type t times the
+    # covariate.
+    if optim_paras["n_types"] >= 2:
+        type_scores = [
+            (posteriors[:, [type_]] - np.exp(log_type_probabilities[:, [type_]]))
+            * chunk["type_covariates"][type_]
+            for type_ in range(1, optim_paras["n_types"])
+        ]
+        scores = np.hstack((scores, *type_scores))
+
+    return contribs, scores
+
+
+def _create_index_of_type_scores(optim_paras):
+    """Create the index of the scores of the coefficients of type probabilities."""
+    return [
+        (f"type_{type_}", label)
+        for type_ in range(1, optim_paras["n_types"])
+        for label in optim_paras["type_prob"][type_].index
+    ]
+
+
+def _create_estimation_plan(df, type_covariates, optim_paras, options):
+    """Create the estimation plan.
+
+    The plan contains all arrays of the estimation data which are needed to evaluate the
+    likelihood and do not depend on the parameters. It is created once such that a
+    criterion evaluation does not need to duplicate, group or copy the data.
+
+    The data is sorted by identifiers and periods and the individuals are split into
+    chunks of ``options["estimation_chunk_size"]`` individuals. By default, all
+    individuals form a single chunk. The likelihood is evaluated chunk by chunk such
+    that the memory of intermediate arrays is bounded by the size of a chunk. Within
+    each chunk, the observations of an individual are a contiguous segment of rows
+    starting at ``"offsets"``.
+
+    If the model has dense dimensions, the data of a chunk is duplicated for each type
+    and split into groups of the same dense index. Each group contains the rows of its
+    observations in the chunk, its type, the indices of the states and of the child
+    states, the choices and log wages. The draws of the observations are ordered by
+    chunks and groups such that the draws of a group are the slice ``"draws"`` of the
+    draws reordered with ``"draw_rows"``. Without dense dimensions, ``"groups"`` is a
+    single group and the draws need not be reordered.
+
+    For models with types, ``"type_covariates"`` of a chunk contains a matrix of
+    covariates for every type which is multiplied with the coefficients of the type
+    probabilities.
+
+    Returns
+    -------
+    plan : dict
+
+    """
+    n_obs = df.shape[0]
+    n_types = optim_paras["n_types"]
+
+    identifiers = df.index.get_level_values("identifier").to_numpy()
+    is_first_observation = np.append(True, identifiers[1:] != identifiers[:-1])
+    offsets = np.flatnonzero(is_first_observation)
+    n_individuals = offsets.shape[0]
+    bounds = np.append(offsets, n_obs)
 
     if n_types >= 2:
-        # To not alter the attribute in the functools.partial, create a copy.
-        type_covariates = type_covariates.copy()
+        type_covariates_list = []
+        for type_ in range(n_types):
+            labels = optim_paras["type_prob"][type_].index
+            relevant_covariates = identify_necessary_covariates(
+                labels, options["covariates_all"]
+            )
+            first_observations = compute_covariates(
+                type_covariates.assign(type=type_), relevant_covariates
+            )
+            type_covariates_list.append(
+                first_observations[labels].to_numpy(dtype=COVARIATES_DOT_PRODUCT_DTYPE)
+            )
+
+    chunk_size = options["estimation_chunk_size"] or n_individuals
+    dense_columns = create_dense_state_space_columns(optim_paras)
+
+    chunks = []
+    draw_rows = []
+    n_previous_draws = 0
+    for start in range(0, n_individuals, chunk_size):
+        stop = min(start + chunk_size, n_individuals)
+        first_row, last_row = bounds[start], bounds[stop]
+        chunk_df = df.iloc[first_row:last_row]
+        chunk_n_obs = last_row - first_row
+
+        chunk = {"n_obs": chunk_n_obs, "offsets": offsets[start:stop] - first_row}
+
+        if dense_columns:
+            df_ = pd.concat(
+                [
+                    chunk_df.assign(__id=np.arange(chunk_n_obs), type=i)
+                    for i in range(n_types)
+                ]
+            )
+            splitted_df = _split_dataframe(df_, dense_columns)
+
+            chunk["groups"] = {}
+            for dense_idx, sub_df in splitted_df.items():
+                type_ = dense_idx[-1] if n_types >= 2 else 0
+                rows = sub_df["__id"].to_numpy()
+                group = _create_group_of_estimation_plan(
+                    sub_df, rows, type_, optim_paras
+                )
+                group["draws"] = slice(
+                    n_previous_draws, n_previous_draws + rows.shape[0]
+                )
+                chunk["groups"][dense_idx] = group
+                # The draws were assigned to observations of the whole data ordered like
+                # observation * n_types + type.
+                draw_rows.append((first_row + rows) * n_types + type_)
+                n_previous_draws += rows.shape[0]
+        else:
+            chunk["groups"] = _create_group_of_estimation_plan(
+                chunk_df, np.arange(chunk_n_obs), 0, optim_paras
+            )
+            chunk["groups"]["draws"] = slice(first_row, last_row)
+
+        if n_types >= 2:
+            chunk["type_covariates"] = [
+                covariates[start:stop] for covariates in type_covariates_list
+            ]
+        else:
+            chunk["type_covariates"] = None
+
+        chunks.append(chunk)
+
+    plan = {
+        "identifiers": identifiers[is_first_observation],
+        "draw_rows": np.concatenate(draw_rows) if dense_columns else None,
+        "chunks": chunks,
+    }
+
+    return plan
+
+
+def _create_group_of_estimation_plan(df, rows, type_, optim_paras):
+    """Collect the arrays of a group of observations for the estimation plan."""
+    child_columns = [f"child_index_{c}" for c in optim_paras["choices"]]
+
+    group = {
+        "rows": rows,
+        "type": type_,
+        "indices": df["index"].to_numpy(),
+        "child_indices": df[child_columns].to_numpy(),
+        "choices": df["choice"].to_numpy(),
+        "log_wages": df["log_wage"].to_numpy(),
+    }
+
+    return group
+
+
+def _split_array_across_dense_dimensions(state_space, array):
+    """Split an array with a leading axis for dense dimensions like the attributes."""
+    if hasattr(state_space, "sub_state_spaces"):
+        out = dict(zip(state_space.sub_state_spaces, array))
+    else:
+        out = array[0]
+
+    return out
+
+
+def _aggregate_log_likelihood_contributions(loglikes, chunk, optim_paras):
+    """Aggregate the log likelihoods of observations to contributions of individuals.
+
+    The observations of an individual are consecutive rows of the data. Thus, the log
+    likelihoods are summed within individuals with :func:`numpy.add.reduceat` at the
+    offsets of the first observations.
+
+    Parameters
+    ----------
+    loglikes : numpy.ndarray
+        Array with shape (n_obs, n_types, 2) containing the log likelihoods of the
+        choices and the wages of every observation and type.
+    chunk : dict
+        Chunk of the estimation plan, see :func:`_create_estimation_plan`.
+
+    Returns
+    -------
+    contribs : numpy.ndarray
+        Array with shape (n_individuals,) containing contributions of individuals.
+    weighted_loglikes : numpy.ndarray
+        Array with shape (n_individuals, n_types) containing log likelihoods of
+        individuals which are weighted with the log type probabilities if the model has
+        types.
+    log_type_probabilities : numpy.ndarray or None
+        Array with shape (n_individuals, n_types) containing the log type probabilities
+        of individuals if the model has types.
+
+    """
+    per_observation_loglikes = loglikes[..., 0] + loglikes[..., 1]
+    per_individual_loglikes = np.add.reduceat(
+        per_observation_loglikes, chunk["offsets"], axis=0
+    )
+
+    if optim_paras["n_types"] >= 2:
         # Weight each type-specific individual log likelihood with the type probability.
         log_type_probabilities = _compute_log_type_probabilities(
-            type_covariates, optim_paras, options
+            chunk["type_covariates"], optim_paras
         )
         weighted_loglikes = per_individual_loglikes + log_type_probabilities
 
         contribs = special.logsumexp(weighted_loglikes, axis=1)
     else:
-        contribs = per_individual_loglikes.to_numpy().flatten()
+        weighted_loglikes = per_individual_loglikes
+        contribs = per_individual_loglikes[:, 0]
         log_type_probabilities = None
 
     contribs = np.clip(contribs, MIN_FLOAT, MAX_FLOAT)
 
-    return contribs, df, log_type_probabilities
+    return contribs, weighted_loglikes, log_type_probabilities
 
 
 @split_and_combine_likelihood
 @parallelize_across_dense_dimensions
 def _compute_wage_and_choice_likelihood_contributions(
-    df, base_draws_est, wages, nonpecs, expected_value_functions, optim_paras, options,
+    group,
+    base_draws_est,
+    wages,
+    nonpecs,
+    expected_value_functions,
+    is_inadmissible,
+    optim_paras,
+    options,
 ):
+    indices = group["indices"]
+    n_obs = indices.shape[0]
+
+    wages_systematic = wages[indices]
+    log_wages_observed = group["log_wages"]
+    choices = group["choices"]
+
+    (
+        updated_means,
+        updated_chols,
+        chol_indices,
+        wage_loglikes,
+    ) = create_conditional_distribution_and_log_prob_wages(
+        log_wages_observed,
+        wages_systematic,
+        choices,
+        optim_paras["shocks_cholesky"],
+        len(optim_paras["choices_w_wage"]),
+        optim_paras["meas_error"],
+        optim_paras["has_meas_error"],
+    )
+
+    # To get the continuation values, index the expected value functions. Invalid child
+    # states point to the trailing zero. This is the same operation done in
+    # `_SingleDimStateSpace.get_continuation_values()`.
+    continuation_values = expected_value_functions[group["child_indices"]]
+    nonpecs_systematic = nonpecs[indices]
+    is_inadmissible_ = is_inadmissible[indices]
+
+    # The conditional draws are created inside the kernel from the base draws which are
+    # generated for chunks of observations if they are counter-based.
+    choice_loglikes = np.empty(n_obs)
+    for start in range(0, n_obs, ESTIMATION_DRAWS_CHUNK_SIZE):
+        chunk = slice(start, start + ESTIMATION_DRAWS_CHUNK_SIZE)
+        _simulate_log_probability_of_individuals_observed_choice(
+            wages_systematic[chunk],
+            nonpecs_systematic[chunk],
+            continuation_values[chunk],
+            np.asarray(base_draws_est[chunk]),
+            updated_means[chunk],
+            updated_chols,
+            chol_indices[chunk],
+            MAX_LOG_FLOAT,
+            optim_paras["delta"],
+            choices[chunk],
+            options["estimation_tau"],
+            is_inadmissible_[chunk],
+            options["skip_inadmissible_choices"],
+            choice_loglikes[chunk],
+        )
+
+    loglikes = np.column_stack((choice_loglikes, wage_loglikes))
+    loglikes = np.clip(loglikes, MIN_FLOAT, MAX_FLOAT)
+
+    return loglikes
+
+
+@split_and_combine_likelihood
+@parallelize_across_dense_dimensions
+def _compute_wage_and_choice_likelihood_derivatives(
+    group,
+    base_draws_est,
+    wages,
+    nonpecs,
+    expected_value_functions,
+    is_inadmissible,
+    covariates,
+    derivatives,
+    columns,
+    optim_paras,
+    options,
+):
+    """Compute the likelihood contributions and their derivatives.
+
+    The log likelihoods are the same as in
+    :func:`_compute_wage_and_choice_likelihood_contributions`. The derivatives with
+    respect to the coefficients of the rewards are appended as columns.
+
+    The derivative of the smoothed log probability of the choice is a weighted sum of
+    the derivatives of the value functions, see
+    :func:`_simulate_log_probability_and_weights_of_derivatives`. The observed wage
+    determines the shock of the chosen alternative and shifts the means of the
+    conditional draws of the other shocks. Both effects and the density of the wage
+    depend on the systematic wage of the chosen alternative.
+
+    Parameters
+    ----------
+    covariates : numpy.ndarray
+        Array with shape (n_states, n_parameters) containing the covariate of every
+        coefficient.
+    derivatives : numpy.ndarray
+        Array with shape (n_states + 1, n_parameters) containing the derivatives of the
+        expected value functions.
+    columns : numpy.ndarray
+        Array with shape (n_parameters,) containing the column of every coefficient in
+        the stacked coefficients of wages and non-pecuniary rewards.
+
+    """
     n_choices = len(optim_paras["choices"])
-    n_obs = df.shape[0]
+    n_wages = len(optim_paras["choices_w_wage"])
+    tau = options["estimation_tau"]
 
-    indices = df["index"].to_numpy()
+    indices = group["indices"]
+    n_obs = indices.shape[0]
 
     wages_systematic = wages[indices]
-    log_wages_observed = df["log_wage"].to_numpy()
-    choices = df["choice"].to_numpy()
+    log_wages_observed = group["log_wages"]
+    choices = group["choices"]
+    child_indices = group["child_indices"]
 
     draws, wage_loglikes = create_draws_and_log_prob_wages(
         log_wages_observed,
@@ -258,65 +959,84 @@ def _compute_wage_and_choice_likelihood_contributions(
         base_draws_est,
         choices,
         optim_paras["shocks_cholesky"],
-        len(optim_paras["choices_w_wage"]),
+        n_wages,
         optim_paras["meas_error"],
         optim_paras["has_meas_error"],
     )
 
     draws = draws.reshape(n_obs, -1, n_choices)
 
-    # To get the continuation values, correctly index the expected value functions. This
-    # is the same operation done in `_SingleDimStateSpace.get_continuation_values()`.
-    child_indices = df[[f"child_index_{c}" for c in optim_paras["choices"]]]
-    mask = child_indices != INDEXER_INVALID_INDEX
-    valid_indices = np.where(mask, child_indices, 0)
-    continuation_values = np.where(mask, expected_value_functions[valid_indices], 0)
-
-    choice_loglikes = _simulate_log_probability_of_individuals_observed_choice(
-        wages[indices],
+    (
+        choice_loglikes,
+        probability_weights,
+        shock_weights,
+    ) = _simulate_log_probability_and_weights_of_derivatives(
+        wages_systematic,
         nonpecs[indices],
-        continuation_values,
+        expected_value_functions[child_indices],
         draws,
         optim_paras["delta"],
         choices,
-        options["estimation_tau"],
+        tau,
+        is_inadmissible[indices],
+        options["skip_inadmissible_choices"],
     )
 
-    df["loglike_choice"] = np.clip(choice_loglikes, MIN_FLOAT, MAX_FLOAT)
-    df["loglike_wage"] = np.clip(wage_loglikes, MIN_FLOAT, MAX_FLOAT)
+    # The shocks of choices with wages are multiplied with the wages.
+    reward_shock_weights = shock_weights * wages_systematic
+    reward_weights = np.hstack((reward_shock_weights, probability_weights)) / tau
+
+    # The observed wage enters the conditional draws and the wage density.
+    shocks_cov = optim_paras["shocks_cholesky"] @ optim_paras["shocks_cholesky"].T
+    rows = np.flatnonzero(np.isfinite(log_wages_observed))
+    observed_choices = choices[rows]
+    sigma_squared = (
+        shocks_cov[observed_choices, observed_choices]
+        + optim_paras["meas_error"][observed_choices] ** 2
+    )
+    shocks = log_wages_observed[rows] - np.log(wages_systematic[rows, observed_choices])
+    draw_weights = np.where(
+        np.arange(n_choices) < n_wages,
+        reward_shock_weights[rows],
+        probability_weights[rows],
+    )
+    reward_weights[rows, observed_choices] += (
+        shocks - (shocks_cov[observed_choices] * draw_weights).sum(axis=1) / tau
+    ) / sigma_squared
 
-    return df
+    loglike_derivatives = covariates[indices] * reward_weights[:, columns]
+    loglike_derivatives += (optim_paras["delta"] / tau) * np.einsum(
+        "ij,ijk->ik", probability_weights, derivatives[child_indices]
+    )
 
+    loglikes = np.column_stack((choice_loglikes, wage_loglikes))
+    loglikes = np.clip(loglikes, MIN_FLOAT, MAX_FLOAT)
 
-def _compute_log_type_probabilities(df, optim_paras, options):
-    """Compute the log type probabilities."""
-    x_betas = _compute_x_beta_for_type_probabilities(
-        df, optim_paras=optim_paras, options=options
-    )
+    return np.hstack((loglikes, loglike_derivatives))
 
-    log_probabilities = x_betas - special.logsumexp(x_betas, axis=1, keepdims=True)
-    log_probabilities = np.clip(log_probabilities, MIN_FLOAT, MAX_FLOAT)
 
-    return log_probabilities
+def _compute_log_type_probabilities(type_covariates, optim_paras):
+    """Compute the log type probabilities.
 
+    Parameters
+    ----------
+    type_covariates : list of numpy.ndarray
+        List with the matrix of covariates of the first observations of individuals for
+        every type.
+    optim_paras : dict
 
-@split_and_combine_df(remove_type=True)
-@parallelize_across_dense_dimensions
-def _compute_x_beta_for_type_probabilities(df, optim_paras, options):
-    for type_ in range(optim_paras["n_types"]):
-        first_observations = df.copy().assign(type=type_)
-        relevant_covariates = identify_necessary_covariates(
-            optim_paras["type_prob"][type_].index, options["covariates_all"]
-        )
-        first_observations = compute_covariates(first_observations, relevant_covariates)
+    """
+    x_betas = np.column_stack(
+        [
+            np.dot(covariates, optim_paras["type_prob"][type_])
+            for type_, covariates in enumerate(type_covariates)
+        ]
+    )
 
-        labels = optim_paras["type_prob"][type_].index
-        df[type_] = np.dot(
-            first_observations[labels].to_numpy(dtype=COVARIATES_DOT_PRODUCT_DTYPE),
-            optim_paras["type_prob"][type_],
-        )
+    log_probabilities = x_betas - special.logsumexp(x_betas, axis=1, keepdims=True)
+    log_probabilities = np.clip(log_probabilities, MIN_FLOAT, MAX_FLOAT)
 
-    return df[range(optim_paras["n_types"])]
+    return log_probabilities
 
 
 @nb.njit
@@ -352,8 +1072,13 @@ def _logsumexp(x):
 
 
 @nb.guvectorize(
-    ["f8[:], f8[:], f8[:], f8[:, :], f8, i8, f8, f8[:]"],
-    "(n_choices), (n_choices), (n_choices), (n_draws, n_choices), (), (), () -> ()",
+    [
+        "f8[:], f8[:], f8[:], f8[:, :], f8[:], f8[:, :, :], i8, f8, f8, i8, f8, b1[:], "
+        "b1, f8[:]"
+    ],
+    "(n_choices), (n_choices), (n_choices), (n_draws, n_choices), (n_choices), "
+    "(n_wages_plus_one, n_choices, n_choices), (), (), (), (), (), (n_choices), () "
+    "-> ()",
     nopython=True,
     target="parallel",
 )
@@ -361,10 +1086,16 @@ def _simulate_log_probability_of_individuals_observed_choice(
     wages,
     nonpec,
     continuation_values,
-    draws,
+    base_draws,
+    updated_mean,
+    updated_chols,
+    chol_index,
+    max_log_float,
     delta,
     choice,
     tau,
+    is_inadmissible,
+    skip_inadmissible,
     smoothed_log_probability,
 ):
     r"""Simulate the probability of observing the agent's choice.
@@ -373,6 +1104,11 @@ def _simulate_log_probability_of_individuals_observed_choice(
     First, the utility of each choice is computed. Then, the probability of observing
     the choice of the agent given the maximum utility from all choices is computed.
 
+    The shocks are drawn from the distribution conditional on the observed wage. Each
+    conditional draw is computed from the base draws like in
+    :func:`~respy.conditional_draws.calculate_conditional_draws` right before it is
+    used such that the conditional draws of all observations are never stored.
+
     The naive implementation calculates the log probability for choice `i` with the
     softmax function.
 
@@ -386,6 +1122,9 @@ def _simulate_log_probability_of_individuals_observed_choice(
     consecutive `logsumexp` functions is included in `#278
     <https://github.com/OpenSourceEconomics/respy/pull/288>`_.
 
+    If `skip_inadmissible` is true, the choice probabilities are only computed over the
+    admissible choices and the probability of an inadmissible choice is zero.
+
     Parameters
     ----------
     wages : numpy.ndarray
@@ -394,14 +1133,28 @@ def _simulate_log_probability_of_individuals_observed_choice(
         Array with shape (n_choices,).
     continuation_values : numpy.ndarray
         Array with shape (n_choices,)
-    draws : numpy.ndarray
-        Array with shape (n_draws, n_choices)
+    base_draws : numpy.ndarray
+        Array with shape (n_draws, n_choices) containing standard normal draws.
+    updated_mean : numpy.ndarray
+        Array with shape (n_choices,) containing the mean of the shocks conditional on
+        the observed wage.
+    updated_chols : numpy.ndarray
+        Array with shape (n_wages + 1, n_choices, n_choices) containing the Cholesky
+        factors of the conditional covariance matrices.
+    chol_index : int
+        Index of the relevant Cholesky factor.
+    max_log_float : float
+        Value at which numbers soon to be exponentiated are clipped.
     delta : float
         Discount rate.
     choice : int
         Choice of the agent.
     tau : float
         Smoothing parameter for choice probabilities.
+    is_inadmissible : numpy.ndarray
+        Array with shape (n_choices,) indicating inadmissible choices.
+    skip_inadmissible : bool
+        Indicator for whether inadmissible choices are skipped.
 
     Returns
     -------
@@ -409,21 +1162,52 @@ def _simulate_log_probability_of_individuals_observed_choice(
         Simulated Smoothed log probability of choice.
 
     """
-    n_draws, n_choices = draws.shape
+    n_draws, n_choices = base_draws.shape
+    n_wages = updated_chols.shape[0] - 1
+
+    # Collect the choices which are evaluated. The observed choice is stored first.
+    choices = np.empty(n_choices, dtype=np.int64)
+    n_evaluated = 0
+    if skip_inadmissible:
+        if is_inadmissible[choice]:
+            smoothed_log_probability[0] = -np.inf
+            return
+        choices[0] = choice
+        n_evaluated = 1
+        for j in range(n_choices):
+            if j != choice and not is_inadmissible[j]:
+                choices[n_evaluated] = j
+                n_evaluated += 1
+        position = 0
+    else:
+        for j in range(n_choices):
+            choices[j] = j
+        n_evaluated = n_choices
+        position = choice
 
     smoothed_log_probabilities = np.empty(n_draws)
-    smoothed_value_functions = np.empty(n_choices)
+    smoothed_value_functions = np.empty(n_evaluated)
 
     for i in range(n_draws):
 
-        for j in range(n_choices):
+        for k in range(n_evaluated):
+            j = choices[k]
+
+            draw = updated_mean[j]
+            for m in range(j + 1):
+                draw += base_draws[i, m] * updated_chols[chol_index, j, m]
+            if j < n_wages:
+                if draw > max_log_float:
+                    draw = max_log_float
+                draw = np.exp(draw)
+
             value_function, _ = aggregate_keane_wolpin_utility(
-                wages[j], nonpec[j], continuation_values[j], draws[i, j], delta,
+                wages[j], nonpec[j], continuation_values[j], draw, delta,
             )
 
-            smoothed_value_functions[j] = value_function / tau
+            smoothed_value_functions[k] = value_function / tau
 
-        smoothed_log_probabilities[i] = smoothed_value_functions[choice] - _logsumexp(
+        smoothed_log_probabilities[i] = smoothed_value_functions[position] - _logsumexp(
             smoothed_value_functions
         )
 
@@ -432,6 +1216,115 @@ def _simulate_log_probability_of_individuals_observed_choice(
     smoothed_log_probability[0] = smoothed_log_prob
 
 
+@nb.guvectorize(
+    ["f8[:], f8[:], f8[:], f8[:, :], f8, i8, f8, b1[:], b1, f8[:], f8[:], f8[:]"],
+    "(n_choices), (n_choices), (n_choices), (n_draws, n_choices), (), (), (), "
+    "(n_choices), () -> (), (n_choices), (n_choices)",
+    nopython=True,
+    target="parallel",
+)
+def _simulate_log_probability_and_weights_of_derivatives(
+    wages,
+    nonpec,
+    continuation_values,
+    draws,
+    delta,
+    choice,
+    tau,
+    is_inadmissible,
+    skip_inadmissible,
+    smoothed_log_probability,
+    probability_weights,
+    shock_weights,
+):
+    r"""Simulate the probability of the choice and the weights of its derivative.
+
+    The smoothed log probability is the same as in
+    :func:`_simulate_log_probability_of_individuals_observed_choice`. Let
+    :math:`\omega_r` be the share of draw :math:`r` in the simulated probability and
+    :math:`p_{rj}` the smoothed probability of choice :math:`j` for draw :math:`r`.
+    Then, the derivative of the log probability of choice :math:`c` is
+
+    .. math::
+
+        \frac{1}{\tau} \sum_r \sum_j \omega_r (1_{j = c} - p_{rj})
+        \frac{\partial v_{rj}}{\partial \theta}
+
+    where :math:`v_{rj}` is the value function. The function returns the sums over
+    draws of the weights and of the weights multiplied with the draws for every choice.
+
+    Returns
+    -------
+    smoothed_log_probability : float
+        Simulated Smoothed log probability of choice.
+    probability_weights : numpy.ndarray
+        Array with shape (n_choices,) containing the sum of weights.
+    shock_weights : numpy.ndarray
+        Array with shape (n_choices,) containing the sum of weights times draws.
+
+    """
+    n_draws, n_choices = draws.shape
+
+    for j in range(n_choices):
+        probability_weights[j] = 0
+        shock_weights[j] = 0
+
+    # Collect the choices which are evaluated. The observed choice is stored first.
+    choices = np.empty(n_choices, dtype=np.int64)
+    n_evaluated = 0
+    if skip_inadmissible:
+        if is_inadmissible[choice]:
+            smoothed_log_probability[0] = -np.inf
+            return
+        choices[0] = choice
+        n_evaluated = 1
+        for j in range(n_choices):
+            if j != choice and not is_inadmissible[j]:
+                choices[n_evaluated] = j
+                n_evaluated += 1
+        position = 0
+    else:
+        for j in range(n_choices):
+            choices[j] = j
+        n_evaluated = n_choices
+        position = choice
+
+    smoothed_log_probabilities = np.empty(n_draws)
+    smoothed_value_functions = np.empty((n_draws, n_evaluated))
+    log_sums = np.empty(n_draws)
+
+    for i in range(n_draws):
+
+        for k in range(n_evaluated):
+            j = choices[k]
+            value_function, _ = aggregate_keane_wolpin_utility(
+                wages[j], nonpec[j], continuation_values[j], draws[i, j], delta,
+            )
+
+            smoothed_value_functions[i, k] = value_function / tau
+
+        log_sums[i] = _logsumexp(smoothed_value_functions[i])
+        smoothed_log_probabilities[i] = (
+            smoothed_value_functions[i, position] - log_sums[i]
+        )
+
+    log_sum = _logsumexp(smoothed_log_probabilities)
+
+    smoothed_log_probability[0] = log_sum - np.log(n_draws)
+
+    for i in range(n_draws):
+        share = np.exp(smoothed_log_probabilities[i] - log_sum)
+
+        for k in range(n_evaluated):
+            j = choices[k]
+            weight = -share * np.exp(smoothed_value_functions[i, k] - log_sums[i])
+            if k == position:
+                weight += share
+
+            probability_weights[j] += weight
+            shock_weights[j] += weight * draws[i, j]
+
+
 def _process_estimation_data(df, state_space, optim_paras, options):
     """Process estimation data.
 
@@ -505,7 +1398,7 @@ def _process_estimation_data(df, state_space, optim_paras, options):
 
     # Add indices of child states to the DataFrame.
     children = pd.DataFrame(
-        data=state_space.indices_of_child_states[df["index"].to_numpy()],
+        data=state_space.indices_of_child_states_w_sentinel[df["index"].to_numpy()],
         index=df.index,
         columns=[f"child_index_{c}" for c in optim_paras["choices"]],
     )
@@ -560,8 +1453,17 @@ def _adjust_optim_paras_for_estimation(optim_paras, df):
     return optim_paras
 
 
-def _create_comparison_plot_data(df, log_type_probabilities, optim_paras):
+def _create_comparison_plot_data(df, loglikes, log_type_probabilities, optim_paras):
     """Create DataFrame for estimagic's comparison plot."""
+    df = pd.concat(
+        [
+            df.assign(
+                loglike_choice=loglikes[:, type_, 0], loglike_wage=loglikes[:, type_, 1]
+            )
+            for type_ in range(optim_paras["n_types"])
+        ]
+    ).sort_index()
+
     # During the likelihood calculation, the log likelihood for missing wages is
     # substituted with 0. Remove these log likelihoods to get the correct picture.
     df = df.loc[df.log_wage.notna()]
@@ -2,6 +2,7 @@
 import functools
 
 import joblib
+import numba as nb
 import numpy as np
 import pandas as pd
 
@@ -14,11 +15,10 @@ def parallelize_across_dense_dimensions(func=None, *, n_jobs=1):
 
     Parallelization is only possible if the decorated function has no side-effects to
     other dense dimensions. This might be true for different levels. E.g.
-    :meth:`respy.solve._create_choice_rewards` can be directly
-    parallelized. :func:`respy.solve.solve_with_backward_induction` cannot be
-    directly parallelized because the continuation values for one dense dimension will
-    become important for others if we implement exogenous processes. Thus, parallelize
-    across periods.
+    :meth:`respy.solve._full_solution` can be directly parallelized.
+    :func:`respy.solve.solve_with_backward_induction` cannot be directly parallelized
+    because the continuation values for one dense dimension will become important for
+    others if we implement exogenous processes. Thus, parallelize across periods.
 
     If applied to a function, the decorator recognizes if the model or state space
     contains dense dimensions likes types or observables. Then, it splits the operation
@@ -142,45 +142,112 @@ def split_and_combine_df(func=None, *, remove_type=False):
 def split_and_combine_likelihood(func):
     """Split the likelihood calculation across sub state spaces and combine.
 
-    If types are modeled, the data is duplicated for each type. Along with the data, the
-    shocks are split across the dense indices.
+    The groups of observations for each dense index are prepared once for every chunk
+    of the estimation plan, see :func:`respy.likelihood._create_estimation_plan`. Along
+    with the groups, the shocks are split across the dense indices. As the shocks are
+    ordered like the groups, each group receives a contiguous block of shocks.
+
+    The decorated function returns an array with one row per observation of the sub
+    state space. The arrays are combined to an array with shape (n_obs, n_types,
+    n_columns) where the rows follow the order of the data in the chunk.
 
     """
 
     @functools.wraps(func)
     def wrapper_distribute_and_combine_likelihood(
-        df, base_draws_est, *args, optim_paras, options
+        chunk, base_draws_est, *args, optim_paras, options
     ):
         dense_columns = create_dense_state_space_columns(optim_paras)
-        # Duplicate the DataFrame for each type.
-        if dense_columns:
-            n_obs = df.shape[0]
-            n_types = optim_paras["n_types"]
+        groups = chunk["groups"]
 
-            # Number each state to split the shocks later. This is necessary to keep the
-            # regression tests from failing.
-            df["__id"] = np.arange(n_obs)
-            # Each row of indices corresponds to a state whereas the columns refer to
-            # different types.
-            indices = np.arange(n_obs * n_types).reshape(n_obs, n_types)
+        if dense_columns:
+            splitted_shocks = {
+                dense_idx: base_draws_est[group["draws"]]
+                for dense_idx, group in groups.items()
+            }
+        else:
+            splitted_shocks = base_draws_est[groups["draws"]]
 
-            df_ = pd.concat([df.copy().assign(type=i) for i in range(n_types)])
-            splitted_df = _split_dataframe(df_, dense_columns)
+        out = func(groups, splitted_shocks, *args, optim_paras, options)
 
-            splitted_shocks = _split_shocks(
-                base_draws_est, splitted_df, indices, optim_paras
+        if isinstance(out, dict):
+            n_columns = next(iter(out.values())).shape[1]
+            combined = np.full(
+                (chunk["n_obs"], optim_paras["n_types"], n_columns), np.nan
             )
+            for dense_idx, array in out.items():
+                combined[groups[dense_idx]["rows"], groups[dense_idx]["type"]] = array
         else:
-            splitted_df = df
-            splitted_shocks = base_draws_est
+            combined = out.reshape(chunk["n_obs"], 1, -1)
+
+        return combined
+
+    return wrapper_distribute_and_combine_likelihood
 
-        out = func(splitted_df, splitted_shocks, *args, optim_paras, options)
 
-        out = pd.concat(out.values()).sort_index() if isinstance(out, dict) else out
+def parallelize_across_chunks(func):
+    """Parallelize the likelihood calculation across chunks of individuals.
+
+    The individuals in the estimation plan are split into chunks, see
+    :func:`respy.likelihood._create_estimation_plan`. The decorated function receives
+    one chunk and is evaluated for all chunks in a pool of
+    ``options["estimation_n_jobs"]`` threads. The returned arrays have one row per
+    individual or observation of the chunk and are concatenated in the order of the
+    chunks. Returned values which are ``None`` stay ``None``.
+
+    """
+
+    @functools.wraps(func)
+    def wrapper_parallelize_across_chunks(plan, *args, optim_paras, options):
+        out = joblib.Parallel(n_jobs=options["estimation_n_jobs"], prefer="threads")(
+            joblib.delayed(func)(chunk, *args, optim_paras, options)
+            for chunk in plan["chunks"]
+        )
+
+        if isinstance(out[0], tuple):
+            out = tuple(
+                None if list_[0] is None else np.concatenate(list_)
+                for list_ in zip(*out)
+            )
+        else:
+            out = np.concatenate(out)
 
         return out
 
-    return wrapper_distribute_and_combine_likelihood
+    return wrapper_parallelize_across_chunks
+
+
+def check_threading_layer_for_concurrent_kernels():
+    """Check that numba's threading layer allows concurrent parallel kernels.
+
+    If the chunks of the likelihood are evaluated in multiple threads, each thread
+    launches parallel numba kernels. The workqueue threading layer does not support
+    concurrent launches and deadlocks. The threading layer is selected when the first
+    parallel kernel is launched which is why a small kernel is launched before.
+
+    Raises
+    ------
+    ValueError
+        If the threading layer is neither tbb nor omp.
+
+    """
+    _launch_parallel_kernel(np.zeros(1))
+    threading_layer = nb.threading_layer()
+
+    if threading_layer not in ["tbb", "omp"]:
+        raise ValueError(
+            "Evaluating the likelihood in multiple threads with 'estimation_n_jobs' "
+            "larger than one requires a threadsafe threading layer of numba, but the "
+            f"threading layer is '{threading_layer}'. Install tbb or set "
+            "'estimation_n_jobs' to one."
+        )
+
+
+@nb.njit(parallel=True)
+def _launch_parallel_kernel(x):
+    """Launch a parallel kernel to initialize the threading layer of numba."""
+    for i in nb.prange(x.shape[0]):
+        x[i] = 0
 
 
 def _infer_dense_indices_from_arguments(args, kwargs):
@@ -256,22 +323,3 @@ def _split_dataframe(df, dense_columns):
     groups = convert_dictionary_keys_to_dense_indices(groups)
 
     return groups
-
-
-def _split_shocks(base_draws_est, splitted_df, indices, optim_paras):
-    """Split the shocks.
-
-    Previously, shocks were assigned to observations which were ordered like observation
-    * n_types. Due to the changes to the dense dimensions, this might not be true
-    anymore. Thus, ensure the former ordering with the `__id` variable. This will be
-    removed with new regression tests.
-
-    """
-    splitted_shocks = {}
-    for dense_idx, sub_df in splitted_df.items():
-        type_ = dense_idx[-1] if optim_paras["n_types"] >= 2 else 0
-        sub_indices = sub_df.pop("__id").to_numpy()
-        shock_indices_for_group = indices[sub_indices][:, type_].reshape(-1)
-        splitted_shocks[dense_idx] = base_draws_est[shock_indices_for_group]
-
-    return splitted_shocks
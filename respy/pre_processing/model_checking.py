@@ -13,6 +13,10 @@ def validate_options(o):
             assert _is_nonnegative_integer(value)
 
     assert 0 < o["estimation_tau"]
+    assert o["estimation_chunk_size"] is None or _is_positive_nonzero_integer(
+        o["estimation_chunk_size"]
+    )
+    assert _is_positive_nonzero_integer(o["estimation_n_jobs"])
     assert (
         _is_positive_nonzero_integer(o["interpolation_points"])
         or o["interpolation_points"] == -1
@@ -27,12 +31,37 @@ def validate_options(o):
         and all(isinstance(condition, str) for condition in val)
         for key, val in o["inadmissible_states"].items()
     )
-    assert o["monte_carlo_sequence"] in ["random", "halton", "sobol"]
+    assert isinstance(o["skip_inadmissible_choices"], bool)
+    assert o["monte_carlo_sequence"] in [
+        "random",
+        "halton",
+        "sobol",
+        "antithetic",
+        "philox",
+    ]
+    assert isinstance(o["solution_incremental"], bool)
+    assert o["solution_integration"] in [
+        "monte_carlo",
+        "gauss_hermite",
+        "smolyak",
+        "clark",
+    ]
+    assert _is_positive_nonzero_integer(o["solution_quadrature_order"])
+    assert isinstance(o["solution_control_variate"], bool)
+    assert o["solution_adaptive_tolerance"] is None or (
+        0 < o["solution_adaptive_tolerance"]
+        and o["solution_integration"] == "monte_carlo"
+        and not o["solution_control_variate"]
+        and o["monte_carlo_sequence"] != "antithetic"
+        and o["interpolation_points"] == -1
+    )
+    assert _is_positive_nonzero_integer(o["solution_adaptive_block_size"])
 
 
-def validate_params(params, optim_paras):
+def validate_params(params, optim_paras, options):
     """Validate params."""
     _validate_shocks(params, optim_paras)
+    _validate_adaptive_draws(optim_paras, options)
 
 
 def _validate_shocks(params, optim_paras):
@@ -70,6 +99,18 @@ def _validate_shocks(params, optim_paras):
     ), f"Reorder the 'name' index of the shock matrix to {index}."
 
 
+def _validate_adaptive_draws(optim_paras, options):
+    """Validate that the expected value functions can be computed with adaptive draws.
+
+    Myopic agents have no expected value functions such that the number of draws cannot
+    be adapted.
+
+    """
+    assert (
+        options["solution_adaptive_tolerance"] is None or optim_paras["delta"] != 0
+    ), "Adaptive draws are not available for myopic agents with 'delta' equal to zero."
+
+
 def _is_positive_nonzero_integer(x):
     return isinstance(x, (int, np.integer)) and x > 0
 
@@ -46,7 +46,7 @@ def process_params_and_options(params, options):
     optim_paras = _parse_parameters(params, options)
 
     optim_paras, options = _sync_optim_paras_and_options(optim_paras, options)
-    validate_params(params, optim_paras)
+    validate_params(params, optim_paras, options)
 
     return optim_paras, options
 
@@ -157,7 +157,8 @@ def _parse_inadmissibility_penalty(optim_paras, params):
     :func:`respy.solve._create_choice_rewards` if the alternative cannot be chosen. For
     example, Keane and Wolpin (1997) limit schooling to 20 years.
 
-    A warning is raise in :func:`respy.state_space._create_is_inadmissible` if the model
+    A warning is raise in
+    :func:`respy.state_space._warn_if_inadmissibility_penalty_is_missing` if the model
     includes inadmissible states but no penalty was specified. In this case, the default
     penalty is :data:`respy.config.INADMISSIBILITY_PENALTY`.
 
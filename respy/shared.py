@@ -4,6 +4,9 @@ This module should only import from other packages or modules of respy which als
 import from respy itself. This is to prevent circular imports.
 
 """
+import functools
+import tokenize
+
 import chaospy as cp
 import numba as nb
 import numpy as np
@@ -11,6 +14,8 @@ import pandas as pd
 
 from respy.config import MAX_LOG_FLOAT
 from respy.config import MIN_LOG_FLOAT
+from respy.formulas import evaluate_formulas
+from respy.formulas import get_variables_in_formula
 
 
 @nb.njit
@@ -64,6 +69,16 @@ def create_base_draws(shape, seed, monte_carlo_sequence):
     integrations. First, the calculation of the expected value function (EMAX) in the
     solution and the choice probabilities in the maximum likelihood estimation.
 
+    `"antithetic"` draws random standard normal shocks for the first half of the draws
+    and mirrors them for the second half. The antithetic pairs are negatively
+    correlated which reduces the variance of the Monte Carlo integrations. If the
+    number of draws is odd, the mirror image of the last draw is dropped.
+
+    `"philox"` draws random standard normal shocks with a counter-based generator. The
+    draws of each row along the first axis are a function of the seed and the row
+    number only such that any subset of rows can be regenerated on demand. See
+    :class:`CounterBasedDraws`.
+
     For the solution and estimation it is necessary to have the same randomness in every
     iteration. Otherwise, there is chatter in the simulation, i.e. a difference in
     simulated values not only due to different parameters but also due to draws (see
@@ -79,7 +94,7 @@ def create_base_draws(shape, seed, monte_carlo_sequence):
         Tuple representing the shape of the resulting array.
     seed : int
         Seed to control randomness.
-    monte_carlo_sequence : {"random", "halton", "sobol"}
+    monte_carlo_sequence : {"random", "halton", "sobol", "antithetic", "philox"}
         Name of the sequence.
 
     Returns
@@ -114,12 +129,234 @@ def create_base_draws(shape, seed, monte_carlo_sequence):
         distribution = cp.MvNormal(loc=np.zeros(n_choices), scale=np.eye(n_choices))
         draws = distribution.sample(n_points, rule="S").T.reshape(shape)
 
+    elif monte_carlo_sequence == "antithetic":
+        n_draws = shape[-2]
+        half = np.random.standard_normal((*shape[:-2], (n_draws + 1) // 2, n_choices))
+        draws = np.concatenate((half, -half), axis=-2)[..., :n_draws, :]
+
+    elif monte_carlo_sequence == "philox":
+        draws = np.asarray(CounterBasedDraws(shape, seed))
+
     else:
         raise NotImplementedError
 
     return draws
 
 
+class CounterBasedDraws:
+    """Standard normal draws which are generated on demand.
+
+    The draws are produced by the counter-based generator Philox4x32-10 of [1]_. The
+    key of the generator is the seed. The counter of a draw consists of the position
+    inside the row along the first axis and three 32-bit labels of the row. Thus, the
+    draws of a row only depend on its labels and indexing the object regenerates only
+    the selected rows, bit for bit identical to the rows of the full array.
+
+    In the estimation, a row corresponds to a combination of an observation and a type
+    and is labeled with the identifier, the period and the type. Thus, the draws of an
+    observation do not change if other individuals are added to or removed from the
+    data, and the draws need not be stored for the whole panel. By default, the rows
+    are labeled with their positions.
+
+    Parameters
+    ----------
+    shape : tuple(int)
+        Tuple representing the shape of the full array.
+    seed : int
+        Seed to control randomness.
+    labels : numpy.ndarray, optional
+        Array with shape (n_rows, 3) containing non-negative integers smaller than
+        :math:`2^{32}` which label the rows. The default labels the rows of the full
+        array with their positions.
+
+    Raises
+    ------
+    ValueError
+        If the labels are negative or do not fit into 32 bits.
+
+    References
+    ----------
+    .. [1] Salmon, J. K., Moraes, M. A., Dror, R. O. and Shaw, D. E. (2011).
+           `Parallel random numbers: As easy as 1, 2, 3
+           <https://doi.org/10.1145/2063384.2063405>`_. *Proceedings of the
+           International Conference for High Performance Computing, Networking,
+           Storage and Analysis*, 1-12.
+
+    """
+
+    def __init__(self, shape, seed, labels=None):
+        if labels is None:
+            rows = np.arange(shape[0], dtype=np.uint64)
+            labels = np.column_stack(
+                (
+                    rows & np.uint64(0xFFFFFFFF),
+                    rows >> np.uint64(32),
+                    np.zeros_like(rows),
+                )
+            )
+        elif (np.asarray(labels) < 0).any() or (np.asarray(labels) > 0xFFFFFFFF).any():
+            raise ValueError(
+                "The labels of counter-based draws must be non-negative integers which "
+                "fit into 32 bits."
+            )
+        self.seed = seed
+        self.labels = np.asarray(labels).astype(np.uint64)
+        self.shape = (len(self.labels), *shape[1:])
+
+    def __len__(self):
+        return self.shape[0]
+
+    def __getitem__(self, key):
+        labels = self.labels[key]
+        if labels.ndim == 1:
+            draws = CounterBasedDraws(self.shape, self.seed, labels[None])
+            out = np.asarray(draws)[0]
+        else:
+            out = CounterBasedDraws(self.shape, self.seed, labels)
+
+        return out
+
+    def __array__(self, dtype=None):
+        draws = np.empty((self.shape[0], int(np.prod(self.shape[1:]))))
+        _fill_with_philox_standard_normal_draws(
+            self.labels, self.seed & 0xFFFFFFFF, self.seed >> 32, draws
+        )
+        draws = draws.reshape(self.shape)
+
+        return draws if dtype is None else draws.astype(dtype)
+
+
+@nb.njit
+def _philox_4x32_10(counter_0, counter_1, counter_2, counter_3, key_0, key_1):
+    """Compute ten rounds of Philox4x32 on a counter of four 32-bit words.
+
+    All arguments are 32-bit words stored in unsigned 64-bit integers.
+
+    """
+    mask = np.uint64(0xFFFFFFFF)
+    shift = np.uint64(32)
+
+    for round_ in range(10):
+        if round_ > 0:
+            key_0 = (key_0 + np.uint64(0x9E3779B9)) & mask
+            key_1 = (key_1 + np.uint64(0xBB67AE85)) & mask
+
+        product_0 = np.uint64(0xD2511F53) * counter_0
+        product_1 = np.uint64(0xCD9E8D57) * counter_2
+        counter_0, counter_1, counter_2, counter_3 = (
+            (product_1 >> shift) ^ counter_1 ^ key_0,
+            product_1 & mask,
+            (product_0 >> shift) ^ counter_3 ^ key_1,
+            product_0 & mask,
+        )
+
+    return counter_0, counter_1, counter_2, counter_3
+
+
+@nb.njit(parallel=True)
+def _fill_with_philox_standard_normal_draws(labels, key_0, key_1, out):
+    """Fill an array with standard normal draws of the rows with the given labels.
+
+    Each call to Philox produces four 32-bit words which are converted to two uniform
+    numbers with 53 random bits and to two standard normal draws with the Box-Muller
+    transform. The counter is the position inside the row and the three labels.
+
+    Parameters
+    ----------
+    labels : numpy.ndarray
+        Array with shape (n_rows, 3) containing the 32-bit labels of the rows.
+    key_0, key_1 : int
+        Lower and upper 32 bits of the seed.
+    out : numpy.ndarray
+        Array with shape (n_rows, n_draws_per_row) which is filled with draws.
+
+    """
+    n_draws_per_row = out.shape[1]
+    key_0 = np.uint64(key_0)
+    key_1 = np.uint64(key_1)
+
+    for i in nb.prange(labels.shape[0]):
+        for j in range((n_draws_per_row + 1) // 2):
+            word_0, word_1, word_2, word_3 = _philox_4x32_10(
+                np.uint64(j), labels[i, 0], labels[i, 1], labels[i, 2], key_0, key_1
+            )
+
+            # The first uniform number lies in (0, 1) to be a valid argument of log.
+            uniform_0 = (
+                (word_0 >> np.uint64(5)) * np.uint64(67108864)
+                + (word_1 >> np.uint64(6))
+                + 0.5
+            ) / 9007199254740992
+            uniform_1 = (
+                (word_2 >> np.uint64(5)) * np.uint64(67108864)
+                + (word_3 >> np.uint64(6))
+            ) / 9007199254740992
+
+            radius = np.sqrt(-2 * np.log(uniform_0))
+            angle = 2 * np.pi * uniform_1
+            out[i, 2 * j] = radius * np.cos(angle)
+            if 2 * j + 1 < n_draws_per_row:
+                out[i, 2 * j + 1] = radius * np.sin(angle)
+
+
+@functools.lru_cache(maxsize=16)
+def create_quadrature_nodes_and_weights(n_choices, rule, order):
+    """Create Gauss-Hermite nodes and weights for the standard normal distribution.
+
+    The nodes and weights replace the draws of the Monte Carlo integration of the
+    expected value functions. As the draws, the nodes are transformed to the
+    distribution of the shocks in :func:`transform_base_draws_with_cholesky_factor` and
+    the integral is the weighted mean over the nodes.
+
+    `"gauss_hermite"` is the tensor product of one-dimensional Gauss-Hermite rules with
+    ``order + 1`` nodes such that the number of nodes grows exponentially with the
+    number of choices.
+
+    `"smolyak"` is the sparse grid of Gauss-Hermite rules proposed by [1]_. The number
+    of nodes grows only polynomially with the number of choices, e.g., a model with five
+    choices has 11 nodes for ``order = 1`` and 66 nodes for ``order = 2``. Note that
+    some weights of the sparse grid are negative.
+
+    Parameters
+    ----------
+    n_choices : int
+        Number of choices which is the dimension of the shocks.
+    rule : {"gauss_hermite", "smolyak"}
+        Name of the quadrature rule.
+    order : int
+        Order of the quadrature rule.
+
+    Returns
+    -------
+    nodes : numpy.ndarray
+        Array with shape (n_nodes, n_choices) containing the nodes.
+    weights : numpy.ndarray
+        Array with shape (n_nodes,) containing the weights which sum up to one.
+
+    References
+    ----------
+    .. [1] Heiss, F. and Winschel, V. (2008). `Likelihood approximation by numerical
+           integration on sparse grids <https://doi.org/10.1016/j.jeconom.2007.12.004>`_.
+           *Journal of Econometrics*, 144(1): 62-80.
+
+    """
+    if rule not in ["gauss_hermite", "smolyak"]:
+        raise NotImplementedError
+
+    distribution = cp.Iid(cp.Normal(0, 1), n_choices)
+    nodes, weights = cp.generate_quadrature(
+        order, distribution, rule="gaussian", sparse=rule == "smolyak"
+    )
+
+    # The arrays are cached and, thus, must not be changed.
+    nodes = np.ascontiguousarray(nodes.T)
+    nodes.flags.writeable = False
+    weights = np.ascontiguousarray(weights)
+    weights.flags.writeable = False
+
+    return nodes, weights
+
+
 def transform_base_draws_with_cholesky_factor(draws, shocks_cholesky, n_wages):
     r"""Transform standard normal draws with the Cholesky factor.
 
@@ -149,6 +386,21 @@ def transform_base_draws_with_cholesky_factor(draws, shocks_cholesky, n_wages):
     return draws_transformed
 
 
+def calculate_expected_shocks(shocks_cholesky, n_wages):
+    r"""Calculate the expected value of the shocks as they enter the flow utilities.
+
+    The expected value of the shocks is zero for non-working alternatives. For working
+    alternatives, the shocks are log normally distributed and cannot be set to zero, but
+    :math:`E(X) = \exp\{\mu + \frac{\sigma^2}{2}\}` where :math:`\mu = 0`.
+
+    """
+    expected_shocks = np.zeros(len(shocks_cholesky))
+    var = np.diag(shocks_cholesky.dot(shocks_cholesky.T))
+    expected_shocks[:n_wages] = np.exp(np.clip(var[:n_wages], 0, MAX_LOG_FLOAT) / 2)
+
+    return expected_shocks
+
+
 def generate_column_dtype_dict_for_estimation(optim_paras):
     """Generate column labels for data necessary for the estimation."""
     labels = (
@@ -220,9 +472,12 @@ def downcast_to_smallest_dtype(series, downcast_options=None):
 def compute_covariates(df, definitions, check_nans=False, raise_errors=True):
     """Compute covariates.
 
-    The function iterates over the definitions of covariates and tries to compute them.
-    It keeps track on how many covariates still need to be computed and stops if the
-    number does not change anymore. This might be due to missing information.
+    The function sorts the definitions of covariates topologically and selects the
+    covariates which can be computed. A covariate can be computed if its dependencies
+    are in the data or can be computed. Computable covariates are evaluated with one
+    compiled function, see :func:`respy.formulas.evaluate_formulas`, which is cached for
+    every combination of covariates. If the formulas cannot be compiled, they are
+    evaluated with ``df.eval``.
 
     Parameters
     ----------
@@ -253,49 +508,117 @@ def compute_covariates(df, definitions, check_nans=False, raise_errors=True):
         If variables cannot be computed and ``raise_errors`` is true.
 
     """
-    has_covariates_left_changed = True
-    covariates_left = list(definitions)
+    covariates_left = [cov for cov in definitions if cov not in df.columns]
+    index_or_columns = set(df.columns.union(df.index.names))
+    has_no_missings = {}
 
+    # Select the computable covariates. The topological order ensures that a single
+    # iteration suffices unless the dependencies are cyclic.
+    computable_covariates = []
+    has_covariates_left_changed = True
     while has_covariates_left_changed:
         n_covariates_left = len(covariates_left)
 
-        # Create a copy of `covariates_left` to remove elements without side-effects.
-        for covariate in covariates_left.copy():
-            # Check if the covariate does not exist and needs to be computed.
-            is_covariate_missing = covariate not in df.columns
-            if not is_covariate_missing:
-                covariates_left.remove(covariate)
-                continue
-
-            # Check that the dependencies are present.
-            index_or_columns = df.columns.union(df.index.names)
+        for covariate in _sort_covariates_topologically(covariates_left, definitions):
+            dependencies = definitions[covariate]["depends_on"]
             are_dependencies_present = all(
-                dep in index_or_columns for dep in definitions[covariate]["depends_on"]
+                dep in index_or_columns for dep in dependencies
             )
-            if are_dependencies_present:
-                # If true, perform checks for NaNs.
-                if check_nans:
-                    have_dependencies_no_missings = all(
-                        df.eval(f"{dep}.notna().all()")
-                        for dep in definitions[covariate]["depends_on"]
-                    )
-                else:
-                    have_dependencies_no_missings = True
-            else:
-                have_dependencies_no_missings = False
+            if are_dependencies_present and check_nans:
+                # Computed covariates inherit that their dependencies have no NaNs.
+                are_dependencies_present = all(
+                    _has_no_missings(df, dep, has_no_missings)
+                    for dep in dependencies
+                    if dep not in computable_covariates
+                )
 
-            if have_dependencies_no_missings:
-                df[covariate] = df.eval(definitions[covariate]["formula"])
+            if are_dependencies_present:
+                computable_covariates.append(covariate)
+                index_or_columns.add(covariate)
                 covariates_left.remove(covariate)
 
         has_covariates_left_changed = n_covariates_left != len(covariates_left)
 
+    formulas = [(cov, definitions[cov]["formula"]) for cov in computable_covariates]
+    try:
+        covariates = evaluate_formulas(formulas, df)
+    except NotImplementedError:
+        for covariate, formula in formulas:
+            df[covariate] = df.eval(formula)
+    else:
+        for covariate, values in covariates.items():
+            df[covariate] = values
+
     if covariates_left and raise_errors:
         raise Exception(f"Cannot compute all covariates: {covariates_left}.")
 
     return df
 
 
+def _sort_covariates_topologically(covariates, definitions):
+    """Sort covariates topologically.
+
+    A covariate depends on all variables in ``"depends_on"`` and in its formula. Ties
+    are broken by the order of the covariates and covariates with cyclic dependencies
+    are appended at the end.
+
+    """
+    key = tuple(
+        (
+            cov,
+            definitions[cov]["formula"],
+            tuple(sorted(definitions[cov]["depends_on"])),
+        )
+        for cov in covariates
+    )
+
+    return list(_sort_covariates_topologically_cached(key))
+
+
+@functools.lru_cache(maxsize=None)
+def _sort_covariates_topologically_cached(key):
+    covariates = [cov for cov, _, _ in key]
+
+    dependencies = {}
+    for covariate, formula, depends_on in key:
+        try:
+            variables = get_variables_in_formula(formula)
+        except (SyntaxError, tokenize.TokenError):
+            variables = ()
+        dependencies[covariate] = set(covariates).intersection(
+            depends_on + variables
+        ) - {covariate}
+
+    # Pass over the covariates in their order and append every covariate whose
+    # dependencies have already been appended until all covariates are sorted.
+    sorted_covariates = []
+    covariates_left = covariates.copy()
+    while covariates_left:
+        n_covariates_left = len(covariates_left)
+
+        for covariate in covariates_left.copy():
+            if dependencies[covariate].issubset(sorted_covariates):
+                sorted_covariates.append(covariate)
+                covariates_left.remove(covariate)
+
+        if n_covariates_left == len(covariates_left):
+            sorted_covariates += covariates_left
+            covariates_left = []
+
+    return tuple(sorted_covariates)
+
+
+def _has_no_missings(df, variable, cache):
+    if variable not in cache:
+        if variable in df.columns:
+            values = df[variable]
+        else:
+            values = df.index.get_level_values(variable)
+        cache[variable] = not pd.isna(values).any()
+
+    return cache[variable]
+
+
 def convert_labeled_variables_to_codes(df, optim_paras):
     """Convert labeled variables to codes.
 
@@ -351,13 +674,21 @@ def normalize_probabilities(probabilities):
 
 
 @nb.guvectorize(
-    ["f8, f8, f8, f8, f8, f8[:], f8[:]"],
-    "(), (), (), (), () -> (), ()",
+    ["f8, f8, f8, f8, f8, b1, b1, f8[:], f8[:]"],
+    "(), (), (), (), (), (), () -> (), ()",
     nopython=True,
     target="parallel",
 )
 def calculate_value_functions_and_flow_utilities(
-    wage, nonpec, continuation_value, draw, delta, value_function, flow_utility
+    wage,
+    nonpec,
+    continuation_value,
+    draw,
+    delta,
+    is_inadmissible,
+    skip_inadmissible,
+    value_function,
+    flow_utility,
 ):
     """Calculate the choice-specific value functions and flow utilities.
 
@@ -365,14 +696,21 @@ def calculate_value_functions_and_flow_utilities(
     this function uses :func:`numba.guvectorize`. One cannot use :func:`numba.vectorize`
     because it does not support multiple return values.
 
+    If `skip_inadmissible` is true, inadmissible choices are not evaluated. Their value
+    function is minus infinity and their flow utility is NaN.
+
     See also
     --------
     aggregate_keane_wolpin_utility
 
     """
-    value_function[0], flow_utility[0] = aggregate_keane_wolpin_utility(
-        wage, nonpec, continuation_value, draw, delta
-    )
+    if skip_inadmissible and is_inadmissible:
+        value_function[0] = -np.inf
+        flow_utility[0] = np.nan
+    else:
+        value_function[0], flow_utility[0] = aggregate_keane_wolpin_utility(
+            wage, nonpec, continuation_value, draw, delta
+        )
 
 
 def create_core_state_space_columns(optim_paras):
@@ -399,13 +737,22 @@ def create_state_space_columns(optim_paras):
 
 
 @nb.guvectorize(
-    ["f8[:], f8[:], f8[:], f8[:, :], f8, f8[:]"],
-    "(n_choices), (n_choices), (n_choices), (n_draws, n_choices), () -> ()",
+    ["f8[:], f8[:], f8[:], f8[:, :], f8[:], b1[:], b1, f8, f8[:]"],
+    "(n_choices), (n_choices), (n_choices), (n_draws, n_choices), (n_draws), "
+    "(n_choices), (), () -> ()",
     nopython=True,
     target="parallel",
 )
 def calculate_expected_value_functions(
-    wages, nonpecs, continuation_values, draws, delta, expected_value_functions
+    wages,
+    nonpecs,
+    continuation_values,
+    draws,
+    weights,
+    is_inadmissible,
+    skip_inadmissible,
+    delta,
+    expected_value_functions,
 ):
     r"""Calculate the expected maximum of value functions for a set of unobservables.
 
@@ -420,6 +767,15 @@ def calculate_expected_value_functions(
     points. In this setting, one wants to approximate the expected maximum utility of
     the current state.
 
+    The maximum utilities are averaged with `weights`. For the Monte Carlo integration,
+    all weights are one. For the quadrature rules of
+    :func:`create_quadrature_nodes_and_weights`, the draws are the transformed nodes and
+    the weights are the quadrature weights.
+
+    If `skip_inadmissible` is true, the maximum is only taken over admissible choices
+    instead of relying on the penalty in the non-pecuniary rewards of inadmissible
+    choices.
+
     Note that `wages` have the same length as `nonpecs` despite that wages are only
     available in some choices. Missing choices are filled with ones. In the case of a
     choice with wage and without wage, flow utilities are
@@ -440,6 +796,12 @@ def calculate_expected_value_functions(
         choice in the subsequent period.
     draws : numpy.ndarray
         Array with shape (n_draws, n_choices).
+    weights : numpy.ndarray
+        Array with shape (n_draws,) containing the weights of the draws.
+    is_inadmissible : numpy.ndarray
+        Array with shape (n_choices,) indicating inadmissible choices.
+    skip_inadmissible : bool
+        Indicator for whether inadmissible choices are skipped.
     delta : float
         The discount factor.
 
@@ -455,12 +817,16 @@ def calculate_expected_value_functions(
     n_draws, n_choices = draws.shape
 
     expected_value_functions[0] = 0
+    sum_of_weights = 0.0
 
     for i in range(n_draws):
 
         max_value_functions = 0
 
         for j in range(n_choices):
+            if skip_inadmissible and is_inadmissible[j]:
+                continue
+
             value_function, _ = aggregate_keane_wolpin_utility(
                 wages[j], nonpecs[j], continuation_values[j], draws[i, j], delta
             )
@@ -468,9 +834,10 @@ def calculate_expected_value_functions(
             if value_function > max_value_functions:
                 max_value_functions = value_function
 
-        expected_value_functions[0] += max_value_functions
+        expected_value_functions[0] += weights[i] * max_value_functions
+        sum_of_weights += weights[i]
 
-    expected_value_functions[0] /= n_draws
+    expected_value_functions[0] /= sum_of_weights
 
 
 def convert_dictionary_keys_to_dense_indices(dictionary):
@@ -489,3 +856,137 @@ def convert_dictionary_keys_to_dense_indices(dictionary):
         new_dictionary[new_key] = val
 
     return new_dictionary
+
+
+@nb.guvectorize(
+    ["f8[:], f8[:], f8[:], f8[:, :], f8[:], b1[:], b1, f8[:], f8, f8[:]"],
+    "(n_choices), (n_choices), (n_choices), (n_draws, n_choices), (n_draws), "
+    "(n_choices), (), (n_choices), () -> ()",
+    nopython=True,
+    target="parallel",
+)
+def calculate_controlled_expected_value_functions(
+    wages,
+    nonpecs,
+    continuation_values,
+    draws,
+    weights,
+    is_inadmissible,
+    skip_inadmissible,
+    expected_shocks,
+    delta,
+    expected_value_functions,
+):
+    r"""Calculate the expected maximum of value functions with a control variate.
+
+    The function is an alternative to :func:`calculate_expected_value_functions` which
+    reduces the variance of the Monte Carlo integration with a control variate (see
+    chapter 4.1 in [1]_). The control is the value function of the choice which has the
+    highest value function at the expected value of the shocks. The expected value of
+    the control is this maximum value function which is known without simulation. It
+    is the same quantity as the maximum in the right-hand side variables of the
+    interpolation in :func:`respy.interpolate._compute_rhs_variables`.
+
+    The estimate of the expected maximum utility is
+
+    .. math::
+
+        \hat{E}(\max) = \bar{M} - \hat{\beta} (\bar{C} - E(C))
+
+    where :math:`\bar{M}` and :math:`\bar{C}` are the averages of the maximum utility
+    and the control over all draws and :math:`\hat{\beta}` is the slope of the
+    regression of the maximum utility on the control.
+
+    Parameters
+    ----------
+    wages : numpy.ndarray
+        Array with shape (n_choices,) containing wages.
+    nonpecs : numpy.ndarray
+        Array with shape (n_choices,) containing non-pecuniary rewards.
+    continuation_values : numpy.ndarray
+        Array with shape (n_choices,) containing expected maximum utility for each
+        choice in the subsequent period.
+    draws : numpy.ndarray
+        Array with shape (n_draws, n_choices).
+    weights : numpy.ndarray
+        Array with shape (n_draws,) containing the weights of the draws.
+    is_inadmissible : numpy.ndarray
+        Array with shape (n_choices,) indicating inadmissible choices.
+    skip_inadmissible : bool
+        Indicator for whether inadmissible choices are skipped.
+    expected_shocks : numpy.ndarray
+        Array with shape (n_choices,) containing the expected value of the shocks, see
+        :func:`calculate_expected_shocks`.
+    delta : float
+        The discount factor.
+
+    Returns
+    -------
+    expected_value_functions : float
+        Expected maximum utility of an agent.
+
+    References
+    ----------
+    .. [1] Glasserman, P. (2004). Monte Carlo methods in financial engineering. New
+           York: Springer.
+
+    """
+    n_draws, n_choices = draws.shape
+
+    # The choice with the highest value function at the expected shocks is the control.
+    control_choice = 0
+    expected_control = -np.inf
+    for j in range(n_choices):
+        if skip_inadmissible and is_inadmissible[j]:
+            continue
+        value_function, _ = aggregate_keane_wolpin_utility(
+            wages[j], nonpecs[j], continuation_values[j], expected_shocks[j], delta
+        )
+        if value_function > expected_control:
+            control_choice = j
+            expected_control = value_function
+
+    # Accumulate moments of the maximum and the control centered around the expected
+    # control to prevent cancellation.
+    sum_of_weights = 0.0
+    sum_max = 0.0
+    sum_control = 0.0
+    sum_max_control = 0.0
+    sum_control_squared = 0.0
+
+    for i in range(n_draws):
+
+        max_value_functions = 0
+        control = 0.0
+
+        for j in range(n_choices):
+            if skip_inadmissible and is_inadmissible[j]:
+                continue
+
+            value_function, _ = aggregate_keane_wolpin_utility(
+                wages[j], nonpecs[j], continuation_values[j], draws[i, j], delta
+            )
+
+            if value_function > max_value_functions:
+                max_value_functions = value_function
+
+            if j == control_choice:
+                control = value_function
+
+        max_value_functions -= expected_control
+        control -= expected_control
+
+        sum_of_weights += weights[i]
+        sum_max += weights[i] * max_value_functions
+        sum_control += weights[i] * control
+        sum_max_control += weights[i] * max_value_functions * control
+        sum_control_squared += weights[i] * control ** 2
+
+    mean_max = sum_max / sum_of_weights
+    mean_control = sum_control / sum_of_weights
+    var_control = sum_control_squared / sum_of_weights - mean_control ** 2
+    cov_max_control = sum_max_control / sum_of_weights - mean_max * mean_control
+
+    beta = cov_max_control / var_control if var_control > 0 else 0.0
+
+    expected_value_functions[0] = expected_control + mean_max - beta * mean_control
@@ -10,6 +10,7 @@ from respy.config import COVARIATES_DOT_PRODUCT_DTYPE
 from respy.config import INDEXER_INVALID_INDEX
 from respy.parallelization import parallelize_across_dense_dimensions
 from respy.parallelization import split_and_combine_df
+from respy.pre_processing.model_processing import _read_params
 from respy.pre_processing.model_processing import process_params_and_options
 from respy.shared import calculate_value_functions_and_flow_utilities
 from respy.shared import compute_covariates
@@ -21,6 +22,8 @@ from respy.shared import rename_labels_from_internal
 from respy.shared import rename_labels_to_internal
 from respy.shared import transform_base_draws_with_cholesky_factor
 from respy.solve import get_solve_func
+from respy.state_space import load_params_of_state_space
+from respy.state_space import load_state_space
 
 
 def get_simulate_func(
@@ -29,6 +32,7 @@ def get_simulate_func(
     method="n_step_ahead_with_sampling",
     df=None,
     n_simulation_periods=None,
+    solution=None,
 ):
     """Get the simulation function.
 
@@ -51,6 +55,12 @@ def get_simulate_func(
         Simulate data for a number of periods. This options does not affect
         ``options["n_periods"]`` which controls the number of periods for which decision
         rules are computed.
+    solution : str or pathlib.Path or None
+        Path to a solved state space stored with
+        :func:`~respy.state_space.save_state_space`. If given, the model is not solved
+        in every simulation and the stored decision rules are used instead. Then, the
+        parameters passed to the simulation function must match the parameters of the
+        stored solution, otherwise a :class:`ValueError` is raised.
 
     Returns
     -------
@@ -68,7 +78,14 @@ def get_simulate_func(
         df, method, n_simulation_periods, options, optim_paras
     )
 
-    solve = get_solve_func(params, options)
+    if solution is None:
+        solve = get_solve_func(params, options)
+    else:
+        solve = functools.partial(
+            _get_stored_solution,
+            state_space=load_state_space(solution),
+            stored_params=load_params_of_state_space(solution),
+        )
 
     shape = (df.shape[0], len(optim_paras["choices"]))
     base_draws_sim = create_base_draws(
@@ -186,6 +203,7 @@ def simulate(params, base_draws_sim, base_draws_wage, df, solve, options):
             nonpecs,
             continuation_values,
             is_inadmissible,
+            options["skip_inadmissible_choices"],
             optim_paras=optim_paras,
         )
 
@@ -200,6 +218,26 @@ def simulate(params, base_draws_sim, base_draws_wage, df, solve, options):
     return simulated_data
 
 
+def _get_stored_solution(params, state_space, stored_params):
+    """Return a stored solution instead of solving the model with ``params``.
+
+    Raises
+    ------
+    ValueError
+        If ``params`` differ from the parameters of the stored solution.
+
+    """
+    params = _read_params(params).astype(float)
+    if not params.equals(stored_params):
+        raise ValueError(
+            "The parameters of the simulation differ from the parameters of the stored "
+            "solution. Solve and save the model with these parameters or simulate "
+            "without a stored solution."
+        )
+
+    return state_space
+
+
 def _extend_data_with_sampled_characteristics(df, optim_paras, options):
     """Sample initial observations from initial conditions.
 
@@ -275,7 +313,14 @@ def _extend_data_with_sampled_characteristics(df, optim_paras, options):
 @split_and_combine_df
 @parallelize_across_dense_dimensions
 def _simulate_single_period(
-    df, indexer, wages, nonpecs, continuation_values, is_inadmissible, optim_paras
+    df,
+    indexer,
+    wages,
+    nonpecs,
+    continuation_values,
+    is_inadmissible,
+    skip_inadmissible,
+    optim_paras,
 ):
     """Simulate individuals in a single period.
 
@@ -311,7 +356,13 @@ def _simulate_single_period(
     draws_wage = df[[f"meas_error_wage_{c}" for c in optim_paras["choices"]]].to_numpy()
 
     value_functions, flow_utilities = calculate_value_functions_and_flow_utilities(
-        wages, nonpecs, continuation_values, draws_shock, optim_paras["delta"],
+        wages,
+        nonpecs,
+        continuation_values,
+        draws_shock,
+        optim_paras["delta"],
+        is_inadmissible,
+        skip_inadmissible,
     )
 
     # We need to ensure that no individual chooses an inadmissible state. Thus, set
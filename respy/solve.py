@@ -1,14 +1,22 @@
 """Everything related to the solution of a structural model."""
 import functools
+import math
 
+import numba as nb
 import numpy as np
+import pandas as pd
 
-from respy.config import COVARIATES_DOT_PRODUCT_DTYPE
+from respy.config import CLARK_CHUNK_SIZE
 from respy.config import INADMISSIBILITY_PENALTY
+from respy.interpolate import _get_seeds_for_interpolation
 from respy.interpolate import interpolate
 from respy.parallelization import parallelize_across_dense_dimensions
 from respy.pre_processing.model_processing import process_params_and_options
+from respy.shared import aggregate_keane_wolpin_utility
+from respy.shared import calculate_controlled_expected_value_functions
+from respy.shared import calculate_expected_shocks
 from respy.shared import calculate_expected_value_functions
+from respy.shared import create_quadrature_nodes_and_weights
 from respy.shared import transform_base_draws_with_cholesky_factor
 from respy.state_space import create_state_space_class
 
@@ -42,100 +50,636 @@ def get_solve_func(params, options):
 
 
 def solve(params, options, state_space):
-    """Solve the model."""
+    """Solve the model.
+
+    The inputs of the solution are kept with the state space. If only parameters change
+    which do not affect the solution, e.g., the coefficients of type probabilities or
+    measurement errors, the already solved state space is returned.
+
+    If ``options["solution_incremental"]`` is true and only coefficients of rewards
+    changed, the next call restarts the backward induction from the last period in which
+    rewards changed. The expected value functions of all later periods are reused. This
+    is useful for numerical derivatives which perturb one parameter at a time. The
+    solution is identical to a solution from scratch.
+
+    ``options["solution_integration"]`` selects how the expected value functions are
+    computed. Besides Monte Carlo integration and the quadrature rules of
+    :func:`~respy.shared.create_quadrature_nodes_and_weights`, ``"clark"`` uses the
+    closed-form approximation in :func:`_clark_solution` which needs no draws.
+
+    """
     optim_paras, options = process_params_and_options(params, options)
 
-    states = state_space.states
-    is_inadmissible = state_space.get_attribute("is_inadmissible")
+    labels = _get_covariates_of_choice_rewards(optim_paras)
+    covariates = state_space.get_covariates(labels)
+    coefficients = [
+        _create_coefficients_of_choice_rewards(labels_, optim_paras)
+        for labels_ in state_space.split_covariates(labels)
+    ]
+    n_dense = len(getattr(state_space, "sub_state_spaces", [1]))
+    solution_inputs = _create_solution_inputs(
+        labels, coefficients, optim_paras, options
+    )
+
+    previous_solution = state_space._previous_solution
+    changed_choices = _find_choices_with_changed_rewards(
+        previous_solution, solution_inputs
+    )
+    if changed_choices is not None and changed_choices.size == 0:
+        return state_space
+
+    # The previous solution is invalid until the backward induction is completed.
+    state_space._previous_solution = None
 
-    wages, nonpecs = _create_choice_rewards(states, is_inadmissible, optim_paras)
-    state_space.set_attribute("wages", wages)
-    state_space.set_attribute("nonpecs", nonpecs)
+    # Inadmissible choices are only penalized if they are not skipped.
+    is_penalized = (
+        np.zeros_like(state_space.is_inadmissible)
+        if options["skip_inadmissible_choices"]
+        else state_space.is_inadmissible
+    )
 
-    state_space = _solve_with_backward_induction(state_space, optim_paras, options)
+    wages, nonpecs = _create_choice_rewards(
+        covariates, coefficients, is_penalized, n_dense, optim_paras
+    )
+
+    if changed_choices is None or not options["solution_incremental"]:
+        last_period = optim_paras["n_periods"] - 1
+    else:
+        # Rewards may only change in early periods, e.g., if the coefficient of a
+        # covariate changed which is zero after some age.
+        previous_wages, previous_nonpecs = previous_solution["rewards"]
+        is_changed = (wages != previous_wages) | (nonpecs != previous_nonpecs)
+        changed_states = np.flatnonzero(is_changed.any(axis=(0, 2)))
+        last_period = (
+            int(state_space.core["period"].to_numpy()[changed_states[-1]])
+            if changed_states.size
+            else -1
+        )
+
+    # The expected value functions of all dense dimensions share one array such that
+    # the backward induction can be run in a single compiled function. The trailing zero
+    # of each dense dimension is the continuation value of invalid child states.
+    if previous_solution is None:
+        n_dense, n_states, _ = wages.shape
+        expected_value_functions = np.zeros((n_dense, n_states + 1))
+    else:
+        expected_value_functions = previous_solution["expected_value_functions"]
+
+    _set_solution_attributes(state_space, wages, nonpecs, expected_value_functions)
+
+    # The transformed draws only change with the shocks. The base draws are fixed.
+    if previous_solution is not None and np.array_equal(
+        previous_solution["shocks_cholesky"], optim_paras["shocks_cholesky"]
+    ):
+        draws_emax_risk = previous_solution["draws_emax_risk"]
+    else:
+        draws_emax_risk = transform_base_draws_with_cholesky_factor(
+            state_space.base_draws_sol,
+            optim_paras["shocks_cholesky"],
+            len(optim_paras["choices_w_wage"]),
+        )
+
+    weights_emax_risk = _get_weights_of_solution_draws(
+        state_space, optim_paras, options
+    )
+    expected_shocks = (
+        calculate_expected_shocks(
+            optim_paras["shocks_cholesky"], len(optim_paras["choices_w_wage"])
+        )
+        if options["solution_control_variate"]
+        else None
+    )
+    is_interpolated = _get_periods_with_interpolation(state_space, options)
+
+    if (
+        optim_paras["delta"] == 0
+        or options["solution_integration"] == "clark"
+        or is_interpolated[: last_period + 1].any()
+    ):
+        state_space = _solve_with_backward_induction(
+            state_space,
+            draws_emax_risk,
+            weights_emax_risk,
+            expected_shocks,
+            optim_paras,
+            options,
+            last_period,
+        )
+        n_draws_used = None
+    else:
+        # Keep the number of draws of periods which are not solved again.
+        if previous_solution is None or previous_solution["n_draws_used"] is None:
+            n_draws_used = np.full(wages.shape[:2], draws_emax_risk.shape[1])
+        else:
+            n_draws_used = previous_solution["n_draws_used"]
+
+        _solve_all_periods_with_backward_induction(
+            wages,
+            nonpecs,
+            expected_value_functions,
+            n_draws_used,
+            state_space,
+            draws_emax_risk,
+            weights_emax_risk,
+            expected_shocks,
+            optim_paras,
+            options,
+            last_period,
+        )
+
+    if options["solution_adaptive_tolerance"] is None or n_draws_used is None:
+        state_space.solution_draws_statistics = None
+    else:
+        state_space.solution_draws_statistics = _create_solution_draws_statistics(
+            state_space, n_draws_used
+        )
+
+    state_space._previous_solution = {
+        **solution_inputs,
+        "rewards": (wages, nonpecs),
+        "expected_value_functions": expected_value_functions,
+        "n_draws_used": n_draws_used,
+        "draws_emax_risk": draws_emax_risk,
+    }
 
     return state_space
 
 
-@parallelize_across_dense_dimensions
-def _create_choice_rewards(states, is_inadmissible, optim_paras):
+def solve_many(params_list, options, state_space):
+    """Solve the model for many parameter vectors at once.
+
+    Finite differences and population-based optimizers evaluate the model at many
+    parameter vectors. Instead of solving the model for each of them, the rewards are
+    stacked along a new first axis and the backward induction runs once in
+    :func:`_backward_induction_many`. Thus, the indices of child states, the draws and
+    the overhead of the backward induction are shared by all parameter vectors.
+
+    The batched backward induction supports the full solution with Monte Carlo
+    integration or quadrature rules. Models with interpolation, Clark's approximation,
+    a control variate, adaptive draws or myopic agents are solved for one parameter
+    vector after another with :func:`solve`. The results are identical to the results
+    of :func:`solve`.
+
+    Parameters
+    ----------
+    params_list : list of pandas.DataFrame
+        Parameter vectors of the same model.
+    options : dict
+        Optimization independent model options.
+    state_space : :class:`~respy.state_space.StateSpace`
+        State space of the model, for example, ``solve.keywords["state_space"]`` where
+        ``solve`` is returned by :func:`get_solve_func`.
+
+    Returns
+    -------
+    solution : dict
+        Dictionary with the arrays ``"wages"`` and ``"nonpecs"`` with shape (n_params,
+        n_dense, n_states, n_choices) and ``"expected_value_functions_w_sentinel"``
+        with shape (n_params, n_dense, n_states + 1). Models without dense dimensions
+        have a single dense dimension. The solution of one parameter vector can be
+        stored in the state space with :func:`_set_solution_attributes`.
+
+    """
+    optim_paras_list = []
+    for params in params_list:
+        optim_paras, options = process_params_and_options(params, options)
+        optim_paras_list.append(optim_paras)
+
+    labels = _get_covariates_of_choice_rewards(optim_paras_list[0])
+    is_interpolated = _get_periods_with_interpolation(state_space, options)
+    is_batched = (
+        options["solution_integration"] != "clark"
+        and not options["solution_control_variate"]
+        and options["solution_adaptive_tolerance"] is None
+        and not is_interpolated.any()
+        and all(
+            optim_paras["delta"] != 0
+            and _get_covariates_of_choice_rewards(optim_paras) == labels
+            for optim_paras in optim_paras_list
+        )
+    )
+
+    if is_batched:
+        solution = _solve_many_with_backward_induction(
+            optim_paras_list, labels, options, state_space
+        )
+    else:
+        solution = {
+            "wages": [],
+            "nonpecs": [],
+            "expected_value_functions_w_sentinel": [],
+        }
+        for params in params_list:
+            state_space = solve(params, options, state_space)
+            wages, nonpecs = state_space._previous_solution["rewards"]
+            solution["wages"].append(wages.copy())
+            solution["nonpecs"].append(nonpecs.copy())
+            solution["expected_value_functions_w_sentinel"].append(
+                state_space._previous_solution["expected_value_functions"].copy()
+            )
+        solution = {key: np.stack(value) for key, value in solution.items()}
+
+    return solution
+
+
+def _solve_many_with_backward_induction(optim_paras_list, labels, options, state_space):
+    """Solve the model for many parameter vectors with a batched backward induction."""
+    n_params = len(optim_paras_list)
+    n_dense = len(getattr(state_space, "sub_state_spaces", [1]))
+    n_states, n_choices = state_space.is_inadmissible.shape
+    n_wages = len(optim_paras_list[0]["choices_w_wage"])
+
+    covariates = state_space.get_covariates(labels)
+    is_penalized = (
+        np.zeros_like(state_space.is_inadmissible)
+        if options["skip_inadmissible_choices"]
+        else state_space.is_inadmissible
+    )
+
+    wages = np.empty((n_params, n_dense, n_states, n_choices))
+    nonpecs = np.empty((n_params, n_dense, n_states, n_choices))
+    for i, optim_paras in enumerate(optim_paras_list):
+        coefficients = [
+            _create_coefficients_of_choice_rewards(labels_, optim_paras)
+            for labels_ in state_space.split_covariates(labels)
+        ]
+        wages[i], nonpecs[i] = _create_choice_rewards(
+            covariates, coefficients, is_penalized, n_dense, optim_paras
+        )
+
+    # Parameter vectors with the same shocks share the transformed draws.
+    draws_emax_risk = []
+    indices_of_draws = np.empty(n_params, dtype=np.int64)
+    for i, optim_paras in enumerate(optim_paras_list):
+        for j, other in enumerate(optim_paras_list[:i]):
+            if np.array_equal(other["shocks_cholesky"], optim_paras["shocks_cholesky"]):
+                indices_of_draws[i] = indices_of_draws[j]
+                break
+        else:
+            indices_of_draws[i] = len(draws_emax_risk)
+            draws_emax_risk.append(
+                transform_base_draws_with_cholesky_factor(
+                    state_space.base_draws_sol, optim_paras["shocks_cholesky"], n_wages
+                )
+            )
+
+    weights_emax_risk = _get_weights_of_solution_draws(
+        state_space, optim_paras_list[0], options
+    )
+    period_bounds = np.array(
+        [s.start for s in state_space.slices_by_periods]
+        + [state_space.slices_by_periods[-1].stop]
+    )
+    admissible_choices_pointers, admissible_choices = _get_evaluated_choices(
+        state_space, options
+    )
+    expected_value_functions = np.zeros((n_params, n_dense, n_states + 1))
+
+    _backward_induction_many(
+        wages,
+        nonpecs,
+        np.asarray(state_space.indices_of_child_states_w_sentinel),
+        period_bounds,
+        admissible_choices_pointers,
+        admissible_choices,
+        np.stack(draws_emax_risk),
+        indices_of_draws,
+        weights_emax_risk,
+        np.array([optim_paras["delta"] for optim_paras in optim_paras_list]),
+        optim_paras_list[0]["n_periods"] - 1,
+        expected_value_functions,
+    )
+
+    return {
+        "wages": wages,
+        "nonpecs": nonpecs,
+        "expected_value_functions_w_sentinel": expected_value_functions,
+    }
+
+
+def _set_solution_attributes(state_space, wages, nonpecs, expected_value_functions):
+    """Store the solution of one parameter vector in the state space.
+
+    Parameters
+    ----------
+    state_space : :class:`~respy.state_space.StateSpace`
+    wages : numpy.ndarray
+        Array with shape (n_dense, n_states, n_choices).
+    nonpecs : numpy.ndarray
+        Array with shape (n_dense, n_states, n_choices).
+    expected_value_functions : numpy.ndarray
+        Array with shape (n_dense, n_states + 1) containing the expected value functions
+        followed by a zero for every dense dimension.
+
+    """
+    for attribute, value in [
+        ("wages", wages),
+        ("nonpecs", nonpecs),
+        ("expected_value_functions_w_sentinel", expected_value_functions),
+    ]:
+        if hasattr(state_space, "sub_state_spaces"):
+            value = dict(zip(state_space.sub_state_spaces, value))
+        else:
+            value = value[0]
+        state_space.set_attribute(attribute, value)
+
+
+def _get_covariates_of_choice_rewards(optim_paras):
+    """Get the labels of all covariates used in wages and non-pecuniary rewards."""
+    labels = []
+    for choice in optim_paras["choices"]:
+        for reward in [f"wage_{choice}", f"nonpec_{choice}"]:
+            if reward in optim_paras:
+                labels += [i for i in optim_paras[reward].index if i not in labels]
+
+    return labels
+
+
+def _create_coefficients_of_choice_rewards(labels, optim_paras):
+    """Align the coefficients of wages and non-pecuniary rewards with the covariates.
+
+    Coefficients of covariates which are not in ``labels`` are ignored such that the
+    coefficients can be created for subsets of covariates.
+
+    Returns
+    -------
+    coefficients : numpy.ndarray
+        Array with shape (n_covariates, 2 * n_choices). The first n_choices columns
+        contain the coefficients of the log wage equations and the remaining columns the
+        coefficients of the non-pecuniary rewards. Unused covariates have zero
+        coefficients.
+
+    """
+    n_choices = len(optim_paras["choices"])
+    positions = {label: i for i, label in enumerate(labels)}
+
+    coefficients = np.zeros((len(labels), 2 * n_choices))
+
+    for i, choice in enumerate(optim_paras["choices"]):
+        for j, reward in enumerate(["wage", "nonpec"]):
+            if f"{reward}_{choice}" in optim_paras:
+                params = optim_paras[f"{reward}_{choice}"]
+                for label, value in params.items():
+                    if label in positions:
+                        coefficients[positions[label], j * n_choices + i] = value
+
+    return coefficients
+
+
+def _create_choice_rewards(
+    covariates, coefficients, is_inadmissible, n_dense, optim_paras,
+):
     """Create wage and non-pecuniary reward for each state and choice.
 
+    The log wages and non-pecuniary rewards of all choices are computed at once with
+    the stacked coefficients. The rewards from core covariates are computed with a
+    single matrix product and shared by all dense dimensions. The rewards from dense
+    covariates are a constant for each dense dimension which is broadcast to all states.
+    Only the rewards from mixed covariates require a batched matrix product over all
+    dense dimensions. The results are written to a single preallocated array instead of
+    calling the function for every dense dimension.
+
     Note that missing wages filled with ones and missing non-pecuniary rewards with
     zeros. This is done in :meth:`_initialize_attributes`.
 
+    Parameters
+    ----------
+    covariates : tuple of numpy.ndarray
+        Core, dense and mixed covariates from
+        :meth:`~respy.state_space._MultiDimStateSpace.get_covariates`. For state
+        spaces without dense dimensions, the dense and mixed covariates lack the first
+        axis.
+    coefficients : list of numpy.ndarray
+        Stacked coefficients of core, dense and mixed covariates, see
+        :func:`_create_coefficients_of_choice_rewards`.
+    is_inadmissible : numpy.ndarray
+        Array with shape (n_states, n_choices) indicating inadmissible choices which
+        are penalized.
+    n_dense : int
+        Number of dense dimensions which is one for state spaces without dense
+        dimensions.
+    optim_paras : dict
+
+    Returns
+    -------
+    wages : numpy.ndarray
+        Array with shape (n_dense, n_states, n_choices).
+    nonpecs : numpy.ndarray
+        Array with shape (n_dense, n_states, n_choices).
+
     """
-    n_states = states.shape[0]
+    core_covariates, dense_covariates, mixed_covariates = covariates
+    core_coefficients, dense_coefficients, mixed_coefficients = coefficients
+    n_states = core_covariates.shape[0]
+    n_dense_covariates = dense_coefficients.shape[0]
+    n_mixed_covariates = mixed_coefficients.shape[0]
     n_choices = len(optim_paras["choices"])
 
-    wages = np.ones((n_states, n_choices))
-    nonpecs = np.zeros((n_states, n_choices))
+    core_rewards = np.dot(core_covariates, core_coefficients).reshape(
+        n_states, 2, n_choices
+    )
+    dense_rewards = np.dot(
+        dense_covariates.reshape(n_dense, n_dense_covariates), dense_coefficients
+    ).reshape(n_dense, 2, n_choices)
 
-    for i, choice in enumerate(optim_paras["choices"]):
-        if f"wage_{choice}" in optim_paras:
-            wage_columns = optim_paras[f"wage_{choice}"].index
-            log_wage = np.dot(
-                states[wage_columns].to_numpy(dtype=COVARIATES_DOT_PRODUCT_DTYPE),
-                optim_paras[f"wage_{choice}"].to_numpy(),
-            )
-            wages[:, i] = np.exp(log_wage)
+    # The first axis separates log wages and non-pecuniary rewards such that both are
+    # contiguous arrays for every dense dimension.
+    rewards = np.empty((2, n_dense, n_states, n_choices))
+    np.add(
+        core_rewards.transpose(1, 0, 2)[:, None],
+        dense_rewards.transpose(1, 0, 2)[:, :, None],
+        out=rewards,
+    )
+    if n_mixed_covariates:
+        mixed_rewards = np.matmul(
+            mixed_covariates.reshape(n_dense, n_states, n_mixed_covariates),
+            mixed_coefficients,
+        ).reshape(n_dense, n_states, 2, n_choices)
+        rewards += mixed_rewards.transpose(2, 0, 1, 3)
 
-        if f"nonpec_{choice}" in optim_paras:
-            nonpec_columns = optim_paras[f"nonpec_{choice}"].index
-            nonpecs[:, i] = np.dot(
-                states[nonpec_columns].to_numpy(dtype=COVARIATES_DOT_PRODUCT_DTYPE),
-                optim_paras[f"nonpec_{choice}"].to_numpy(),
-            )
+    # Choices without wages have zero coefficients such that wages are one.
+    wages = np.exp(rewards[0], out=rewards[0])
+    nonpecs = rewards[1]
 
     # For inadmissible choices apply a penalty to the non-pecuniary rewards.
     penalty = optim_paras["inadmissibility_penalty"]
     penalty = INADMISSIBILITY_PENALTY if penalty is None else penalty
-    nonpecs[is_inadmissible] += penalty
+    nonpecs[:, is_inadmissible] += penalty
 
     return wages, nonpecs
 
 
-def _solve_with_backward_induction(state_space, optim_paras, options):
+def _create_solution_inputs(labels, coefficients, optim_paras, options):
+    """Collect all inputs which determine the solution for a given state space."""
+    return {
+        "labels": tuple(labels),
+        "coefficients": coefficients,
+        "shocks_cholesky": optim_paras["shocks_cholesky"],
+        "delta": optim_paras["delta"],
+        "inadmissibility_penalty": optim_paras["inadmissibility_penalty"],
+        "interpolation_points": options["interpolation_points"],
+        "solution_seed": options["solution_seed"],
+    }
+
+
+def _find_choices_with_changed_rewards(previous_solution, solution_inputs):
+    """Find the choices whose coefficients changed since the previous solution.
+
+    Returns
+    -------
+    changed_choices : numpy.ndarray or None
+        Indices of choices whose rewards have to be recomputed. The array is empty if
+        the solution did not change. :data:`None` if the previous solution cannot be
+        reused because there is none or other inputs than the coefficients of rewards
+        changed.
+
+    """
+    if previous_solution is None:
+        return None
+
+    for key in ["labels", "delta", "inadmissibility_penalty"]:
+        if previous_solution[key] != solution_inputs[key]:
+            return None
+    for key in ["shocks_cholesky", "interpolation_points", "solution_seed"]:
+        if not np.array_equal(previous_solution[key], solution_inputs[key]):
+            return None
+
+    is_changed = np.zeros(previous_solution["coefficients"][0].shape[1], dtype=bool)
+    for previous, current in zip(
+        previous_solution["coefficients"], solution_inputs["coefficients"]
+    ):
+        is_changed |= (previous != current).any(axis=0)
+
+    # Wages and non-pecuniary rewards of a choice are recomputed together.
+    is_changed = is_changed.reshape(2, -1).any(axis=0)
+
+    return np.flatnonzero(is_changed)
+
+
+def _create_solution_draws_statistics(state_space, n_draws_used):
+    """Create statistics on the number of draws used per period.
+
+    Parameters
+    ----------
+    state_space : :class:`~respy.state_space.StateSpace`
+    n_draws_used : numpy.ndarray
+        Array with shape (n_dense, n_states) containing the number of draws used for
+        every state.
+
+    Returns
+    -------
+    statistics : pandas.DataFrame
+        DataFrame with the period as index and the mean, minimum and maximum number of
+        draws used for the states of a period as columns.
+
+    """
+    periods = np.broadcast_to(state_space.core["period"].to_numpy(), n_draws_used.shape)
+    statistics = (
+        pd.DataFrame({"period": periods.ravel(), "n_draws": n_draws_used.ravel()})
+        .groupby("period")["n_draws"]
+        .agg(["mean", "min", "max"])
+    )
+
+    return statistics
+
+
+def _get_weights_of_solution_draws(state_space, optim_paras, options):
+    """Get the weights of the solution draws.
+
+    The Monte Carlo integration weights all draws equally. For quadrature rules, the
+    solution draws are the nodes of the rule and the weights are the quadrature weights.
+
+    """
+    if options["solution_integration"] in ["monte_carlo", "clark"]:
+        weights = np.ones(state_space.base_draws_sol.shape[1])
+    else:
+        _, weights = create_quadrature_nodes_and_weights(
+            len(optim_paras["choices"]),
+            options["solution_integration"],
+            options["solution_quadrature_order"],
+        )
+
+    return weights
+
+
+def _get_periods_with_interpolation(state_space, options):
+    """Indicate the periods in which the expected value functions are interpolated.
+
+    The number of interpolation points is the same for all periods. Thus, for some
+    periods the number of interpolation points is larger than the actual number of
+    states. In this case, no interpolation is needed.
+
+    """
+    n_core_states = np.array(
+        [len(range(s.start, s.stop)) for s in state_space.slices_by_periods]
+    )
+    n_dense_combinations = len(getattr(state_space, "sub_state_spaces", [1]))
+    n_states_in_period = n_core_states * n_dense_combinations
+
+    is_interpolated = (options["interpolation_points"] <= n_states_in_period) & (
+        options["interpolation_points"] != -1
+    )
+
+    return is_interpolated
+
+
+def _solve_with_backward_induction(
+    state_space,
+    draws_emax_risk,
+    weights_emax_risk,
+    expected_shocks,
+    optim_paras,
+    options,
+    last_period,
+):
     """Calculate utilities with backward induction.
 
     Parameters
     ----------
     state_space : :class:`~respy.state_space.StateSpace`
         State space of the model which is not solved yet.
+    draws_emax_risk : numpy.ndarray
+        Array with shape (n_periods, n_draws, n_choices) containing the solution draws
+        transformed with the Cholesky factor of the shocks.
+    weights_emax_risk : numpy.ndarray
+        Array with shape (n_draws,) containing the weights of the solution draws.
+    expected_shocks : numpy.ndarray or None
+        Array with shape (n_choices,) containing the expected value of the shocks. If
+        given, the expected value functions are computed with a control variate.
     optim_paras : dict
         Parsed model parameters affected by the optimization.
     options : dict
         Optimization independent model options.
+    last_period : int
+        The backward induction starts in this period. The expected value functions of
+        all later periods are taken from the previous solution.
 
     Returns
     -------
     state_space : :class:`~respy.state_space.StateSpace`
 
     """
-    n_wages = len(optim_paras["choices_w_wage"])
     n_periods = optim_paras["n_periods"]
 
-    draws_emax_risk = transform_base_draws_with_cholesky_factor(
-        state_space.base_draws_sol, optim_paras["shocks_cholesky"], n_wages
-    )
+    is_interpolated = _get_periods_with_interpolation(state_space, options)
 
     for period in reversed(range(n_periods)):
-        n_core_states = state_space.core.query("period == @period").shape[0]
+        any_interpolated = is_interpolated[period]
+
+        if period > last_period:
+            # Draw the seeds of the skipped interpolation to keep the seeds of the
+            # remaining periods.
+            if any_interpolated and optim_paras["delta"] != 0:
+                _get_seeds_for_interpolation(state_space, options)
+            continue
 
         wages = state_space.get_attribute_from_period("wages", period)
         nonpecs = state_space.get_attribute_from_period("nonpecs", period)
         continuation_values = state_space.get_continuation_values(period)
-        period_draws_emax_risk = draws_emax_risk[period]
-
-        # The number of interpolation points is the same for all periods. Thus, for
-        # some periods the number of interpolation points is larger than the actual
-        # number of states. In this case, no interpolation is needed.
-        n_dense_combinations = len(getattr(state_space, "sub_state_spaces", [1]))
-        n_states_in_period = n_core_states * n_dense_combinations
-        any_interpolated = (
-            options["interpolation_points"] <= n_states_in_period
-            and options["interpolation_points"] != -1
+        is_inadmissible = state_space.get_attribute_from_period(
+            "is_inadmissible", period
         )
+        period_draws_emax_risk = draws_emax_risk[period]
 
         # Handle myopic individuals.
         if optim_paras["delta"] == 0:
@@ -146,14 +690,37 @@ def _solve_with_backward_induction(state_space, optim_paras, options):
             else:
                 period_expected_value_functions = 0
 
+        elif options["solution_integration"] == "clark":
+            period_expected_value_functions = _clark_solution(
+                wages,
+                nonpecs,
+                continuation_values,
+                is_inadmissible,
+                optim_paras,
+                options,
+            )
+
         elif any_interpolated:
             period_expected_value_functions = interpolate(
-                state_space, period_draws_emax_risk, period, optim_paras, options
+                state_space,
+                period_draws_emax_risk,
+                weights_emax_risk,
+                period,
+                optim_paras,
+                options,
             )
 
         else:
             period_expected_value_functions = _full_solution(
-                wages, nonpecs, continuation_values, period_draws_emax_risk, optim_paras
+                wages,
+                nonpecs,
+                continuation_values,
+                period_draws_emax_risk,
+                weights_emax_risk,
+                expected_shocks,
+                is_inadmissible,
+                optim_paras,
+                options,
             )
 
         state_space.set_attribute_from_period(
@@ -163,22 +730,908 @@ def _solve_with_backward_induction(state_space, optim_paras, options):
     return state_space
 
 
+def _solve_all_periods_with_backward_induction(
+    wages,
+    nonpecs,
+    expected_value_functions,
+    n_draws_used,
+    state_space,
+    draws_emax_risk,
+    weights_emax_risk,
+    expected_shocks,
+    optim_paras,
+    options,
+    last_period,
+):
+    """Calculate the full solution of all periods in one compiled function.
+
+    In contrast to :func:`_solve_with_backward_induction`, there is no Python loop over
+    periods and dense dimensions. The function is used if there is no interpolation and
+    yields the same results as :func:`_full_solution` in every period.
+
+    If ``options["solution_adaptive_tolerance"]`` is not :data:`None`, the draws are
+    processed in blocks of ``options["solution_adaptive_block_size"]`` draws. The
+    integration of a state stops after a block if the standard error of the expected
+    value function relative to its absolute value is below the tolerance. Thus, states
+    where one choice dominates the others need only a fraction of the draws.
+
+    Parameters
+    ----------
+    wages : numpy.ndarray
+        Array with shape (n_dense, n_states, n_choices).
+    nonpecs : numpy.ndarray
+        Array with shape (n_dense, n_states, n_choices).
+    expected_value_functions : numpy.ndarray
+        Array with shape (n_dense, n_states + 1) which is filled in-place except for
+        the trailing zero of every dense dimension.
+    n_draws_used : numpy.ndarray
+        Array with shape (n_dense, n_states) which is filled in-place with the number
+        of draws used for every state.
+    state_space : :class:`~respy.state_space.StateSpace`
+    draws_emax_risk : numpy.ndarray
+        Array with shape (n_periods, n_draws, n_choices) containing the transformed
+        solution draws.
+    weights_emax_risk : numpy.ndarray
+        Array with shape (n_draws,) containing the weights of the solution draws.
+    expected_shocks : numpy.ndarray or None
+        Array with shape (n_choices,) containing the expected value of the shocks. If
+        given, the expected value functions are computed with a control variate.
+    optim_paras : dict
+    options : dict
+    last_period : int
+        The backward induction starts in this period.
+
+    """
+    period_bounds = np.array(
+        [s.start for s in state_space.slices_by_periods]
+        + [state_space.slices_by_periods[-1].stop]
+    )
+    control_variate = expected_shocks is not None
+    if not control_variate:
+        expected_shocks = np.zeros(wages.shape[2])
+    tolerance = options["solution_adaptive_tolerance"]
+
+    admissible_choices_pointers, admissible_choices = _get_evaluated_choices(
+        state_space, options
+    )
+
+    _backward_induction(
+        wages,
+        nonpecs,
+        np.asarray(state_space.indices_of_child_states_w_sentinel),
+        period_bounds,
+        admissible_choices_pointers,
+        admissible_choices,
+        draws_emax_risk,
+        weights_emax_risk,
+        expected_shocks,
+        control_variate,
+        0.0 if tolerance is None else tolerance,
+        options["solution_adaptive_block_size"],
+        optim_paras["delta"],
+        last_period,
+        expected_value_functions,
+        n_draws_used,
+    )
+
+
+def _get_evaluated_choices(state_space, options):
+    """Get the choices evaluated by the compiled backward induction.
+
+    The choices are stored in the compressed format of
+    :func:`~respy.state_space._create_admissible_choices`. Without skipping inadmissible
+    choices, all choices are evaluated.
+
+    """
+    if options["skip_inadmissible_choices"]:
+        admissible_choices_pointers = np.asarray(
+            state_space.admissible_choices_pointers
+        )
+        admissible_choices = np.asarray(state_space.admissible_choices)
+    else:
+        n_states, n_choices = state_space.is_inadmissible.shape
+        admissible_choices_pointers = np.arange(n_states + 1) * n_choices
+        admissible_choices = np.tile(np.arange(n_choices), n_states)
+
+    return admissible_choices_pointers, admissible_choices
+
+
+@nb.njit(parallel=True)
+def _backward_induction(
+    wages,
+    nonpecs,
+    indices_of_child_states,
+    period_bounds,
+    admissible_choices_pointers,
+    admissible_choices,
+    draws,
+    weights,
+    expected_shocks,
+    control_variate,
+    tolerance,
+    block_size,
+    delta,
+    last_period,
+    expected_value_functions,
+    n_draws_used,
+):
+    """Run the backward induction over all periods and dense dimensions.
+
+    The expected value functions of a period are computed as in
+    :func:`~respy.shared.calculate_expected_value_functions` or, if `control_variate`
+    is true, as in :func:`~respy.shared.calculate_controlled_expected_value_functions`
+    where the continuation values are gathered from the expected value functions of the
+    child states. Invalid child states point to the trailing zero of the expected value
+    functions.
+
+    If `tolerance` is positive, the draws are processed in blocks of `block_size` draws
+    and the integration of a state stops after a block if the standard error of the
+    mean of the maximum value functions is small enough.
+
+    Only the choices in `admissible_choices` are evaluated which are stored in the
+    compressed format of :func:`~respy.state_space._create_admissible_choices`. The
+    rewards and continuation values of these choices are gathered once per state.
+
+    """
+    n_dense = wages.shape[0]
+    n_draws = draws.shape[1]
+    adaptive = tolerance > 0
+    if not adaptive:
+        block_size = n_draws
+
+    for period in range(last_period, -1, -1):
+        start = period_bounds[period]
+        n_states_in_period = period_bounds[period + 1] - start
+
+        for k in nb.prange(n_dense * n_states_in_period):
+            dense = k // n_states_in_period
+            state = start + k % n_states_in_period
+
+            # Gather the rewards and continuation values of the evaluated choices.
+            first = admissible_choices_pointers[state]
+            n_evaluated = admissible_choices_pointers[state + 1] - first
+            choices = np.empty(n_evaluated, dtype=np.int64)
+            state_wages = np.empty(n_evaluated)
+            state_nonpecs = np.empty(n_evaluated)
+            continuation_values = np.empty(n_evaluated)
+            for m in range(n_evaluated):
+                j = admissible_choices[first + m]
+                choices[m] = j
+                state_wages[m] = wages[dense, state, j]
+                state_nonpecs[m] = nonpecs[dense, state, j]
+                continuation_values[m] = expected_value_functions[
+                    dense, indices_of_child_states[state, j]
+                ]
+
+            # The moments of the maximum and the control are centered around the
+            # expected control which is zero without a control variate.
+            control_choice = -1
+            expected_control = 0.0
+            if control_variate:
+                expected_control = -np.inf
+                for m in range(n_evaluated):
+                    value_function, _ = aggregate_keane_wolpin_utility(
+                        state_wages[m],
+                        state_nonpecs[m],
+                        continuation_values[m],
+                        expected_shocks[choices[m]],
+                        delta,
+                    )
+                    if value_function > expected_control:
+                        control_choice = m
+                        expected_control = value_function
+
+            expected_value_function = 0.0
+            sum_of_weights = 0.0
+            sum_control = 0.0
+            sum_max_control = 0.0
+            sum_control_squared = 0.0
+            shift = 0.0
+            sum_shifted = 0.0
+            sum_shifted_squared = 0.0
+            n_draws_used[dense, state] = n_draws
+
+            for block_start in range(0, n_draws, block_size):
+                block_end = min(block_start + block_size, n_draws)
+
+                for i in range(block_start, block_end):
+
+                    max_value_functions = 0.0
+                    control = 0.0
+
+                    for m in range(n_evaluated):
+                        value_function, _ = aggregate_keane_wolpin_utility(
+                            state_wages[m],
+                            state_nonpecs[m],
+                            continuation_values[m],
+                            draws[period, i, choices[m]],
+                            delta,
+                        )
+
+                        if value_function > max_value_functions:
+                            max_value_functions = value_function
+
+                        if m == control_choice:
+                            control = value_function
+
+                    max_value_functions -= expected_control
+                    expected_value_function += weights[i] * max_value_functions
+                    sum_of_weights += weights[i]
+
+                    if control_variate:
+                        control -= expected_control
+                        sum_control += weights[i] * control
+                        sum_max_control += weights[i] * max_value_functions * control
+                        sum_control_squared += weights[i] * control ** 2
+
+                    # The sums are shifted by the first value to prevent cancellation.
+                    if adaptive:
+                        if i == 0:
+                            shift = max_value_functions
+                        sum_shifted += max_value_functions - shift
+                        sum_shifted_squared += (max_value_functions - shift) ** 2
+
+                if adaptive and block_end < n_draws:
+                    mean = shift + sum_shifted / block_end
+                    variance = (sum_shifted_squared - sum_shifted ** 2 / block_end) / (
+                        block_end - 1
+                    )
+                    if variance / block_end <= (tolerance * mean) ** 2:
+                        n_draws_used[dense, state] = block_end
+                        break
+
+            expected_value_function /= sum_of_weights
+
+            if control_variate:
+                mean_control = sum_control / sum_of_weights
+                var_control = sum_control_squared / sum_of_weights - mean_control ** 2
+                cov_max_control = (
+                    sum_max_control / sum_of_weights
+                    - expected_value_function * mean_control
+                )
+                beta = cov_max_control / var_control if var_control > 0 else 0.0
+                expected_value_function += expected_control - beta * mean_control
+
+            expected_value_functions[dense, state] = expected_value_function
+
+
+@nb.njit(parallel=True)
+def _backward_induction_many(
+    wages,
+    nonpecs,
+    indices_of_child_states,
+    period_bounds,
+    admissible_choices_pointers,
+    admissible_choices,
+    draws,
+    indices_of_draws,
+    weights,
+    deltas,
+    last_period,
+    expected_value_functions,
+):
+    """Run the backward induction for many parameter vectors at once.
+
+    The function computes the same expected value functions as
+    :func:`_backward_induction` without a control variate and adaptive draws for every
+    parameter vector. The loop over parameter vectors is inside the loop over draws
+    such that the draws and the indices of child states are loaded once per state.
+
+    Parameters
+    ----------
+    wages : numpy.ndarray
+        Array with shape (n_params, n_dense, n_states, n_choices).
+    nonpecs : numpy.ndarray
+        Array with shape (n_params, n_dense, n_states, n_choices).
+    indices_of_child_states : numpy.ndarray
+        Array with shape (n_states, n_choices) where invalid child states point to the
+        trailing zero of the expected value functions.
+    period_bounds : numpy.ndarray
+        Array with shape (n_periods + 1,) containing the first state of each period.
+    admissible_choices_pointers : numpy.ndarray
+        Array with shape (n_states + 1,).
+    admissible_choices : numpy.ndarray
+        Choices evaluated for each state, see :func:`_get_evaluated_choices`.
+    draws : numpy.ndarray
+        Array with shape (n_shocks, n_periods, n_draws, n_choices) containing the
+        transformed draws of all distinct shocks.
+    indices_of_draws : numpy.ndarray
+        Array with shape (n_params,) containing the index of the draws of every
+        parameter vector.
+    weights : numpy.ndarray
+        Array with shape (n_draws,) containing the weights of the draws.
+    deltas : numpy.ndarray
+        Array with shape (n_params,) containing the discount factors.
+    last_period : int
+        The backward induction starts in this period.
+    expected_value_functions : numpy.ndarray
+        Array with shape (n_params, n_dense, n_states + 1) which is filled in-place
+        except for the trailing zeros.
+
+    """
+    n_params, n_dense = wages.shape[:2]
+    n_draws = draws.shape[2]
+
+    for period in range(last_period, -1, -1):
+        start = period_bounds[period]
+        n_states_in_period = period_bounds[period + 1] - start
+
+        for k in nb.prange(n_dense * n_states_in_period):
+            dense = k // n_states_in_period
+            state = start + k % n_states_in_period
+
+            # Gather the rewards and continuation values of the evaluated choices.
+            first = admissible_choices_pointers[state]
+            n_evaluated = admissible_choices_pointers[state + 1] - first
+            choices = np.empty(n_evaluated, dtype=np.int64)
+            state_wages = np.empty((n_params, n_evaluated))
+            state_nonpecs = np.empty((n_params, n_evaluated))
+            continuation_values = np.empty((n_params, n_evaluated))
+            for m in range(n_evaluated):
+                j = admissible_choices[first + m]
+                child = indices_of_child_states[state, j]
+                choices[m] = j
+                for p in range(n_params):
+                    state_wages[p, m] = wages[p, dense, state, j]
+                    state_nonpecs[p, m] = nonpecs[p, dense, state, j]
+                    continuation_values[p, m] = expected_value_functions[
+                        p, dense, child
+                    ]
+
+            sums = np.zeros(n_params)
+            sum_of_weights = 0.0
+
+            for i in range(n_draws):
+                for p in range(n_params):
+                    max_value_functions = 0.0
+
+                    for m in range(n_evaluated):
+                        value_function, _ = aggregate_keane_wolpin_utility(
+                            state_wages[p, m],
+                            state_nonpecs[p, m],
+                            continuation_values[p, m],
+                            draws[indices_of_draws[p], period, i, choices[m]],
+                            deltas[p],
+                        )
+
+                        if value_function > max_value_functions:
+                            max_value_functions = value_function
+
+                    sums[p] += weights[i] * max_value_functions
+
+                sum_of_weights += weights[i]
+
+            for p in range(n_params):
+                expected_value_functions[p, dense, state] = sums[p] / sum_of_weights
+
+
+def _get_reward_parameters(optim_paras):
+    """Get the coefficients of wages and non-pecuniary rewards in the parameter vector.
+
+    Returns
+    -------
+    index : list of tuple
+        Index of the coefficients in the parameter vector.
+    columns : numpy.ndarray
+        Array with shape (n_parameters,) containing the column of every coefficient in
+        the stacked coefficients of :func:`_create_coefficients_of_choice_rewards`.
+
+    """
+    n_choices = len(optim_paras["choices"])
+
+    index = []
+    columns = []
+    for i, choice in enumerate(optim_paras["choices"]):
+        for j, reward in enumerate(["wage", "nonpec"]):
+            if f"{reward}_{choice}" in optim_paras:
+                for label in optim_paras[f"{reward}_{choice}"].index:
+                    index.append((f"{reward}_{choice}", label))
+                    columns.append(j * n_choices + i)
+
+    return index, np.array(columns, dtype=np.int64)
+
+
+def _create_covariates_of_reward_parameters(state_space, labels, names):
+    """Create the covariate of every coefficient of the rewards for all states.
+
+    Returns
+    -------
+    covariates : numpy.ndarray
+        Array with shape (n_dense, n_states, n_parameters) where the last axis follows
+        the covariates in ``names``.
+
+    """
+    core_labels, dense_labels, mixed_labels = state_space.split_covariates(labels)
+    core_covariates, dense_covariates, mixed_covariates = state_space.get_covariates(
+        labels
+    )
+    n_dense = len(getattr(state_space, "sub_state_spaces", [1]))
+    n_states = core_covariates.shape[0]
+
+    covariates = np.concatenate(
+        [
+            np.broadcast_to(core_covariates, (n_dense, n_states, len(core_labels))),
+            np.broadcast_to(
+                dense_covariates.reshape(n_dense, 1, len(dense_labels)),
+                (n_dense, n_states, len(dense_labels)),
+            ),
+            mixed_covariates.reshape(n_dense, n_states, len(mixed_labels)),
+        ],
+        axis=2,
+    )
+
+    split_labels = core_labels + dense_labels + mixed_labels
+    positions = [split_labels.index(name) for name in names]
+
+    return covariates[..., positions]
+
+
+def _solve_derivatives_of_expected_value_functions(state_space, optim_paras, options):
+    """Compute the derivatives of the expected value functions.
+
+    The derivatives of the expected value functions with respect to the coefficients of
+    wages and non-pecuniary rewards are propagated through the backward induction with
+    :func:`_backward_induction_of_derivatives`. The state space must hold the solution
+    of ``optim_paras`` computed by :func:`solve`.
+
+    Returns
+    -------
+    derivatives : dict
+        Dictionary with the ``"index"`` and the ``"columns"`` of
+        :func:`_get_reward_parameters`, the ``"covariates"`` of
+        :func:`_create_covariates_of_reward_parameters` and the derivatives of the
+        ``"expected_value_functions_w_sentinel"`` with shape (n_dense, n_states + 1,
+        n_parameters).
+
+    """
+    index, columns = _get_reward_parameters(optim_paras)
+    labels = _get_covariates_of_choice_rewards(optim_paras)
+    covariates = _create_covariates_of_reward_parameters(
+        state_space, labels, [name for _, name in index]
+    )
+
+    solution = state_space._previous_solution
+    wages, nonpecs = solution["rewards"]
+    n_dense, n_states, _ = wages.shape
+
+    # Myopic agents have no expected value functions.
+    derivatives = np.zeros((n_dense, n_states + 1, len(index)))
+    if optim_paras["delta"] != 0:
+        period_bounds = np.array(
+            [s.start for s in state_space.slices_by_periods]
+            + [state_space.slices_by_periods[-1].stop]
+        )
+        admissible_choices_pointers, admissible_choices = _get_evaluated_choices(
+            state_space, options
+        )
+        _backward_induction_of_derivatives(
+            wages,
+            nonpecs,
+            solution["expected_value_functions"],
+            covariates,
+            columns,
+            np.asarray(state_space.indices_of_child_states_w_sentinel),
+            period_bounds,
+            admissible_choices_pointers,
+            admissible_choices,
+            solution["draws_emax_risk"],
+            _get_weights_of_solution_draws(state_space, optim_paras, options),
+            optim_paras["delta"],
+            derivatives,
+        )
+
+    return {
+        "index": index,
+        "columns": columns,
+        "covariates": covariates,
+        "expected_value_functions_w_sentinel": derivatives,
+    }
+
+
+@nb.njit(parallel=True)
+def _backward_induction_of_derivatives(
+    wages,
+    nonpecs,
+    expected_value_functions,
+    covariates,
+    columns,
+    indices_of_child_states,
+    period_bounds,
+    admissible_choices_pointers,
+    admissible_choices,
+    draws,
+    weights,
+    delta,
+    derivatives,
+):
+    r"""Propagate derivatives of rewards through the backward induction.
+
+    The simulated expected value function is the weighted mean of the maximum of the
+    value functions over all draws. Almost everywhere, the derivative of the maximum is
+    the derivative of the value function of the maximizing choice. Thus, the derivative
+    of the expected value function of a state is
+
+    .. math::
+
+        \frac{\partial EV}{\partial \theta} = \sum_j P_j \left(
+            \frac{\partial w_j}{\partial \theta} \bar{\epsilon}_j
+            + \frac{\partial n_j}{\partial \theta}
+            + \delta \frac{\partial EV_j}{\partial \theta}
+        \right)
+
+    where :math:`P_j` is the share of draws for which choice :math:`j` is the maximum,
+    :math:`\bar{\epsilon}_j` is the mean of the shocks of those draws, :math:`w_j`,
+    :math:`n_j` are the wage and the non-pecuniary reward and :math:`EV_j` is the
+    expected value function of the child state. The derivative of the wage with respect
+    to a coefficient of the log wage is the wage times the covariate and the derivative
+    of the non-pecuniary reward is the covariate.
+
+    The argmax is determined exactly as in :func:`_backward_induction` such that the
+    derivatives belong to the expected value functions of the solution.
+
+    Parameters
+    ----------
+    wages : numpy.ndarray
+        Array with shape (n_dense, n_states, n_choices).
+    nonpecs : numpy.ndarray
+        Array with shape (n_dense, n_states, n_choices).
+    expected_value_functions : numpy.ndarray
+        Array with shape (n_dense, n_states + 1) containing the solution.
+    covariates : numpy.ndarray
+        Array with shape (n_dense, n_states, n_parameters) containing the covariate of
+        every coefficient.
+    columns : numpy.ndarray
+        Array with shape (n_parameters,) where values below n_choices are coefficients
+        of the log wage of the choice and the remaining values are coefficients of the
+        non-pecuniary reward of the choice minus n_choices.
+    derivatives : numpy.ndarray
+        Array with shape (n_dense, n_states + 1, n_parameters) which is filled in-place
+        except for the trailing zeros.
+
+    """
+    n_dense, _, n_choices = wages.shape
+    n_draws = draws.shape[1]
+    n_parameters = columns.shape[0]
+    n_periods = period_bounds.shape[0] - 1
+
+    for period in range(n_periods - 1, -1, -1):
+        start = period_bounds[period]
+        n_states_in_period = period_bounds[period + 1] - start
+
+        for k in nb.prange(n_dense * n_states_in_period):
+            dense = k // n_states_in_period
+            state = start + k % n_states_in_period
+
+            first = admissible_choices_pointers[state]
+            n_evaluated = admissible_choices_pointers[state + 1] - first
+            choices = np.empty(n_evaluated, dtype=np.int64)
+            positions = np.full(n_choices, -1, dtype=np.int64)
+            state_wages = np.empty(n_evaluated)
+            state_nonpecs = np.empty(n_evaluated)
+            continuation_values = np.empty(n_evaluated)
+            for m in range(n_evaluated):
+                j = admissible_choices[first + m]
+                choices[m] = j
+                positions[j] = m
+                state_wages[m] = wages[dense, state, j]
+                state_nonpecs[m] = nonpecs[dense, state, j]
+                continuation_values[m] = expected_value_functions[
+                    dense, indices_of_child_states[state, j]
+                ]
+
+            # Accumulate the share of draws and the shocks for which a choice is the
+            # maximum. The maximum is bounded from below by zero like in the solution.
+            probabilities = np.zeros(n_evaluated)
+            shocks = np.zeros(n_evaluated)
+            sum_of_weights = 0.0
+
+            for i in range(n_draws):
+                max_value_functions = 0.0
+                maximizer = -1
+
+                for m in range(n_evaluated):
+                    value_function, _ = aggregate_keane_wolpin_utility(
+                        state_wages[m],
+                        state_nonpecs[m],
+                        continuation_values[m],
+                        draws[period, i, choices[m]],
+                        delta,
+                    )
+
+                    if value_function > max_value_functions:
+                        max_value_functions = value_function
+                        maximizer = m
+
+                if maximizer >= 0:
+                    probabilities[maximizer] += weights[i]
+                    shocks[maximizer] += (
+                        weights[i] * draws[period, i, choices[maximizer]]
+                    )
+                sum_of_weights += weights[i]
+
+            for m in range(n_evaluated):
+                probabilities[m] /= sum_of_weights
+                shocks[m] /= sum_of_weights
+
+            for p in range(n_parameters):
+                m = positions[columns[p] % n_choices]
+                derivative = 0.0
+                if m >= 0:
+                    if columns[p] < n_choices:
+                        derivative = (
+                            shocks[m] * state_wages[m] * covariates[dense, state, p]
+                        )
+                    else:
+                        derivative = probabilities[m] * covariates[dense, state, p]
+
+                for m in range(n_evaluated):
+                    child = indices_of_child_states[state, choices[m]]
+                    derivative += (
+                        delta * probabilities[m] * derivatives[dense, child, p]
+                    )
+
+                derivatives[dense, state, p] = derivative
+
+
 @parallelize_across_dense_dimensions
 def _full_solution(
-    wages, nonpecs, continuation_values, period_draws_emax_risk, optim_paras
+    wages,
+    nonpecs,
+    continuation_values,
+    period_draws_emax_risk,
+    weights_emax_risk,
+    expected_shocks,
+    is_inadmissible,
+    optim_paras,
+    options,
 ):
     """Calculate the full solution of the model.
 
     In contrast to approximate solution, the Monte Carlo integration is done for each
-    state and not only a subset.
+    state and not only a subset. If `expected_shocks` are given, the integration uses
+    a control variate.
+
+    """
+    if expected_shocks is None:
+        period_expected_value_functions = calculate_expected_value_functions(
+            wages,
+            nonpecs,
+            continuation_values,
+            period_draws_emax_risk,
+            weights_emax_risk,
+            is_inadmissible,
+            options["skip_inadmissible_choices"],
+            optim_paras["delta"],
+        )
+    else:
+        period_expected_value_functions = calculate_controlled_expected_value_functions(
+            wages,
+            nonpecs,
+            continuation_values,
+            period_draws_emax_risk,
+            weights_emax_risk,
+            is_inadmissible,
+            options["skip_inadmissible_choices"],
+            expected_shocks,
+            optim_paras["delta"],
+        )
+
+    return period_expected_value_functions
+
+
+@parallelize_across_dense_dimensions
+def _clark_solution(
+    wages, nonpecs, continuation_values, is_inadmissible, optim_paras, options
+):
+    """Calculate the solution of the model with Clark's approximation.
+
+    In contrast to the full solution, the expected value functions are not computed by
+    numerical integration but in closed form which needs no draws. Since the
+    approximation is cheap, it is computed for every state and interpolation is not
+    used.
 
     """
-    period_expected_value_functions = calculate_expected_value_functions(
+    n_wages = len(optim_paras["choices_w_wage"])
+    shocks_cov = optim_paras["shocks_cholesky"].dot(optim_paras["shocks_cholesky"].T)
+
+    # The value functions of choices with wages contain the log-normal shocks
+    # :math:`\exp\{\epsilon\}`. Compute their expected values and the covariances of
+    # the shocks as they enter the value functions up to the scale of the wages.
+    expected_shocks = np.ones(len(optim_paras["choices"]))
+    expected_shocks[:n_wages] = np.exp(np.diag(shocks_cov)[:n_wages] / 2)
+    shocks_kernel = shocks_cov.copy()
+    shocks_kernel[:n_wages, :n_wages] = np.expm1(shocks_cov[:n_wages, :n_wages])
+
+    period_expected_value_functions = _calculate_expected_value_functions_with_clark(
         wages,
         nonpecs,
         continuation_values,
-        period_draws_emax_risk,
+        expected_shocks,
+        shocks_kernel,
+        is_inadmissible,
+        options["skip_inadmissible_choices"],
+        n_wages,
         optim_paras["delta"],
     )
 
     return period_expected_value_functions
+
+
+@nb.njit(parallel=True)
+def _calculate_expected_value_functions_with_clark(
+    wages,
+    nonpecs,
+    continuation_values,
+    expected_shocks,
+    shocks_kernel,
+    is_inadmissible,
+    skip_inadmissible,
+    n_wages,
+    delta,
+):
+    """Approximate the expected maximum of value functions of many states.
+
+    The states are split into chunks which are processed in parallel such that the
+    temporary arrays are only allocated once per chunk.
+
+    Parameters
+    ----------
+    wages : numpy.ndarray
+        Array with shape (n_states, n_choices) containing wages.
+    nonpecs : numpy.ndarray
+        Array with shape (n_states, n_choices) containing non-pecuniary rewards.
+    continuation_values : numpy.ndarray
+        Array with shape (n_states, n_choices) containing expected maximum utility for
+        each choice in the subsequent period.
+    expected_shocks : numpy.ndarray
+        Array with shape (n_choices,) containing the expected values of the log-normal
+        shocks of choices with wages and ones for the remaining choices.
+    shocks_kernel : numpy.ndarray
+        Array with shape (n_choices, n_choices) containing the covariances of the
+        shocks as they enter the value functions divided by the expected shocks and
+        wages.
+    is_inadmissible : numpy.ndarray
+        Array with shape (n_states, n_choices) indicating inadmissible choices.
+    skip_inadmissible : bool
+        Indicator for whether inadmissible choices are skipped.
+    n_wages : int
+        Number of choices with wages which are the first choices.
+    delta : float
+        The discount factor.
+
+    Returns
+    -------
+    expected_value_functions : numpy.ndarray
+        Array with shape (n_states,).
+
+    """
+    n_states, n_choices = wages.shape
+    expected_value_functions = np.empty(n_states)
+    n_chunks = (n_states + CLARK_CHUNK_SIZE - 1) // CLARK_CHUNK_SIZE
+
+    for chunk in nb.prange(n_chunks):
+        means = np.empty(n_choices)
+        scales = np.empty(n_choices)
+        covariances = np.empty(n_choices)
+        is_processed = np.empty(n_choices, dtype=np.bool_)
+
+        for state in range(
+            chunk * CLARK_CHUNK_SIZE, min((chunk + 1) * CLARK_CHUNK_SIZE, n_states)
+        ):
+            for i in range(n_choices):
+                is_processed[i] = skip_inadmissible and is_inadmissible[state, i]
+                means[i] = nonpecs[state, i] + delta * continuation_values[state, i]
+                if i < n_wages:
+                    scales[i] = wages[state, i] * expected_shocks[i]
+                    means[i] += scales[i]
+                else:
+                    scales[i] = 1.0
+
+            expected_value_functions[state] = _approximate_expected_maximum_with_clark(
+                means, scales, shocks_kernel, covariances, is_processed
+            )
+
+    return expected_value_functions
+
+
+@nb.njit
+def _approximate_expected_maximum_with_clark(
+    means, scales, shocks_kernel, covariances, is_processed
+):
+    """Approximate the expected maximum of normal random variables with Clark's method.
+
+    [1]_ derives the mean and variance of the maximum of two correlated normal random
+    variables and the covariance of the maximum with a third normal random variable.
+    Approximating the maximum by a normal random variable with these moments, the
+    expected maximum of many normal random variables is computed recursively.
+
+    The value functions of choices without wages are normal. The value functions of
+    choices with wages are log-normal and approximated by normal random variables with
+    the exact means and covariances. The covariance between value functions :math:`i`
+    and :math:`j` is ``scales[i] * scales[j] * shocks_kernel[i, j]``. The value
+    functions are processed in descending order of their means which improves the
+    approximation.
+
+    Parameters
+    ----------
+    means : numpy.ndarray
+        Array with shape (n_choices,) containing the means of the value functions.
+    scales : numpy.ndarray
+        Array with shape (n_choices,) containing the scales of the shocks.
+    shocks_kernel : numpy.ndarray
+        Array with shape (n_choices, n_choices).
+    covariances : numpy.ndarray
+        Array with shape (n_choices,) which is overwritten with the covariances of the
+        running maximum and the value functions.
+    is_processed : numpy.ndarray
+        Array with shape (n_choices,) indicating value functions which are ignored, for
+        example, of inadmissible choices. The array is overwritten.
+
+    Returns
+    -------
+    expected_maximum : float
+
+    References
+    ----------
+    .. [1] Clark, C. E. (1961). `The Greatest of a Finite Set of Random Variables
+           <https://doi.org/10.1287/opre.9.2.145>`_. *Operations Research*, 9(2):
+           145-162.
+
+    """
+    n_choices = means.shape[0]
+
+    mean_max = 0.0
+    var_max = 0.0
+
+    for k in range(n_choices):
+        # Select the value function with the highest mean among the remaining ones.
+        j = -1
+        for i in range(n_choices):
+            if not is_processed[i] and (j == -1 or means[i] > means[j]):
+                j = i
+        if j == -1:
+            break
+        is_processed[j] = True
+
+        var_j = scales[j] ** 2 * shocks_kernel[j, j]
+
+        if k == 0:
+            mean_max = means[j]
+            var_max = var_j
+            for i in range(n_choices):
+                covariances[i] = scales[j] * scales[i] * shocks_kernel[j, i]
+            continue
+
+        # The moments are invariant to a shift of the means which is used to reduce
+        # cancellation if the value functions are large.
+        diff = means[j] - mean_max
+        a_squared = var_max + var_j - 2 * covariances[j]
+
+        if a_squared > 1e-12:
+            a = math.sqrt(a_squared)
+            alpha = -diff / a
+            prob = 0.5 * math.erfc(-alpha / math.sqrt(2))
+            prob_j = 0.5 * math.erfc(alpha / math.sqrt(2))
+            density = math.exp(-(alpha ** 2) / 2) / math.sqrt(2 * math.pi)
+
+            shifted_mean = diff * prob_j + a * density
+            second_moment = (
+                var_max * prob + (diff ** 2 + var_j) * prob_j + diff * a * density
+            )
+        else:
+            prob = 1.0 if diff <= 0 else 0.0
+            prob_j = 1.0 - prob
+
+            shifted_mean = max(diff, 0.0)
+            second_moment = var_max * prob + (diff ** 2 + var_j) * prob_j
+
+        for i in range(n_choices):
+            covariances[i] = (
+                covariances[i] * prob
+                + scales[j] * scales[i] * shocks_kernel[j, i] * prob_j
+            )
+
+        mean_max += shifted_mean
+        var_max = max(second_moment - shifted_mean ** 2, 0.0)
+
+    return mean_max
@@ -1,139 +1,422 @@
 """Everything related to the state space of a structural model."""
+import collections
 import itertools
+import json
+import threading
 import warnings
+from pathlib import Path
 
 import numba as nb
 import numpy as np
 import pandas as pd
 
 from respy._numba import array_to_tuple
+from respy.config import COVARIATES_DOT_PRODUCT_DTYPE
 from respy.config import INADMISSIBILITY_PENALTY
 from respy.config import INDEXER_DTYPE
 from respy.config import INDEXER_INVALID_INDEX
+from respy.config import STATE_SPACE_CACHE_MAXSIZE
+from respy.formulas import evaluate_predicates
+from respy.pre_processing.model_processing import _read_params
 from respy.shared import compute_covariates
 from respy.shared import convert_dictionary_keys_to_dense_indices
 from respy.shared import create_base_draws
 from respy.shared import create_core_state_space_columns
 from respy.shared import create_dense_state_space_columns
+from respy.shared import create_quadrature_nodes_and_weights
 from respy.shared import downcast_to_smallest_dtype
 
 
 def create_state_space_class(optim_paras, options):
-    """Create the state space of the model."""
-    core, indexer = _create_core_and_indexer(optim_paras, options)
-    dense_grid = _create_dense_state_space_grid(optim_paras)
+    """Create the state space of the model.
 
-    # Downcast after calculations or be aware of silent integer overflows.
-    core = compute_covariates(core, options["covariates_core"])
-    core = core.apply(downcast_to_smallest_dtype)
-    dense = _create_dense_state_space_covariates(dense_grid, optim_paras, options)
+    The structural components of the state space which do not depend on the parameters
+    of the utility functions are retrieved from a cache. Thus, the core state space,
+    the indexer, the indicator for inadmissible states and the indices of child states
+    are only created once for all solve, simulate and criterion functions of the same
+    model.
 
-    base_draws_sol = create_base_draws(
-        (options["n_periods"], options["solution_draws"], len(optim_paras["choices"])),
-        next(options["solution_seed_startup"]),
-        options["monte_carlo_sequence"],
-    )
+    See also
+    --------
+    get_state_space_structure
+
+    """
+    (
+        core,
+        indexer,
+        dense,
+        is_inadmissible,
+        indices_of_child_states,
+        slices_by_periods,
+    ) = get_state_space_structure(optim_paras, options)
+
+    _warn_if_inadmissibility_penalty_is_missing(is_inadmissible, optim_paras, options)
+
+    n_choices = len(optim_paras["choices"])
+    seed = next(options["solution_seed_startup"])
+    if options["solution_integration"] == "monte_carlo":
+        base_draws_sol = create_base_draws(
+            (options["n_periods"], options["solution_draws"], n_choices),
+            seed,
+            options["monte_carlo_sequence"],
+        )
+    elif options["solution_integration"] == "clark":
+        # The analytic approximation of the expected value functions needs no draws.
+        base_draws_sol = np.zeros((options["n_periods"], 0, n_choices))
+    else:
+        nodes, _ = create_quadrature_nodes_and_weights(
+            n_choices,
+            options["solution_integration"],
+            options["solution_quadrature_order"],
+        )
+        base_draws_sol = np.repeat(nodes[np.newaxis], options["n_periods"], axis=0)
 
     if dense:
         state_space = _MultiDimStateSpace(
-            core, indexer, base_draws_sol, optim_paras, options, dense
+            core,
+            indexer,
+            base_draws_sol,
+            optim_paras,
+            options,
+            dense,
+            is_inadmissible,
+            indices_of_child_states,
+            slices_by_periods,
         )
     else:
         state_space = _SingleDimStateSpace(
-            core, indexer, base_draws_sol, optim_paras, options
+            core,
+            indexer,
+            base_draws_sol,
+            optim_paras,
+            options,
+            is_inadmissible=is_inadmissible,
+            indices_of_child_states=indices_of_child_states,
+            slices_by_periods=slices_by_periods,
         )
 
     return state_space
 
 
-class _BaseStateSpace:
-    """The base class of a state space.
+StateSpaceCacheInfo = collections.namedtuple(
+    "StateSpaceCacheInfo", ["hits", "misses", "maxsize", "currsize"]
+)
+
+
+class _StateSpaceCache:
+    """Least-recently used cache for the structural components of state spaces.
 
-    The base class includes some methods which should be available to both state spaces
-    and are shared between multiple sub state spaces.
+    The cache stores the components which are shared by all state spaces of the same
+    model. If the cache is full, the least recently used entry is evicted. Access to
+    the cache is guarded by a lock so that state spaces can be created from multiple
+    threads.
+
+    Parameters
+    ----------
+    maxsize : int
+        Maximum number of cached state spaces.
 
     """
 
-    def _create_slices_by_core_periods(self):
-        """Create slices to index all attributes in a given period.
+    def __init__(self, maxsize):
+        self.maxsize = maxsize
+        self.hits = 0
+        self.misses = 0
+        self._entries = collections.OrderedDict()
+        self._lock = threading.RLock()
+
+    def get(self, key, create_func):
+        """Return the cached entry for ``key`` or create it with ``create_func``."""
+        with self._lock:
+            if key in self._entries:
+                self.hits += 1
+                self._entries.move_to_end(key)
+                entry = self._entries[key]
+            else:
+                self.misses += 1
+                entry = create_func()
+                self._entries[key] = entry
+                while len(self._entries) > self.maxsize:
+                    self._entries.popitem(last=False)
+
+        return entry
+
+    def info(self):
+        """Return the statistics of the cache."""
+        with self._lock:
+            info = StateSpaceCacheInfo(
+                self.hits, self.misses, self.maxsize, len(self._entries)
+            )
+
+        return info
 
-        It is important that the returned objects are not fancy indices. Fancy indexing
-        results in copies of array which decrease performance and raise memory usage.
+    def clear(self):
+        """Remove all entries and reset the statistics of the cache."""
+        with self._lock:
+            self._entries.clear()
+            self.hits = 0
+            self.misses = 0
+
+
+_STATE_SPACE_CACHE = _StateSpaceCache(STATE_SPACE_CACHE_MAXSIZE)
 
-        """
-        period = self.core.period
-        indices = np.where(period - period.shift(1).fillna(-1) == 1)[0]
-        indices = np.append(indices, self.core.shape[0])
 
-        slices = [slice(indices[i], indices[i + 1]) for i in range(len(indices) - 1)]
+def get_state_space_structure(optim_paras, options):
+    """Get the structural components of the state space.
 
-        return slices
+    The components are the core state space, the indexer, the covariates of the dense
+    state space, the indicator for inadmissible states, the indices of child states and
+    the slices of periods. All components only depend on the structural inputs of the
+    model, see :func:`_create_state_space_cache_key`, and are retrieved from a cache.
 
-    def _create_is_inadmissible(self, optim_paras, options):
-        core = self.core.copy()
+    All arrays are read-only because they are shared by all state spaces of the model.
+    Do not modify the core state space.
+
+    """
+    key = _create_state_space_cache_key(optim_paras, options)
+
+    structure = _STATE_SPACE_CACHE.get(
+        key, lambda: _create_state_space_structure(optim_paras, options)
+    )
 
-        for choice in optim_paras["choices"]:
-            core[choice] = False
-            for formula in options["inadmissible_states"][choice]:
-                core[choice] |= core.eval(formula)
+    return structure
 
-        is_inadmissible = core[optim_paras["choices"]].to_numpy(dtype=np.bool)
 
-        if np.any(is_inadmissible) and optim_paras["inadmissibility_penalty"] is None:
-            warnings.warn(
-                "Some choices in the model are not admissible all the time. Thus, respy"
-                " applies a penalty to the utility for these choices which is "
-                f"{INADMISSIBILITY_PENALTY} by default. For the full solution, the "
-                "penalty only needs to be larger than all other value functions to be "
-                "effective. Choose a milder penalty for the interpolation which does "
-                "not dominate the linear interpolation model."
+def state_space_cache_info():
+    """Return hits, misses, the maximum and the current size of the state space cache.
+
+    Example
+    -------
+    >>> clear_state_space_cache()
+    >>> state_space_cache_info()
+    StateSpaceCacheInfo(hits=0, misses=0, maxsize=8, currsize=0)
+
+    """
+    return _STATE_SPACE_CACHE.info()
+
+
+def clear_state_space_cache():
+    """Clear the state space cache and reset its statistics."""
+    _STATE_SPACE_CACHE.clear()
+
+
+def _create_state_space_cache_key(optim_paras, options):
+    """Create a hashable key from the structural inputs of the state space.
+
+    The key consists of the number of periods, the choices, the initial and maximum
+    experiences of choices with experience, the number of lagged choices, observables
+    and their number of levels, the number of types, the filters of the core state
+    space and the formulas for inadmissible states. Since the covariates of the core
+    and dense state space are part of the structural components, their formulas are
+    also added to the key.
+
+    """
+    choices = optim_paras["choices"]
+    choices_w_exp = tuple(
+        (
+            choice,
+            tuple(int(start) for start in choices[choice]["start"]),
+            int(choices[choice]["max"]),
+        )
+        for choice in optim_paras["choices_w_exp"]
+    )
+    observables = tuple(
+        (observable, len(levels))
+        for observable, levels in optim_paras["observables"].items()
+    )
+    inadmissible_states = tuple(
+        (choice, tuple(options["inadmissible_states"].get(choice, [])))
+        for choice in choices
+    )
+    covariates = tuple(
+        tuple(
+            sorted(
+                (name, definition["formula"])
+                for name, definition in options[group].items()
             )
+        )
+        for group in ["covariates_core", "covariates_dense"]
+    )
 
-        return is_inadmissible
+    key = (
+        optim_paras["n_periods"],
+        tuple(choices),
+        choices_w_exp,
+        optim_paras["n_lagged_choices"],
+        observables,
+        optim_paras["n_types"],
+        tuple(options["core_state_space_filters"]),
+        inadmissible_states,
+        covariates,
+    )
 
-    def _create_indices_of_child_states(self, optim_paras):
-        """For each parent state get the indices of child states.
+    return key
 
-        During the backward induction, the ``expected_value_functions`` in the future
-        period serve as the ``continuation_values`` of the current period. As the
-        indices for child states never change, these indices can be precomputed and
-        added to the state_space.
 
-        Actually, the indices of the child states do not have to cover the last period,
-        but it makes the code prettier and reduces the need to expand the indices in the
-        estimation.
+def _create_state_space_structure(optim_paras, options):
+    """Create the structural components of the state space."""
+    core, indexer = _create_core_and_indexer(optim_paras, options)
+    dense_grid = _create_dense_state_space_grid(optim_paras)
 
-        """
-        n_choices = len(optim_paras["choices"])
-        n_choices_w_exp = len(optim_paras["choices_w_exp"])
-        n_periods = optim_paras["n_periods"]
-        n_states = self.core.shape[0]
-        core_columns = create_core_state_space_columns(optim_paras)
-
-        indices = np.full(
-            (n_states, n_choices), INDEXER_INVALID_INDEX, dtype=INDEXER_DTYPE
+    # Downcast after calculations or be aware of silent integer overflows.
+    core = compute_covariates(core, options["covariates_core"])
+    core = core.apply(downcast_to_smallest_dtype)
+    dense = _create_dense_state_space_covariates(dense_grid, optim_paras, options)
+
+    is_inadmissible = _create_is_inadmissible(core, optim_paras, options)
+    indices_of_child_states = _create_indices_of_child_states(
+        core, indexer, is_inadmissible, optim_paras
+    )
+    slices_by_periods = _create_slices_by_core_periods(core)
+
+    for array in indexer + [is_inadmissible, indices_of_child_states]:
+        array.flags.writeable = False
+
+    return (
+        core,
+        indexer,
+        dense,
+        is_inadmissible,
+        indices_of_child_states,
+        slices_by_periods,
+    )
+
+
+def _warn_if_inadmissibility_penalty_is_missing(is_inadmissible, optim_paras, options):
+    if (
+        np.any(is_inadmissible)
+        and optim_paras["inadmissibility_penalty"] is None
+        and not options["skip_inadmissible_choices"]
+    ):
+        warnings.warn(
+            "Some choices in the model are not admissible all the time. Thus, respy"
+            " applies a penalty to the utility for these choices which is "
+            f"{INADMISSIBILITY_PENALTY} by default. For the full solution, the "
+            "penalty only needs to be larger than all other value functions to be "
+            "effective. Choose a milder penalty for the interpolation which does "
+            "not dominate the linear interpolation model."
         )
 
-        # Skip the last period which does not have child states.
-        for period in reversed(range(n_periods - 1)):
-            states_in_period = self.core.query("period == @period")[
-                core_columns
-            ].to_numpy(dtype=np.int8)
-
-            indices = _insert_indices_of_child_states(
-                indices,
-                states_in_period,
-                self.indexer[period],
-                self.indexer[period + 1],
-                self.is_inadmissible,
-                n_choices_w_exp,
-                optim_paras["n_lagged_choices"],
-            )
 
-        return indices
+def _create_slices_by_core_periods(core):
+    """Create slices to index all attributes in a given period.
+
+    It is important that the returned objects are not fancy indices. Fancy indexing
+    results in copies of array which decrease performance and raise memory usage.
+
+    """
+    period = core.period
+    indices = np.where(period - period.shift(1).fillna(-1) == 1)[0]
+    indices = np.append(indices, core.shape[0])
+
+    slices = [slice(indices[i], indices[i + 1]) for i in range(len(indices) - 1)]
+
+    return slices
+
+
+def _create_is_inadmissible(core, optim_paras, options):
+    """Create an indicator for inadmissible choices per state.
+
+    All formulas are evaluated in a single pass over the core state space with a
+    compiled function. See :func:`respy.formulas.evaluate_predicates`.
+
+    """
+    formulas_per_choice = [
+        options["inadmissible_states"][choice] for choice in optim_paras["choices"]
+    ]
+    is_inadmissible = evaluate_predicates(formulas_per_choice, core)
+
+    return is_inadmissible
+
+
+def _point_invalid_children_to_sentinel(indices_of_child_states):
+    """Point invalid child states to a sentinel behind the last state.
+
+    The expected value functions carry a trailing zero after the last state. If invalid
+    indices are remapped to this slot, continuation values can be gathered by index
+    without masks and temporary arrays.
+
+    """
+    n_states = indices_of_child_states.shape[0]
+    indices = np.where(
+        indices_of_child_states == INDEXER_INVALID_INDEX,
+        n_states,
+        indices_of_child_states,
+    ).astype(INDEXER_DTYPE)
+    indices.flags.writeable = False
+
+    return indices
+
+
+def _create_admissible_choices(is_inadmissible):
+    """Create a compressed list of the admissible choices of each state.
+
+    The admissible choices of state ``i`` are ``admissible_choices[start:stop]`` with
+    ``start, stop = admissible_choices_pointers[i : i + 2]``. This is the compressed
+    sparse row format of the negated `is_inadmissible`. Compiled functions iterate over
+    these choices instead of masking all choices.
+
+    Returns
+    -------
+    admissible_choices_pointers : numpy.ndarray
+        Array with shape (n_states + 1,) containing the offsets of each state.
+    admissible_choices : numpy.ndarray
+        Array with shape (n_admissible,) containing the admissible choices of all states
+        in ascending order.
+
+    """
+    is_admissible = ~np.asarray(is_inadmissible)
+    admissible_choices_pointers = np.zeros(is_admissible.shape[0] + 1, dtype=np.int64)
+    np.cumsum(is_admissible.sum(axis=1), out=admissible_choices_pointers[1:])
+    admissible_choices = np.nonzero(is_admissible)[1].astype(np.int64)
+
+    for array in [admissible_choices_pointers, admissible_choices]:
+        array.flags.writeable = False
 
+    return admissible_choices_pointers, admissible_choices
 
-class _SingleDimStateSpace(_BaseStateSpace):
+
+def _create_indices_of_child_states(core, indexer, is_inadmissible, optim_paras):
+    """For each parent state get the indices of child states.
+
+    During the backward induction, the ``expected_value_functions`` in the future
+    period serve as the ``continuation_values`` of the current period. As the indices
+    for child states never change, these indices can be precomputed and added to the
+    state_space.
+
+    Actually, the indices of the child states do not have to cover the last period, but
+    it makes the code prettier and reduces the need to expand the indices in the
+    estimation.
+
+    """
+    n_choices = len(optim_paras["choices"])
+    n_choices_w_exp = len(optim_paras["choices_w_exp"])
+    n_periods = optim_paras["n_periods"]
+    n_states = core.shape[0]
+    core_columns = create_core_state_space_columns(optim_paras)
+
+    indices = np.full((n_states, n_choices), INDEXER_INVALID_INDEX, dtype=INDEXER_DTYPE)
+
+    # Skip the last period which does not have child states.
+    for period in reversed(range(n_periods - 1)):
+        states_in_period = core.query("period == @period")[core_columns].to_numpy(
+            dtype=np.int8
+        )
+
+        indices = _insert_indices_of_child_states(
+            indices,
+            states_in_period,
+            indexer[period],
+            indexer[period + 1],
+            is_inadmissible,
+            n_choices_w_exp,
+            optim_paras["n_lagged_choices"],
+        )
+
+    return indices
+
+
+class _SingleDimStateSpace:
     """The state space of a discrete choice dynamic programming model.
 
     Parameters
@@ -167,8 +450,24 @@ class _SingleDimStateSpace(_BaseStateSpace):
         each choice of the subsequent period and the simulated or interpolated maximum
         of the current period.
     expected_value_functions : numpy.ndarray
-        Array with shape (n_states, 1) containing the expected maximum of
+        Array with shape (n_states,) containing the expected maximum of
         choice-specific value functions.
+    expected_value_functions_w_sentinel : numpy.ndarray
+        Array with shape (n_states + 1,) containing the expected value functions
+        followed by a zero.
+    indices_of_child_states_w_sentinel : numpy.ndarray
+        Array with shape (n_states, n_choices) which is equal to
+        ``indices_of_child_states`` except that invalid indices point to the trailing
+        zero of ``expected_value_functions_w_sentinel``.
+    admissible_choices_pointers : numpy.ndarray
+        Array with shape (n_states + 1,) containing the offsets of the admissible
+        choices of each state in ``admissible_choices``.
+    admissible_choices : numpy.ndarray
+        Array containing the admissible choices of all states, see
+        :func:`_create_admissible_choices`.
+    solution_draws_statistics : pandas.DataFrame or None
+        DataFrame with the mean, minimum and maximum number of draws used per period if
+        the expected value functions are computed with adaptive draws.
 
     """
 
@@ -184,6 +483,8 @@ class _SingleDimStateSpace(_BaseStateSpace):
         is_inadmissible=None,
         indices_of_child_states=None,
         slices_by_periods=None,
+        indices_of_child_states_w_sentinel=None,
+        admissible_choices=None,
     ):
         self.dense_dim = dense_dim
         self.core = core
@@ -192,22 +493,35 @@ class _SingleDimStateSpace(_BaseStateSpace):
         self.mixed_covariates = options["covariates_mixed"]
         self.base_draws_sol = base_draws_sol
         self.slices_by_periods = (
-            super()._create_slices_by_core_periods()
+            _create_slices_by_core_periods(self.core)
             if slices_by_periods is None
             else slices_by_periods
         )
         self.is_inadmissible = (
-            self._create_is_inadmissible(optim_paras, options)
+            _create_is_inadmissible(self.core, optim_paras, options)
             if is_inadmissible is None
             else is_inadmissible
         )
         self.indices_of_child_states = (
-            super()._create_indices_of_child_states(optim_paras)
+            _create_indices_of_child_states(
+                self.core, self.indexer, self.is_inadmissible, optim_paras
+            )
             if indices_of_child_states is None
             else indices_of_child_states
         )
+        self.indices_of_child_states_w_sentinel = (
+            _point_invalid_children_to_sentinel(self.indices_of_child_states)
+            if indices_of_child_states_w_sentinel is None
+            else indices_of_child_states_w_sentinel
+        )
+        if admissible_choices is None:
+            admissible_choices = _create_admissible_choices(self.is_inadmissible)
+        self.admissible_choices_pointers, self.admissible_choices = admissible_choices
         # HOTFIX: Will be removed with flexible choice sets.
-        self.expected_value_functions = np.empty(self.core.shape[0])
+        self.expected_value_functions_w_sentinel = np.zeros(self.core.shape[0] + 1)
+        self._covariates = {}
+        self._previous_solution = None
+        self.solution_draws_statistics = None
 
     def get_attribute(self, attr):
         """Get an attribute of the state space."""
@@ -230,18 +544,21 @@ class _SingleDimStateSpace(_BaseStateSpace):
 
         return out
 
+    @property
+    def expected_value_functions(self):
+        return self.expected_value_functions_w_sentinel[:-1]
+
     def get_continuation_values(self, period=None, indices=None):
         """Return the continuation values for a given period or states.
 
-        If the last period is selected, return a matrix of zeros. In any other period,
-        use the precomputed `indices_of_child_states` to select continuation values from
-        `expected_value_functions`.
+        Use the precomputed `indices_of_child_states_w_sentinel` to select continuation
+        values from `expected_value_functions_w_sentinel`.
 
         You can also indices to collect continuation values across periods.
 
-        Indices may contain :data:`respy.config.INDEXER_INVALID_INDEX` as an identifier
-        for invalid states. In this case, indexing leads to an `IndexError`. Replace the
-        continuation values with zeros for such indices.
+        Invalid child states, e.g., all child states in the last period, point to the
+        trailing zero of `expected_value_functions_w_sentinel`. Thus, continuation
+        values are gathered without masking invalid indices.
 
         Parameters
         ----------
@@ -255,30 +572,113 @@ class _SingleDimStateSpace(_BaseStateSpace):
         """
         n_periods = len(self.indexer)
 
-        if period == n_periods - 1:
-            last_slice = self.slices_by_periods[-1]
-            n_states_last_period = len(range(last_slice.start, last_slice.stop))
-            n_choices = self.get_attribute("is_inadmissible").shape[1]
-            continuation_values = np.zeros((n_states_last_period, n_choices))
-
+        if indices is not None:
+            child_indices = self.indices_of_child_states_w_sentinel[indices]
+        elif period is not None and 0 <= period <= n_periods - 1:
+            child_indices = self.get_attribute_from_period(
+                "indices_of_child_states_w_sentinel", period
+            )
         else:
-            if indices is not None:
-                child_indices = self.get_attribute("indices_of_child_states")[indices]
-            elif period is not None and 0 <= period <= n_periods - 2:
-                child_indices = self.get_attribute_from_period(
-                    "indices_of_child_states", period
-                )
-            else:
-                raise NotImplementedError
+            raise NotImplementedError
 
-            mask = child_indices != INDEXER_INVALID_INDEX
-            valid_indices = np.where(mask, child_indices, 0)
-            continuation_values = np.where(
-                mask, self.get_attribute("expected_value_functions")[valid_indices], 0
-            )
+        continuation_values = self.expected_value_functions_w_sentinel[child_indices]
 
         return continuation_values
 
+    def split_covariates(self, labels):
+        """Split covariates into core, dense and mixed covariates.
+
+        Parameters
+        ----------
+        labels : list of str
+            Names of the covariates, e.g., the covariates in the equations of wages and
+            non-pecuniary rewards.
+
+        Returns
+        -------
+        core_labels, dense_labels, mixed_labels : tuple of str
+            Covariates which vary only with the core state space, covariates which are
+            constant within the sub state space and covariates which depend on both.
+
+        """
+        core_labels = tuple(label for label in labels if label in self.core.columns)
+        dense_labels = tuple(
+            label
+            for label in labels
+            if label not in core_labels and label in self.dense_covariates
+        )
+        mixed_labels = tuple(
+            label
+            for label in labels
+            if label not in core_labels and label not in dense_labels
+        )
+
+        return core_labels, dense_labels, mixed_labels
+
+    def get_covariates(self, labels):
+        """Get the factored covariates of all states.
+
+        Instead of materializing all covariates for every state, the covariates are
+        factored into a matrix of core covariates, a vector of dense covariates which
+        are constant within the sub state space and a matrix of mixed covariates. The
+        arrays are created once for every combination of labels and cached. Thus,
+        solving the model repeatedly with new parameters only requires matrix-vector
+        products.
+
+        Parameters
+        ----------
+        labels : list of str
+            Names of the covariates, e.g., the covariates in the equations of wages and
+            non-pecuniary rewards.
+
+        Returns
+        -------
+        core_covariates : numpy.ndarray
+            Read-only array with shape (n_states, n_core_labels).
+        dense_covariates : numpy.ndarray
+            Read-only array with shape (n_dense_labels,).
+        mixed_covariates : numpy.ndarray
+            Read-only array with shape (n_states, n_mixed_labels).
+
+        See also
+        --------
+        split_covariates
+
+        """
+        core_labels, dense_labels, mixed_labels = self.split_covariates(labels)
+
+        if ("core", core_labels) not in self._covariates:
+            self._covariates["core", core_labels] = _create_covariates_matrix(
+                self.core, core_labels
+            )
+
+        return (
+            self._covariates["core", core_labels],
+            self._get_dense_covariates(dense_labels),
+            self._get_mixed_covariates(mixed_labels),
+        )
+
+    def _get_dense_covariates(self, labels):
+        if ("dense", labels) not in self._covariates:
+            dense_covariates = np.array(
+                [self.dense_covariates[label] for label in labels],
+                dtype=COVARIATES_DOT_PRODUCT_DTYPE,
+            )
+            dense_covariates.flags.writeable = False
+            self._covariates["dense", labels] = dense_covariates
+
+        return self._covariates["dense", labels]
+
+    def _get_mixed_covariates(self, labels):
+        if ("mixed", labels) not in self._covariates:
+            # Only materialize the states if mixed covariates are requested.
+            states = self.states if labels else self.core
+            self._covariates["mixed", labels] = _create_covariates_matrix(
+                states, labels
+            )
+
+        return self._covariates["mixed", labels]
+
     def set_attribute(self, attribute, value):
         setattr(self, attribute, value)
 
@@ -292,22 +692,50 @@ class _SingleDimStateSpace(_BaseStateSpace):
         return states
 
 
-class _MultiDimStateSpace(_BaseStateSpace):
+class _MultiDimStateSpace:
     """The state space of a discrete choice dynamic programming model.
 
     This class wraps the whole state space of the model.
 
     """
 
-    def __init__(self, core, indexer, base_draws_sol, optim_paras, options, dense):
+    def __init__(
+        self,
+        core,
+        indexer,
+        base_draws_sol,
+        optim_paras,
+        options,
+        dense,
+        is_inadmissible=None,
+        indices_of_child_states=None,
+        slices_by_periods=None,
+    ):
         self.base_draws_sol = base_draws_sol
         self.core = core
         self.indexer = indexer
-        self.is_inadmissible = super()._create_is_inadmissible(optim_paras, options)
-        self.indices_of_child_states = super()._create_indices_of_child_states(
-            optim_paras
+        self.is_inadmissible = (
+            _create_is_inadmissible(self.core, optim_paras, options)
+            if is_inadmissible is None
+            else is_inadmissible
+        )
+        self.indices_of_child_states = (
+            _create_indices_of_child_states(
+                self.core, self.indexer, self.is_inadmissible, optim_paras
+            )
+            if indices_of_child_states is None
+            else indices_of_child_states
+        )
+        self.indices_of_child_states_w_sentinel = _point_invalid_children_to_sentinel(
+            self.indices_of_child_states
+        )
+        admissible_choices = _create_admissible_choices(self.is_inadmissible)
+        self.admissible_choices_pointers, self.admissible_choices = admissible_choices
+        self.slices_by_periods = (
+            _create_slices_by_core_periods(self.core)
+            if slices_by_periods is None
+            else slices_by_periods
         )
-        self.slices_by_periods = super()._create_slices_by_core_periods()
         self.sub_state_spaces = {
             dense_dim: _SingleDimStateSpace(
                 self.core,
@@ -320,9 +748,14 @@ class _MultiDimStateSpace(_BaseStateSpace):
                 self.is_inadmissible,
                 self.indices_of_child_states,
                 self.slices_by_periods,
+                self.indices_of_child_states_w_sentinel,
+                admissible_choices,
             )
             for dense_dim, dense_covariates in dense.items()
         }
+        self._covariates = {}
+        self._previous_solution = None
+        self.solution_draws_statistics = None
 
     def get_attribute(self, attribute):
         return {
@@ -342,6 +775,64 @@ class _MultiDimStateSpace(_BaseStateSpace):
             for key, sss in self.sub_state_spaces.items()
         }
 
+    def split_covariates(self, labels):
+        return next(iter(self.sub_state_spaces.values())).split_covariates(labels)
+
+    def get_covariates(self, labels):
+        """Get the factored covariates of all states.
+
+        The matrix of core covariates is shared by all sub state spaces. The dense and
+        mixed covariates of all sub state spaces are stacked in the order of
+        :attr:`sub_state_spaces` such that rewards can be computed for all dense
+        dimensions at once. See :meth:`_SingleDimStateSpace.get_covariates` for more
+        information.
+
+        Returns
+        -------
+        core_covariates : numpy.ndarray
+            Read-only array with shape (n_states, n_core_labels).
+        dense_covariates : numpy.ndarray
+            Read-only array with shape (n_dense, n_dense_labels).
+        mixed_covariates : numpy.ndarray
+            Read-only array with shape (n_dense, n_states, n_mixed_labels).
+
+        """
+        core_labels, dense_labels, mixed_labels = self.split_covariates(labels)
+
+        if ("core", core_labels) not in self._covariates:
+            self._covariates["core", core_labels] = _create_covariates_matrix(
+                self.core, core_labels
+            )
+
+        if ("dense", dense_labels) not in self._covariates:
+            dense_covariates = np.stack(
+                [
+                    sss._get_dense_covariates(dense_labels)
+                    for sss in self.sub_state_spaces.values()
+                ]
+            )
+            dense_covariates.flags.writeable = False
+            self._covariates["dense", dense_labels] = dense_covariates
+
+        if ("mixed", mixed_labels) not in self._covariates:
+            # Do not cache the covariates in the sub state spaces to avoid copies.
+            mixed_covariates = np.stack(
+                [
+                    _create_covariates_matrix(
+                        sss.states if mixed_labels else sss.core, mixed_labels
+                    )
+                    for sss in self.sub_state_spaces.values()
+                ]
+            )
+            mixed_covariates.flags.writeable = False
+            self._covariates["mixed", mixed_labels] = mixed_covariates
+
+        return (
+            self._covariates["core", core_labels],
+            self._covariates["dense", dense_labels],
+            self._covariates["mixed", mixed_labels],
+        )
+
     def set_attribute(self, attribute, value):
         for key, sss in self.sub_state_spaces.items():
             sss.set_attribute(attribute, value[key])
@@ -355,6 +846,239 @@ class _MultiDimStateSpace(_BaseStateSpace):
         return {key: sss.states for key, sss in self.sub_state_spaces.items()}
 
 
+def _create_covariates_matrix(df, labels):
+    """Create a read-only and contiguous matrix of covariates."""
+    covariates = np.ascontiguousarray(
+        df[list(labels)].to_numpy(dtype=COVARIATES_DOT_PRODUCT_DTYPE)
+    )
+    covariates.flags.writeable = False
+
+    return covariates
+
+
+_STATE_SPACE_ATTRIBUTES = [
+    "base_draws_sol",
+    "is_inadmissible",
+    "indices_of_child_states",
+]
+_SUB_STATE_SPACE_ATTRIBUTES = [
+    "wages",
+    "nonpecs",
+    "expected_value_functions_w_sentinel",
+]
+
+
+def save_state_space(state_space, path, params):
+    """Save a state space to a directory of ``.npy`` files.
+
+    The arrays of the state space are stored in separate ``.npy`` files such that they
+    can be memory-mapped with :func:`load_state_space`. Thus, multiple processes can
+    share one solved state space without holding copies and a simulation can start from
+    a solution computed earlier.
+
+    The directory contains the following files.
+
+    - ``metadata.json`` with the columns and dtypes of the core state space, the
+      covariates of the dense and mixed state space, the dense indices and the
+      parameters of the solution.
+    - ``core/{column}.npy`` for every column of the core state space.
+    - ``indexer/{period}.npy`` for the indexer of every period.
+    - ``base_draws_sol.npy``, ``is_inadmissible.npy`` and
+      ``indices_of_child_states.npy``.
+    - ``wages.npy``, ``nonpecs.npy`` and ``expected_value_functions_w_sentinel.npy``
+      if the state space is solved. For state spaces with dense dimensions, these
+      files are stored in a sub-directory for every dense index, e.g., ``dense_0_1``.
+
+    Parameters
+    ----------
+    state_space : :class:`_SingleDimStateSpace` or :class:`_MultiDimStateSpace`
+        The state space which is saved.
+    path : str or pathlib.Path
+        Path to a directory which is created if it does not exist.
+    params : pandas.DataFrame or pandas.Series
+        The parameters with which the state space was solved. They are stored such that
+        a simulation from the stored solution can verify its parameters.
+
+    """
+    path = Path(path)
+    (path / "core").mkdir(parents=True, exist_ok=True)
+    (path / "indexer").mkdir(exist_ok=True)
+
+    for column in state_space.core:
+        np.save(path / "core" / f"{column}.npy", state_space.core[column].to_numpy())
+    for period, sub_indexer in enumerate(state_space.indexer):
+        np.save(path / "indexer" / f"{period}.npy", sub_indexer)
+    for attribute in _STATE_SPACE_ATTRIBUTES:
+        np.save(path / f"{attribute}.npy", getattr(state_space, attribute))
+
+    if hasattr(state_space, "sub_state_spaces"):
+        sub_state_spaces = state_space.sub_state_spaces
+    else:
+        sub_state_spaces = {None: state_space}
+
+    for dense_idx, sss in sub_state_spaces.items():
+        sub_path = path / _dense_index_to_directory(dense_idx)
+        sub_path.mkdir(exist_ok=True)
+        for attribute in _SUB_STATE_SPACE_ATTRIBUTES:
+            if hasattr(sss, attribute):
+                np.save(sub_path / f"{attribute}.npy", getattr(sss, attribute))
+
+    any_sss = next(iter(sub_state_spaces.values()))
+    metadata = {
+        "core_columns": state_space.core.columns.tolist(),
+        "mixed_covariates": {
+            name: {
+                "formula": definition["formula"],
+                "depends_on": sorted(definition["depends_on"]),
+            }
+            for name, definition in any_sss.mixed_covariates.items()
+        },
+        "dense_covariates": [
+            [
+                list(dense_idx),
+                {k: np.asarray(v).item() for k, v in sss.dense_covariates.items()},
+            ]
+            for dense_idx, sss in sub_state_spaces.items()
+            if dense_idx is not None
+        ],
+        "params": [
+            [category, name, float(value)]
+            for (category, name), value in _read_params(params).items()
+        ],
+    }
+    (path / "metadata.json").write_text(json.dumps(metadata, indent=4))
+
+
+def load_state_space(path, mmap_mode="r"):
+    """Load a state space saved with :func:`save_state_space`.
+
+    Parameters
+    ----------
+    path : str or pathlib.Path
+        Path to the directory of the saved state space.
+    mmap_mode : {None, "r", "r+", "c"}, default "r"
+        The arrays are memory-mapped with this mode, see :func:`numpy.load`. Note that
+        the core state space is always loaded into memory. Since a read-only state space
+        cannot be solved again, use ``"c"`` for copy-on-write or :data:`None` to solve
+        the loaded state space with new parameters.
+
+    Returns
+    -------
+    state_space : :class:`_SingleDimStateSpace` or :class:`_MultiDimStateSpace`
+
+    """
+    path = Path(path)
+    metadata = json.loads((path / "metadata.json").read_text())
+
+    core = pd.DataFrame(
+        {
+            column: np.load(path / "core" / f"{column}.npy")
+            for column in metadata["core_columns"]
+        }
+    )
+    n_periods = len(list((path / "indexer").glob("*.npy")))
+    indexer = [
+        np.load(path / "indexer" / f"{period}.npy", mmap_mode=mmap_mode)
+        for period in range(n_periods)
+    ]
+    attributes = {
+        attribute: np.load(path / f"{attribute}.npy", mmap_mode=mmap_mode)
+        for attribute in _STATE_SPACE_ATTRIBUTES
+    }
+    options = {
+        "covariates_mixed": {
+            name: {
+                "formula": definition["formula"],
+                "depends_on": set(definition["depends_on"]),
+            }
+            for name, definition in metadata["mixed_covariates"].items()
+        }
+    }
+    dense = {
+        tuple(dense_idx): dense_covariates
+        for dense_idx, dense_covariates in metadata["dense_covariates"]
+    }
+
+    if dense:
+        state_space = _MultiDimStateSpace(
+            core,
+            indexer,
+            attributes["base_draws_sol"],
+            None,
+            options,
+            dense,
+            attributes["is_inadmissible"],
+            attributes["indices_of_child_states"],
+        )
+        sub_state_spaces = state_space.sub_state_spaces
+    else:
+        state_space = _SingleDimStateSpace(
+            core,
+            indexer,
+            attributes["base_draws_sol"],
+            None,
+            options,
+            is_inadmissible=attributes["is_inadmissible"],
+            indices_of_child_states=attributes["indices_of_child_states"],
+        )
+        sub_state_spaces = {None: state_space}
+
+    for dense_idx, sss in sub_state_spaces.items():
+        sub_path = path / _dense_index_to_directory(dense_idx)
+        for attribute in _SUB_STATE_SPACE_ATTRIBUTES:
+            file = sub_path / f"{attribute}.npy"
+            if file.exists():
+                sss.set_attribute(attribute, np.load(file, mmap_mode=mmap_mode))
+
+    return state_space
+
+
+def load_params_of_state_space(path):
+    """Load the parameters of a state space saved with :func:`save_state_space`.
+
+    Parameters
+    ----------
+    path : str or pathlib.Path
+        Path to the directory of the saved state space.
+
+    Returns
+    -------
+    params : pandas.Series
+        The parameters with which the saved state space was solved.
+
+    """
+    metadata = json.loads((Path(path) / "metadata.json").read_text())
+    categories, names, values = zip(*metadata["params"])
+    params = pd.Series(
+        values,
+        index=pd.MultiIndex.from_arrays(
+            [categories, names], names=["category", "name"]
+        ),
+        name="value",
+    )
+
+    return params
+
+
+def _dense_index_to_directory(dense_idx):
+    """Convert a dense index to the name of a sub-directory.
+
+    Example
+    -------
+    >>> _dense_index_to_directory((0, 1))
+    'dense_0_1'
+    >>> _dense_index_to_directory(None)
+    '.'
+
+    """
+    if dense_idx is None:
+        directory = "."
+    else:
+        directory = "dense_" + "_".join(str(i) for i in dense_idx)
+
+    return directory
+
+
 def _create_core_and_indexer(optim_paras, options):
     """Create the state space.
 
@@ -392,29 +1116,28 @@ def _create_core_and_indexer(optim_paras, options):
       account that some restrictions to the state space are more important than others
       and should be applied earlier. Others can be delayed.
 
-      As a compromise, we built on the former approach in
-      :func:`~respy.tests._former_code._create_state_space_kw94` which loops over
-      choices and possible experience values. Thus, it incorporates some fundamental
-      restrictions like time limits and needs less filtering.
-
-    - The former implementation,
-      :func:`~respy.tests._former_code._create_state_space_kw94`, had four hard-coded
-      choices and a loop for every choice with experience accumulation. Thus, this
-      function is useless if the model requires additional or less choices. For each
-      number of choices with and without experience, a new function had to be
-      programmed. The following approach uses the same loops over choices with
-      experiences, but they are dynamically created by the recursive function
-      :func:`_create_core_state_space_per_period`.
+    - The former implementation enumerated the experiences of each period with a
+      recursive generator which yielded one state at a time and replicated the
+      :class:`pandas.DataFrame` for every lagged choice and combination of initial
+      experiences. The construction time exceeded the time to solve the model for large
+      models. Now, :func:`_create_core_state_space` builds an integer matrix of all
+      periods and experiences at once by extending the states choice by choice with
+      all admissible levels of experience. Thus, no invalid state is ever created and
+      the runtime is linear in the number of states.
 
     - There are characteristics of the state space which are independent from all other
       state space attributes like types (and almost lagged choices). These attributes
       only duplicate the existing state space and can be taken into account in a later
       stage of the process.
 
+    - Filters are evaluated as vectorized masks on the integer matrix and the
+      :class:`pandas.DataFrame` is only created for the final set of states. The order
+      of states is the same as in the former implementation.
+
     See also
     --------
     _create_core_state_space
-    _create_core_state_space_per_period
+    _add_lagged_choice_to_core_state_space
     _filter_core_state_space
     _add_initial_experiences_to_core_state_space
     _create_core_state_space_indexer
@@ -424,10 +1147,14 @@ def _create_core_and_indexer(optim_paras, options):
 
     core = _add_lagged_choice_to_core_state_space(core, optim_paras)
 
-    core = _filter_core_state_space(core, options)
+    core = _filter_core_state_space(core, optim_paras, options)
 
     core = _add_initial_experiences_to_core_state_space(core, optim_paras)
 
+    columns = create_core_state_space_columns(optim_paras)
+    core = pd.DataFrame(data=core, columns=["period"] + columns)
+    core["period"] = core["period"].astype(np.uint8)
+
     core = core.sort_values("period").reset_index(drop=True)
 
     indexer = _create_core_state_space_indexer(core, optim_paras)
@@ -443,104 +1170,92 @@ def _create_core_state_space(optim_paras):
     combinations of initial experiences are applied later in
     :func:`_add_initial_experiences_to_core_state_space`.
 
-    See also
+    The states of all periods are created at once. Starting from a matrix with one row
+    per period, each choice with experience extends the matrix by another column.
+    Every row is repeated once for each admissible level of experience in the choice
+    which is bounded by the remaining time and the maximum additional experience. The
+    new column is filled with the levels ``0, 1, ...`` of each repeated row.
+
+    Returns
+    -------
+    states : numpy.ndarray
+        Array with shape (n_states, 1 + n_choices_w_exp) containing the period and the
+        experiences. The states are sorted by period and experiences.
+
+    Examples
     --------
-    _create_core_state_space_per_period
+    >>> optim_paras = {
+    ...     "n_periods": 3,
+    ...     "choices_w_exp": ["a", "b"],
+    ...     "choices": {"a": {"start": [0], "max": 1}, "b": {"start": [0], "max": 5}},
+    ... }
+    >>> _create_core_state_space(optim_paras)
+    array([[0, 0, 0],
+           [1, 0, 0],
+           [1, 0, 1],
+           [1, 1, 0],
+           [2, 0, 0],
+           [2, 0, 1],
+           [2, 0, 2],
+           [2, 1, 0],
+           [2, 1, 1]])
 
     """
-    choices_w_exp = list(optim_paras["choices_w_exp"])
-    minimal_initial_experience = np.array(
-        [min(optim_paras["choices"][choice]["start"]) for choice in choices_w_exp],
-        dtype=np.uint8,
-    )
-    maximum_exp = np.array(
-        [optim_paras["choices"][choice]["max"] for choice in choices_w_exp],
-        dtype=np.uint8,
-    )
-
-    additional_exp = maximum_exp - minimal_initial_experience
+    choices = optim_paras["choices"]
+    additional_exp = [
+        choices[choice]["max"] - min(choices[choice]["start"])
+        for choice in optim_paras["choices_w_exp"]
+    ]
 
-    exp_cols = [f"exp_{choice}" for choice in choices_w_exp]
+    states = np.arange(optim_paras["n_periods"], dtype=np.int64).reshape(-1, 1)
+    remaining_time = states[:, 0].copy()
 
-    container = []
-    for period in np.arange(optim_paras["n_periods"], dtype=np.uint8):
-        data = _create_core_state_space_per_period(
-            period,
-            additional_exp,
-            optim_paras,
-            np.zeros(len(choices_w_exp), dtype=np.uint8),
-        )
-        df_ = pd.DataFrame.from_records(data, columns=exp_cols)
-        df_.insert(0, "period", period)
-        container.append(df_)
+    for max_experience in additional_exp:
+        # +1 is necessary so that the remaining time or max_experience is exhausted.
+        n_levels = np.minimum(remaining_time, max_experience) + 1
 
-    df = pd.concat(container, axis="rows", sort=False)
+        states = np.repeat(states, n_levels, axis=0)
+        remaining_time = np.repeat(remaining_time, n_levels)
 
-    return df
+        first_row_of_repetitions = np.repeat(np.cumsum(n_levels) - n_levels, n_levels)
+        experience = np.arange(states.shape[0]) - first_row_of_repetitions
 
+        states = np.column_stack((states, experience))
+        remaining_time -= experience
 
-def _create_core_state_space_per_period(
-    period, additional_exp, optim_paras, experiences, pos=0
-):
-    """Create core state space per period.
+    return states
 
-    First, this function returns a state combined with all possible lagged choices and
-    types.
 
-    Secondly, if there exists a choice with experience in ``additional_exp[pos]``, loop
-    over all admissible experiences, update the state and pass it to the same function,
-    but moving to the next choice which accumulates experience.
+def _add_lagged_choice_to_core_state_space(states, optim_paras):
+    """Add lagged choices to the core state space.
 
-    Parameters
-    ----------
-    period : int
-        Number of period.
-    additional_exp : numpy.ndarray
-        Array with shape (n_choices_w_exp,) containing integers representing the
-        additional experience per choice which is admissible. This is the difference
-        between the maximum experience and minimum of initial experience per choice.
-    experiences : None or numpy.ndarray, default None
-        Array with shape (n_choices_w_exp,) which contains current experience of state.
-    pos : int, default 0
-        Index for current choice with experience. If index is valid for array
-        ``experiences``, then loop over all admissible experience levels of this choice.
-        Otherwise, ``experiences[pos]`` would lead to an :exc:`IndexError`.
+    The states are replicated for every combination of lagged choices where the
+    combination varies slower than the states.
 
     """
-    # Return experiences combined with lagged choices and types.
-    yield experiences
-
-    # Check if there is an additional choice left to start another loop.
-    if pos < experiences.shape[0]:
-        # Upper bound of additional experience is given by the remaining time or the
-        # maximum experience which can be accumulated in experience[pos].
-        remaining_time = period - experiences.sum()
-        max_experience = additional_exp[pos]
-
-        # +1 is necessary so that the remaining time or max_experience is exhausted.
-        for i in np.arange(min(remaining_time, max_experience) + 1, dtype=np.uint8):
-            # Update experiences and call the same function with the next choice.
-            updated_experiences = experiences.copy()
-            updated_experiences[pos] += i
-            yield from _create_core_state_space_per_period(
-                period, additional_exp, optim_paras, updated_experiences, pos + 1
+    n_lagged_choices = optim_paras["n_lagged_choices"]
+
+    if n_lagged_choices:
+        n_states = states.shape[0]
+        lagged_choices = np.array(
+            list(
+                itertools.product(
+                    range(len(optim_paras["choices"])), repeat=n_lagged_choices
+                )
+            ),
+            dtype=np.int64,
+        )
+        states = np.column_stack(
+            (
+                np.tile(states, (lagged_choices.shape[0], 1)),
+                np.repeat(lagged_choices, n_states, axis=0),
             )
+        )
 
-
-def _add_lagged_choice_to_core_state_space(df, optim_paras):
-    container = []
-    for lag in range(1, optim_paras["n_lagged_choices"] + 1):
-        for choice_code in range(len(optim_paras["choices"])):
-            df_ = df.copy()
-            df_[f"lagged_choice_{lag}"] = choice_code
-            container.append(df_)
-
-    df = pd.concat(container, axis="rows", sort=False) if container else df
-
-    return df
+    return states
 
 
-def _filter_core_state_space(df, options):
+def _filter_core_state_space(states, optim_paras, options):
     """Apply filters to the core state space.
 
     Sometimes, we want to apply filters to a group of choices. Thus, use the following
@@ -550,19 +1265,31 @@ def _filter_core_state_space(df, options):
     - ``j`` is replaced with every choice without experience.
     - ``k`` is replaced with every choice with a wage.
 
+    All filters are evaluated in a single pass over the columns of the integer matrix
+    with a compiled function and the union of all filters is removed at once. See
+    :func:`respy.formulas.evaluate_predicates`.
+
     Parameters
     ----------
-    df : pandas.DataFrame
+    states : numpy.ndarray
+        Array with shape (n_states, n_core_columns + 1) containing the period and the
+        core state space columns.
+    optim_paras : dict
     options : dict
 
     """
-    for definition in options["core_state_space_filters"]:
-        df = df.loc[~df.eval(definition)]
+    if options["core_state_space_filters"]:
+        columns = ["period"] + create_core_state_space_columns(optim_paras)
+        is_filtered = evaluate_predicates(
+            [options["core_state_space_filters"]], dict(zip(columns, states.T))
+        )[:, 0]
 
-    return df
+        states = states[~is_filtered]
 
+    return states
 
-def _add_initial_experiences_to_core_state_space(df, optim_paras):
+
+def _add_initial_experiences_to_core_state_space(states, optim_paras):
     """Add initial experiences to core state space.
 
     As the core state space abstracts from differences in initial experiences, this
@@ -570,35 +1297,42 @@ def _add_initial_experiences_to_core_state_space(df, optim_paras):
     existing experiences. After that, we need to check whether the maximum in
     experiences is still binding.
 
+    Different combinations of initial experiences can lead to the same state. Only the
+    first occurrence of each state is kept.
+
     """
     choices = optim_paras["choices"]
-    # Create combinations of starting values
-    initial_experiences_combinations = itertools.product(
-        *[choices[choice]["start"] for choice in optim_paras["choices_w_exp"]]
-    )
+    choices_w_exp = optim_paras["choices_w_exp"]
+    n_choices_w_exp = len(choices_w_exp)
 
-    maximum_exp = np.array(
-        [choices[choice]["max"] for choice in optim_paras["choices_w_exp"]]
+    # Create combinations of starting values
+    initial_experiences_combinations = list(
+        itertools.product(*[choices[choice]["start"] for choice in choices_w_exp])
     )
 
-    exp_cols = df.filter(like="exp_").columns.tolist()
+    maximum_exp = np.array([choices[choice]["max"] for choice in choices_w_exp])
 
     container = []
-
     for initial_exp in initial_experiences_combinations:
-        df_ = df.copy()
+        states_ = states.copy()
 
         # Add initial experiences.
-        df_[exp_cols] += initial_exp
+        states_[:, 1 : n_choices_w_exp + 1] += initial_exp
 
         # Check that max_experience is still fulfilled.
-        df_ = df_.loc[df_[exp_cols].le(maximum_exp).all(axis="columns")].copy()
+        is_valid = (states_[:, 1 : n_choices_w_exp + 1] <= maximum_exp).all(axis=1)
+        states_ = states_[is_valid]
 
-        container.append(df_)
+        container.append(states_)
 
-    df = pd.concat(container, axis="rows", sort=False).drop_duplicates()
+    states = np.concatenate(container)
 
-    return df
+    if len(container) > 1:
+        # Map each state to a unique integer to find duplicates with a hash table.
+        keys = np.ravel_multi_index(states.T, states.max(axis=0) + 1)
+        states = states[~pd.Index(keys).duplicated()]
+
+    return states
 
 
 def _create_dense_state_space_grid(optim_paras):
@@ -633,8 +1367,13 @@ def _create_core_state_space_indexer(df, optim_paras):
     ).astype(np.uint8)
     max_experience = [choices[choice]["max"] for choice in optim_paras["choices_w_exp"]]
 
+    # The states are sorted by period which allows to slice the states of each period.
+    states = df[create_core_state_space_columns(optim_paras)].to_numpy()
+    bounds = np.searchsorted(
+        df["period"].to_numpy(), np.arange(optim_paras["n_periods"] + 1)
+    )
+
     indexer = []
-    count_states = 0
 
     for period in range(optim_paras["n_periods"]):
         shape = (
@@ -643,21 +1382,12 @@ def _create_core_state_space_indexer(df, optim_paras):
         )
         sub_indexer = np.full(shape, INDEXER_INVALID_INDEX, dtype=INDEXER_DTYPE)
 
-        sub_df = df.query("period == @period")
-        n_states = sub_df.shape[0]
-
-        indices = tuple(
-            sub_df[f"exp_{i}"] for i in optim_paras["choices_w_exp"]
-        ) + tuple(
-            sub_df[f"lagged_choice_{i}"]
-            for i in range(1, optim_paras["n_lagged_choices"] + 1)
-        )
+        start, stop = bounds[period], bounds[period + 1]
+        indices = tuple(states[start:stop].T)
 
-        sub_indexer[indices] = np.arange(count_states, count_states + n_states)
+        sub_indexer[indices] = np.arange(start, stop)
         indexer.append(sub_indexer)
 
-        count_states += n_states
-
     return indexer
 
 
@@ -0,0 +1,118 @@
+"""Test the compilation of formulas."""
+import numpy as np
+import pandas as pd
+import pytest
+
+from respy.config import EXAMPLE_MODELS
+from respy.formulas import evaluate_formulas
+from respy.formulas import evaluate_predicates
+from respy.pre_processing.model_processing import process_params_and_options
+from respy.shared import _sort_covariates_topologically
+from respy.shared import compute_covariates
+from respy.shared import create_core_state_space_columns
+from respy.state_space import get_state_space_structure
+from respy.tests.utils import process_model_or_seed
+
+
+FORMULAS = [
+    "period > 0 and exp_a == period and lagged_choice_1 != 0",
+    "period > 0 & exp_a + exp_b == period | lagged_choice_1 == 3",
+    "2 <= period <= 4",
+    "10 <= exp_b and black",
+    "~black",
+    "not black",
+    "period - exp_a < 2",
+    "exp_a ** 2 / 100 > 1.5",
+    "exp_b % 4 == 1 or exp_b == 2",
+    "-exp_a < -3 and x > 0.5",
+    "(period >= 3) & (period - exp_a < 2)",
+    "exp_a > 0 and ~(lagged_choice_1 == 1)",
+    # Membership tests are not compiled, but evaluated with pandas.
+    "lagged_choice_1 in [1, 2] and exp_a > 3",
+]
+
+
+@pytest.fixture(scope="module")
+def data():
+    n_rows = 1_000
+    data = pd.DataFrame(
+        {
+            "period": np.random.randint(0, 40, n_rows).astype(np.uint8),
+            "exp_a": np.random.randint(0, 20, n_rows).astype(np.int8),
+            "exp_b": np.random.randint(0, 20, n_rows),
+            "lagged_choice_1": np.random.randint(0, 4, n_rows).astype(np.uint8),
+            "black": np.random.uniform(size=n_rows) > 0.5,
+            "x": np.random.uniform(size=n_rows),
+        }
+    )
+
+    return data
+
+
+@pytest.mark.parametrize("formula", FORMULAS)
+def test_evaluate_predicates_against_pandas(data, formula):
+    is_true = evaluate_predicates([[formula]], data)
+
+    np.testing.assert_array_equal(is_true[:, 0], data.eval(formula).to_numpy())
+
+
+def test_evaluate_groups_of_predicates_against_pandas(data):
+    groups = [FORMULAS[:3], [], FORMULAS[3:]]
+
+    is_true = evaluate_predicates(groups, data)
+
+    for i, group in enumerate(groups):
+        expected = np.zeros(len(data), dtype=np.bool_)
+        for formula in group:
+            expected |= data.eval(formula).to_numpy()
+        np.testing.assert_array_equal(is_true[:, i], expected)
+
+
+@pytest.mark.parametrize("model", EXAMPLE_MODELS)
+def test_inadmissible_states_against_pandas(model):
+    params, options = process_model_or_seed(model)
+    optim_paras, options = process_params_and_options(params, options)
+
+    core, _, _, is_inadmissible, _, _ = get_state_space_structure(optim_paras, options)
+
+    for i, choice in enumerate(optim_paras["choices"]):
+        expected = np.zeros(len(core), dtype=np.bool_)
+        for formula in options["inadmissible_states"][choice]:
+            # Formulas like "False" evaluate to scalars.
+            expected |= np.asarray(core.eval(formula))
+        np.testing.assert_array_equal(is_inadmissible[:, i], expected)
+
+
+@pytest.mark.parametrize("model", EXAMPLE_MODELS)
+def test_compute_covariates_against_pandas(model):
+    params, options = process_model_or_seed(model)
+    optim_paras, options = process_params_and_options(params, options)
+
+    core, _, _, _, _, _ = get_state_space_structure(optim_paras, options)
+    columns = ["period"] + create_core_state_space_columns(optim_paras)
+    # The covariates are computed on the downcasted core while pandas uses integers
+    # which cannot overflow.
+    df = core[columns]
+
+    definitions = options["covariates_core"]
+    expected = df.astype(np.int64)
+    for covariate in _sort_covariates_topologically(list(definitions), definitions):
+        expected[covariate] = expected.eval(definitions[covariate]["formula"])
+
+    df = compute_covariates(df.copy(), definitions)
+
+    pd.testing.assert_frame_equal(
+        df.drop(columns=columns), expected.drop(columns=columns)
+    )
+
+
+def test_formulas_on_downcasted_integers_do_not_overflow():
+    data = {
+        "a": np.array([0, 1, 2], dtype=np.uint8),
+        "b": np.array([3, 0, 1], dtype=np.int8),
+    }
+
+    results = evaluate_formulas([("x", "a - 1"), ("y", "b * 100")], data)
+
+    np.testing.assert_array_equal(results["x"], [-1, 0, 1])
+    np.testing.assert_array_equal(results["y"], [300, 0, 100])
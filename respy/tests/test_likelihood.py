@@ -1,9 +1,23 @@
+import functools
+import os
+import subprocess
+import sys
+import textwrap
+
 import numpy as np
 import pandas as pd
 import pytest
 
+from respy.conditional_draws import create_conditional_distribution_and_log_prob_wages
+from respy.conditional_draws import create_draws_and_log_prob_wages
+from respy.config import MAX_LOG_FLOAT
+from respy.likelihood import _simulate_log_probability_and_weights_of_derivatives
+from respy.likelihood import _simulate_log_probability_of_individuals_observed_choice
+from respy.likelihood import get_crit_and_grad_func
 from respy.likelihood import get_crit_func
+from respy.likelihood import log_like_many
 from respy.simulate import get_simulate_func
+from respy.tests.random_model import add_noise_to_params
 from respy.tests.utils import process_model_or_seed
 
 
@@ -42,3 +56,193 @@ def test_return_scalar_for_likelihood(model):
     array = loglike(params)
 
     assert isinstance(array, np.ndarray)
+
+
+def test_skipping_inadmissible_choices_is_equal_to_a_dominating_penalty():
+    params, options = process_model_or_seed("kw_97_basic")
+    options = {**options, "n_periods": 10, "solution_draws": 100}
+
+    simulate = get_simulate_func(params, options)
+    df = simulate(params)
+
+    expected = get_crit_func(params, options, df, return_scalar=False)(params)
+
+    options = {**options, "skip_inadmissible_choices": True}
+    loglike = get_crit_func(params, options, df, return_scalar=False)(params)
+
+    np.testing.assert_allclose(loglike, expected)
+
+
+@pytest.mark.parametrize("model", ["kw_94_one", "kw_97_basic"])
+def test_log_like_many_is_equal_to_log_like(model):
+    params, options = process_model_or_seed(model)
+
+    simulate = get_simulate_func(params, options)
+    df = simulate(params)
+
+    params_list = [params] + [
+        add_noise_to_params(params, options, seed=seed) for seed in range(2)
+    ]
+    loglike = get_crit_func(params, options, df)
+    loglike_many = functools.partial(log_like_many, **loglike.keywords)
+
+    np.testing.assert_array_equal(
+        loglike_many(params_list), [loglike(params_) for params_ in params_list]
+    )
+
+
+@pytest.mark.parametrize("model", ["kw_94_one", "kw_2000"])
+@pytest.mark.parametrize("chunk_size", [None, 7])
+def test_estimation_plan_covers_every_observation_and_type_once(model, chunk_size):
+    params, options = process_model_or_seed(model)
+    options = {**options, "n_periods": 3, "estimation_chunk_size": chunk_size}
+
+    simulate = get_simulate_func(params, options)
+    df = simulate(params)
+
+    loglike = get_crit_func(params, options, df)
+    plan = loglike.keywords["plan"]
+    n_obs = df.shape[0]
+    n_types = len(loglike.keywords["base_draws_est"]) // n_obs
+
+    counts = np.zeros((n_obs, n_types), dtype=int)
+    first_row = 0
+    for chunk in plan["chunks"]:
+        groups = chunk["groups"]
+        groups = [groups] if "rows" in groups else groups.values()
+        for group in groups:
+            np.add.at(counts, (first_row + group["rows"], group["type"]), 1)
+        first_row += chunk["n_obs"]
+
+    assert (counts == 1).all()
+
+
+@pytest.mark.parametrize("model", ["kw_94_one", "kw_2000"])
+@pytest.mark.parametrize("n_jobs", [1, 2])
+def test_chunked_likelihood_is_equal_to_likelihood(model, n_jobs):
+    params, options = process_model_or_seed(model)
+    options = {**options, "n_periods": 3, "estimation_draws": 20}
+
+    simulate = get_simulate_func(params, options)
+    df = simulate(params)
+
+    expected, expected_df = get_crit_func(
+        params, options, df, return_scalar=False, return_comparison_plot_data=True
+    )(params)
+
+    options = {**options, "estimation_chunk_size": 101, "estimation_n_jobs": n_jobs}
+    loglike = get_crit_func(
+        params, options, df, return_scalar=False, return_comparison_plot_data=True
+    )
+    contribs, comparison_plot_data = loglike(params)
+
+    assert len(loglike.keywords["plan"]["chunks"]) > 1
+    np.testing.assert_array_equal(contribs, expected)
+    pd.testing.assert_frame_equal(comparison_plot_data, expected_df)
+
+
+def test_chunks_in_multiple_threads_are_rejected_with_workqueue_threading_layer():
+    # The threading layer of numba is fixed in the first parallel launch of a process.
+    script = textwrap.dedent(
+        """
+        import pytest
+        from respy.likelihood import get_crit_func
+        from respy.simulate import get_simulate_func
+        from respy.tests.utils import process_model_or_seed
+
+        params, options = process_model_or_seed("kw_94_one")
+        options = {**options, "n_periods": 2, "estimation_n_jobs": 2}
+        df = get_simulate_func(params, options)(params)
+
+        with pytest.raises(ValueError, match="threading layer is 'workqueue'"):
+            get_crit_func(params, options, df)
+        """
+    )
+    env = {**os.environ, "NUMBA_THREADING_LAYER": "workqueue"}
+
+    subprocess.run([sys.executable, "-c", script], env=env, check=True, timeout=600)
+
+
+@pytest.mark.parametrize("model", ["kw_94_one", "kw_97_extended"])
+def test_analytic_scores_are_equal_to_numerical_derivatives(model):
+    params, options = process_model_or_seed(model)
+    options = {**options, "n_periods": 4, "simulation_agents": 200}
+
+    simulate = get_simulate_func(params, options)
+    df = simulate(params)
+
+    loglike = get_crit_func(params, options, df, return_scalar=False)
+    value, gradient, scores = get_crit_and_grad_func(params, options, df)(params)
+
+    np.testing.assert_allclose(value, loglike(params).mean())
+    np.testing.assert_allclose(gradient, scores.mean())
+
+    params = params["value"]
+    for index in params.index:
+        if index[0].startswith(("wage_", "nonpec_", "type_")):
+            step = 1e-7 * max(abs(params[index]), 1)
+            upper = params.copy()
+            upper[index] += step
+            lower = params.copy()
+            lower[index] -= step
+            numerical_scores = (loglike(upper) - loglike(lower)) / (2 * step)
+
+            np.testing.assert_allclose(
+                scores[index], numerical_scores, rtol=1e-5, atol=1e-6
+            )
+
+
+@pytest.mark.parametrize("skip_inadmissible", [False, True])
+def test_choice_probabilities_from_base_draws_are_equal_to_conditional_draws(
+    skip_inadmissible,
+):
+    np.random.seed(0)
+    n_obs, n_draws, n_choices, n_wages = 50, 20, 4, 2
+
+    shocks_cholesky = np.tril(np.random.uniform(0.1, 0.5, (n_choices, n_choices)))
+    wages = np.random.uniform(1, 3, (n_obs, n_choices))
+    nonpecs = np.random.normal(size=(n_obs, n_choices))
+    continuation_values = np.random.normal(size=(n_obs, n_choices))
+    choices = np.random.choice(n_choices, size=n_obs)
+    log_wages = np.where(
+        choices < n_wages, np.log(wages[np.arange(n_obs), choices]) + 0.1, np.nan
+    )
+    is_inadmissible = np.random.uniform(size=(n_obs, n_choices)) < 0.2
+    base_draws = np.random.normal(size=(n_obs, n_draws, n_choices))
+    args = (shocks_cholesky, n_wages, np.zeros(n_choices), False)
+
+    draws, _ = create_draws_and_log_prob_wages(
+        log_wages, wages, base_draws, choices, *args
+    )
+    expected, _, _ = _simulate_log_probability_and_weights_of_derivatives(
+        wages,
+        nonpecs,
+        continuation_values,
+        draws,
+        0.95,
+        choices,
+        0.5,
+        is_inadmissible,
+        skip_inadmissible,
+    )
+
+    means, chols, chol_indices, _ = create_conditional_distribution_and_log_prob_wages(
+        log_wages, wages, choices, *args
+    )
+    log_probabilities = _simulate_log_probability_of_individuals_observed_choice(
+        wages,
+        nonpecs,
+        continuation_values,
+        base_draws,
+        means,
+        chols,
+        chol_indices,
+        MAX_LOG_FLOAT,
+        0.95,
+        choices,
+        0.5,
+        is_inadmissible,
+        skip_inadmissible,
+    )
+
+    np.testing.assert_array_equal(log_probabilities, expected)
@@ -42,6 +42,26 @@ def test_model_options(model_or_seed):
     validate_options(options)
 
 
+@pytest.mark.parametrize(
+    "options_", [{"monte_carlo_sequence": "antithetic"}, {"interpolation_points": 100}],
+)
+def test_adaptive_draws_are_rejected_for_unsupported_options(options_):
+    params, options = process_model_or_seed("kw_94_one")
+    options = {**options, **options_, "solution_adaptive_tolerance": 0.01}
+
+    with pytest.raises(AssertionError):
+        process_params_and_options(params, options)
+
+
+def test_adaptive_draws_are_rejected_for_myopic_agents():
+    params, options = process_model_or_seed("kw_94_one")
+    params.loc[("delta", "delta"), "value"] = 0
+    options = {**options, "solution_adaptive_tolerance": 0.01}
+
+    with pytest.raises(AssertionError, match="myopic agents"):
+        process_params_and_options(params, options)
+
+
 def test_parse_initial_and_max_experience():
     """Test ensures that probabilities are transformed with logs and rest passes."""
     choices = ["a", "b"]
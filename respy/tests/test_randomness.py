@@ -3,6 +3,9 @@ import numpy as np
 import pytest
 
 from respy.likelihood import get_crit_func
+from respy.shared import _philox_4x32_10
+from respy.shared import CounterBasedDraws
+from respy.shared import create_base_draws
 from respy.simulate import get_simulate_func
 from respy.solve import get_solve_func
 from respy.tests.utils import apply_to_attributes_of_two_state_spaces
@@ -49,3 +52,84 @@ def test_invariance_of_model_solution_in_solve_and_criterion_functions(model):
             state_space_.get_attribute("base_draws_sol"),
             np.testing.assert_array_equal,
         )
+
+
+def test_antithetic_draws_are_mirrored():
+    draws = create_base_draws((3, 7, 4), 1, "antithetic")
+
+    assert draws.shape == (3, 7, 4)
+    np.testing.assert_array_equal(draws[:, 4:], -draws[:, :3])
+
+
+@pytest.mark.parametrize(
+    "counter, key, expected",
+    [
+        ([0] * 4, [0] * 2, [0x6627E8D5, 0xE169C58D, 0xBC57AC4C, 0x9B00DBD8]),
+        (
+            [0xFFFFFFFF] * 4,
+            [0xFFFFFFFF] * 2,
+            [0x408F276D, 0x41C83B0E, 0xA20BC7C6, 0x6D5451FD],
+        ),
+        (
+            [0x243F6A88, 0x85A308D3, 0x13198A2E, 0x03707344],
+            [0xA4093822, 0x299F31D0],
+            [0xD16CFE09, 0x94FDCCEB, 0x5001E420, 0x24126EA1],
+        ),
+    ],
+)
+def test_philox_is_equal_to_known_answers(counter, key, expected):
+    """Known answers are taken from the reference implementation Random123."""
+    words = _philox_4x32_10(*np.array(counter + key, dtype=np.uint64))
+
+    assert list(words) == expected
+
+
+def test_counter_based_draws_of_subsets_are_equal_to_full_draws():
+    draws = CounterBasedDraws((50, 7, 3), 1)
+    full_draws = create_base_draws((50, 7, 3), 1, "philox")
+    indices = np.array([49, 3, 3, 0])
+
+    assert draws.shape == full_draws.shape
+    np.testing.assert_array_equal(np.asarray(draws[indices]), full_draws[indices])
+    np.testing.assert_array_equal(np.asarray(draws[10:20][::3]), full_draws[10:20:3])
+    np.testing.assert_array_equal(draws[7], full_draws[7])
+
+
+@pytest.mark.parametrize("model", ["kw_94_one", "kw_2000"])
+def test_likelihood_with_counter_based_draws_is_equal_to_stored_draws(model):
+    params, options = process_model_or_seed(model)
+    options = {**options, "n_periods": 4, "monte_carlo_sequence": "philox"}
+
+    simulate = get_simulate_func(params, options)
+    df = simulate(params)
+
+    crit_func = get_crit_func(params, options, df, return_scalar=False)
+    base_draws_est = crit_func.keywords["base_draws_est"]
+    crit_func_w_stored_draws = get_crit_func(params, options, df, return_scalar=False)
+    crit_func_w_stored_draws.keywords["base_draws_est"] = np.asarray(base_draws_est)
+
+    assert isinstance(base_draws_est, CounterBasedDraws)
+    np.testing.assert_array_equal(crit_func(params), crit_func_w_stored_draws(params))
+
+
+def test_counter_based_draws_of_individuals_do_not_depend_on_other_individuals():
+    params, options = process_model_or_seed("kw_2000")
+    options = {**options, "n_periods": 3, "monte_carlo_sequence": "philox"}
+
+    simulate = get_simulate_func(params, options)
+    df = simulate(params)
+
+    contribs = get_crit_func(params, options, df, return_scalar=False)(params)
+
+    # Drop the last observation of the first individual which shifts the positions of
+    # all following observations.
+    df_ = df.drop(index=(0, options["n_periods"] - 1))
+    contribs_ = get_crit_func(params, options, df_, return_scalar=False)(params)
+
+    assert contribs[0] != contribs_[0]
+    np.testing.assert_array_equal(contribs[1:], contribs_[1:])
+
+
+def test_counter_based_draws_reject_labels_which_do_not_fit_into_32_bits():
+    with pytest.raises(ValueError, match="32 bits"):
+        CounterBasedDraws((2, 7, 3), 1, np.array([[0, 0, 0], [2 ** 32, 0, 0]]))
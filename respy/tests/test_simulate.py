@@ -9,6 +9,7 @@ from respy.likelihood import get_crit_func
 from respy.pre_processing.data_checking import check_simulated_data
 from respy.pre_processing.model_processing import process_params_and_options
 from respy.pre_processing.specification_helpers import generate_obs_labels
+from respy.state_space import save_state_space
 from respy.tests.random_model import generate_random_model
 from respy.tests.utils import process_model_or_seed
 
@@ -135,3 +136,24 @@ def test_distribution_of_observables():
         ]
 
         np.testing.assert_allclose(probability, params_probability, atol=0.05)
+
+
+@pytest.mark.parametrize("model", ["kw_97_basic", "kw_2000"])
+def test_simulation_from_stored_solution(model, tmp_path):
+    params, options = process_model_or_seed(model)
+
+    simulate = rp.get_simulate_func(params, options)
+    df = simulate(params)
+
+    state_space = simulate.keywords["solve"](params)
+    save_state_space(state_space, tmp_path, params)
+
+    simulate_ = rp.get_simulate_func(params, options, solution=tmp_path)
+    df_ = simulate_(params)
+
+    pd.testing.assert_frame_equal(df, df_)
+
+    params_ = params.copy()
+    params_.loc[("delta", "delta"), "value"] -= 0.01
+    with pytest.raises(ValueError, match="differ from the parameters of the stored"):
+        simulate_(params_)
@@ -1,6 +1,7 @@
 import numpy as np
 import pandas as pd
 import pytest
+from scipy import stats
 
 from respy.config import EXAMPLE_MODELS
 from respy.config import INDEXER_INVALID_INDEX
@@ -9,13 +10,25 @@ from respy.config import KEANE_WOLPIN_1997_MODELS
 from respy.interface import get_example_model
 from respy.pre_processing.model_checking import check_model_solution
 from respy.pre_processing.model_processing import process_params_and_options
+from respy.shared import calculate_controlled_expected_value_functions
+from respy.shared import calculate_expected_shocks
 from respy.shared import create_core_state_space_columns
+from respy.shared import create_quadrature_nodes_and_weights
+from respy.solve import _approximate_expected_maximum_with_clark
+from respy.solve import _get_covariates_of_choice_rewards
+from respy.solve import _solve_with_backward_induction
 from respy.solve import get_solve_func
+from respy.solve import solve_many
 from respy.state_space import _create_core_and_indexer
 from respy.state_space import _insert_indices_of_child_states
+from respy.state_space import clear_state_space_cache
+from respy.state_space import load_state_space
+from respy.state_space import save_state_space
+from respy.state_space import state_space_cache_info
 from respy.tests._former_code import _create_state_space_kw94
 from respy.tests._former_code import _create_state_space_kw97_base
 from respy.tests._former_code import _create_state_space_kw97_extended
+from respy.tests.random_model import add_noise_to_params
 from respy.tests.utils import apply_to_attributes_of_two_state_spaces
 from respy.tests.utils import process_model_or_seed
 
@@ -234,3 +247,437 @@ def test_explicitly_nonpec_choice_rewards_of_kw_94_two():
         state_space.nonpecs[:, 2], [5_000, 0, -10_000, -15_000, -400_000, -415_000]
     ).all()
     assert (state_space.nonpecs[:, 3] == 14_500).all()
+
+
+def test_state_space_is_cached_across_solve_functions():
+    params, options = process_model_or_seed("kw_94_one")
+
+    clear_state_space_cache()
+
+    solve = get_solve_func(params, options)
+
+    params_ = params.copy()
+    params_.loc[("nonpec_home", "constant"), "value"] += 1_000
+    solve_ = get_solve_func(params_, options)
+
+    state_space = solve.keywords["state_space"]
+    state_space_ = solve_.keywords["state_space"]
+
+    assert state_space is not state_space_
+    assert state_space.core is state_space_.core
+    assert state_space.indices_of_child_states is state_space_.indices_of_child_states
+    assert not state_space.is_inadmissible.flags.writeable
+
+    info = state_space_cache_info()
+    assert info.hits == 1 and info.misses == 1 and info.currsize == 1
+
+    # Solutions of the two state spaces do not interfere.
+    state_space = solve(params)
+    nonpecs = state_space.nonpecs.copy()
+    solve_(params_)
+    np.testing.assert_array_equal(state_space.nonpecs, nonpecs)
+
+    # Changing the number of periods changes the structure of the state space.
+    options["n_periods"] -= 1
+    get_solve_func(params, options)
+
+    assert state_space_cache_info().misses == 2
+
+
+@pytest.mark.parametrize("model", ["kw_94_one", "kw_97_basic", "kw_2000"])
+def test_save_and_load_solved_state_space(model, tmp_path):
+    params, options = process_model_or_seed(model)
+
+    solve = get_solve_func(params, options)
+    state_space = solve(params)
+
+    save_state_space(state_space, tmp_path, params)
+    state_space_ = load_state_space(tmp_path)
+
+    assert type(state_space_) is type(state_space)
+    pd.testing.assert_frame_equal(state_space.core, state_space_.core)
+    for attribute in [
+        "is_inadmissible",
+        "indices_of_child_states",
+        "base_draws_sol",
+        "wages",
+        "nonpecs",
+        "expected_value_functions",
+    ]:
+        apply_to_attributes_of_two_state_spaces(
+            state_space.get_attribute(attribute),
+            state_space_.get_attribute(attribute),
+            np.testing.assert_array_equal,
+        )
+    for period in range(options["n_periods"]):
+        np.testing.assert_array_equal(
+            state_space.indexer[period], state_space_.indexer[period]
+        )
+    apply_to_attributes_of_two_state_spaces(
+        state_space.get_continuation_values(period=0),
+        state_space_.get_continuation_values(period=0),
+        np.testing.assert_array_equal,
+    )
+    assert isinstance(state_space_.indices_of_child_states, np.memmap)
+
+
+@pytest.mark.parametrize("model", ["kw_94_one", "kw_97_basic"])
+def test_covariates_of_choice_rewards_are_materialized_once(model):
+    params, options = process_model_or_seed(model)
+    optim_paras, _ = process_params_and_options(params, options)
+    labels = _get_covariates_of_choice_rewards(optim_paras)
+
+    solve = get_solve_func(params, options)
+    state_space = solve(params)
+    core_labels, dense_labels, mixed_labels = state_space.split_covariates(labels)
+    core, dense, mixed = state_space.get_covariates(labels)
+
+    state_space = solve(params)
+    core_, dense_, mixed_ = state_space.get_covariates(labels)
+
+    # The core covariates are computed once and shared by all sub state spaces.
+    assert core is core_
+    assert core.flags.c_contiguous and not core.flags.writeable
+
+    def _assert_covariates(dense, mixed, states):
+        np.testing.assert_array_equal(core, states[list(core_labels)].to_numpy())
+        np.testing.assert_array_equal(
+            np.broadcast_to(dense, (len(states), len(dense_labels))),
+            states[list(dense_labels)].to_numpy(),
+        )
+        np.testing.assert_array_equal(mixed, states[list(mixed_labels)].to_numpy())
+
+    if hasattr(state_space, "sub_state_spaces"):
+        # The dense and mixed covariates are stacked over all sub state spaces.
+        assert dense is dense_ and mixed is mixed_
+        for i, states in enumerate(state_space.states.values()):
+            _assert_covariates(dense[i], mixed[i], states)
+    else:
+        _assert_covariates(dense, mixed, state_space.states)
+
+
+@pytest.mark.parametrize("model", ["kw_94_one", "kw_97_basic", "kw_2000"])
+def test_incremental_solution_is_equal_to_solution_from_scratch(model):
+    params, options = process_model_or_seed(model)
+
+    solve = get_solve_func(params, options)
+    solve_incrementally = get_solve_func(
+        params, {**options, "solution_incremental": True}
+    )
+    solve_incrementally(params)
+
+    is_reward = params.index.get_level_values("category").str.match("wage_|nonpec_")
+    for index in params.index[is_reward][:: max(is_reward.sum() // 5, 1)]:
+        params_ = params.copy()
+        params_.loc[index, "value"] += 0.01
+
+        state_space = solve(params_)
+        state_space_ = solve_incrementally(params_)
+
+        for attribute in ["wages", "nonpecs", "expected_value_functions"]:
+            apply_to_attributes_of_two_state_spaces(
+                state_space.get_attribute(attribute),
+                state_space_.get_attribute(attribute),
+                np.testing.assert_array_equal,
+            )
+
+
+def test_solution_is_reused_if_only_likelihood_parameters_change():
+    params, options = process_model_or_seed("kw_97_basic")
+
+    solve = get_solve_func(params, options)
+    state_space = solve(params)
+    previous_solution = state_space._previous_solution
+
+    params_ = params.copy()
+    category = params.index.get_level_values("category")
+    params_.loc[category.str.match(r"type_\d|meas_error"), "value"] += 0.1
+    state_space = solve(params_)
+
+    assert state_space._previous_solution is previous_solution
+
+    params_.loc[("delta", "delta"), "value"] -= 0.01
+    state_space = solve(params_)
+
+    assert state_space._previous_solution is not previous_solution
+
+
+@pytest.mark.parametrize("model", ["kw_94_one", "kw_97_basic"])
+def test_backward_induction_in_one_function_is_equal_to_loop_over_periods(model):
+    params, options = process_model_or_seed(model)
+    optim_paras, options = process_params_and_options(params, options)
+
+    solve = get_solve_func(params, options)
+    state_space = solve(params)
+    expected = apply_to_attributes_of_two_state_spaces(
+        state_space.get_attribute("expected_value_functions"),
+        state_space.get_attribute("expected_value_functions"),
+        lambda x, _: x.copy(),
+    )
+
+    state_space = _solve_with_backward_induction(
+        state_space,
+        state_space._previous_solution["draws_emax_risk"],
+        np.ones(options["solution_draws"]),
+        None,
+        optim_paras,
+        options,
+        optim_paras["n_periods"] - 1,
+    )
+
+    apply_to_attributes_of_two_state_spaces(
+        state_space.get_attribute("expected_value_functions"),
+        expected,
+        np.testing.assert_array_equal,
+    )
+
+
+@pytest.mark.parametrize("model", ["kw_94_one", "kw_97_basic"])
+def test_continuation_values_of_invalid_child_states_are_zero(model):
+    params, options = process_model_or_seed(model)
+
+    solve = get_solve_func(params, options)
+    state_space = solve(params)
+
+    sub_state_spaces = getattr(state_space, "sub_state_spaces", {None: state_space})
+    for sss in sub_state_spaces.values():
+        indices = sss.indices_of_child_states
+        mask = indices != INDEXER_INVALID_INDEX
+        expected = np.where(
+            mask, sss.expected_value_functions[np.where(mask, indices, 0)], 0
+        )
+
+        continuation_values = sss.get_continuation_values(
+            indices=np.arange(indices.shape[0])
+        )
+
+        np.testing.assert_array_equal(continuation_values, expected)
+        assert sss.expected_value_functions_w_sentinel[-1] == 0
+
+
+def test_transformed_draws_are_reused_if_shocks_are_unchanged():
+    params, options = process_model_or_seed("kw_94_one")
+
+    solve = get_solve_func(params, options)
+    state_space = solve(params)
+    draws = state_space._previous_solution["draws_emax_risk"]
+
+    params_ = params.copy()
+    params_.loc[("wage_a", "constant"), "value"] += 0.01
+    state_space = solve(params_)
+
+    assert state_space._previous_solution["draws_emax_risk"] is draws
+
+    params_.loc[("shocks_sdcorr", "sd_a"), "value"] *= 1.01
+    state_space = solve(params_)
+
+    assert state_space._previous_solution["draws_emax_risk"] is not draws
+
+
+@pytest.mark.parametrize("rule", ["gauss_hermite", "smolyak"])
+def test_quadrature_rules_integrate_polynomials_of_standard_normal(rule):
+    nodes, weights = create_quadrature_nodes_and_weights(3, rule, 2)
+
+    np.testing.assert_allclose(weights.sum(), 1)
+    np.testing.assert_allclose(weights @ nodes, 0, atol=1e-15)
+    np.testing.assert_allclose(weights @ nodes ** 2, 1)
+    np.testing.assert_allclose(weights @ nodes ** 4, 3)
+    np.testing.assert_allclose(weights @ (nodes[:, 0] ** 2 * nodes[:, 1] ** 2), 1)
+
+
+@pytest.mark.parametrize("rule", ["gauss_hermite", "smolyak"])
+def test_solution_with_quadrature_rule(rule):
+    params, options = process_model_or_seed("kw_94_one")
+    options = {**options, "solution_integration": rule, "solution_quadrature_order": 2}
+
+    solve = get_solve_func(params, options)
+    state_space = solve(params)
+
+    optim_paras, options = process_params_and_options(params, options)
+    check_model_solution(optim_paras, options, state_space)
+
+    nodes, _ = create_quadrature_nodes_and_weights(4, rule, 2)
+    for period_nodes in state_space.base_draws_sol:
+        np.testing.assert_array_equal(period_nodes, nodes)
+
+
+@pytest.mark.parametrize("mean_diff, corr", [(0, 0), (1.5, 0), (-0.5, 0.6)])
+def test_clark_approximation_is_exact_for_two_normal_random_variables(mean_diff, corr):
+    sds = np.array([1.0, 2.0])
+    shocks_kernel = np.outer(sds, sds) * np.array([[1, corr], [corr, 1]])
+    means = np.array([0, mean_diff])
+
+    expected_maximum = _approximate_expected_maximum_with_clark(
+        means, np.ones(2), shocks_kernel, np.empty(2), np.zeros(2, dtype=np.bool_)
+    )
+
+    a = np.sqrt(sds[0] ** 2 + sds[1] ** 2 - 2 * corr * sds[0] * sds[1])
+    alpha = -mean_diff / a
+    expected = mean_diff * stats.norm.cdf(-alpha) + a * stats.norm.pdf(alpha)
+
+    np.testing.assert_allclose(expected_maximum, expected)
+
+
+def test_solution_with_clark_approximation_is_close_to_monte_carlo_integration():
+    params, options = process_model_or_seed("kw_94_one")
+
+    state_space = get_solve_func(params, options)(params)
+    expected = state_space.get_attribute("expected_value_functions").copy()
+
+    options = {**options, "solution_integration": "clark"}
+    state_space = get_solve_func(params, options)(params)
+
+    assert state_space.base_draws_sol.size == 0
+    np.testing.assert_allclose(
+        state_space.get_attribute("expected_value_functions"), expected, rtol=0.05
+    )
+
+
+def test_control_variate_is_exact_if_one_choice_dominates():
+    draws = np.random.normal(size=(50, 2))
+
+    expected_value_function = calculate_controlled_expected_value_functions(
+        np.ones(2),
+        np.array([100, -1e6]),
+        np.zeros(2),
+        draws,
+        np.ones(50),
+        np.zeros(2, dtype=np.bool_),
+        False,
+        np.zeros(2),
+        0,
+    )
+
+    np.testing.assert_allclose(expected_value_function, 100)
+
+
+@pytest.mark.parametrize("model", ["kw_94_one", "kw_97_basic"])
+def test_backward_induction_with_control_variate_is_equal_to_loop_over_periods(model):
+    params, options = process_model_or_seed(model)
+    options = {
+        **options,
+        "monte_carlo_sequence": "antithetic",
+        "solution_control_variate": True,
+    }
+    optim_paras, options = process_params_and_options(params, options)
+
+    solve = get_solve_func(params, options)
+    state_space = solve(params)
+    expected = apply_to_attributes_of_two_state_spaces(
+        state_space.get_attribute("expected_value_functions"),
+        state_space.get_attribute("expected_value_functions"),
+        lambda x, _: x.copy(),
+    )
+
+    state_space = _solve_with_backward_induction(
+        state_space,
+        state_space._previous_solution["draws_emax_risk"],
+        np.ones(options["solution_draws"]),
+        calculate_expected_shocks(
+            optim_paras["shocks_cholesky"], len(optim_paras["choices_w_wage"])
+        ),
+        optim_paras,
+        options,
+        optim_paras["n_periods"] - 1,
+    )
+
+    apply_to_attributes_of_two_state_spaces(
+        state_space.get_attribute("expected_value_functions"),
+        expected,
+        np.testing.assert_allclose,
+    )
+
+
+def test_adaptive_draws_stop_early_and_stay_close_to_full_integration():
+    params, options = process_model_or_seed("kw_94_one")
+    options = {**options, "solution_draws": 200}
+
+    state_space = get_solve_func(params, options)(params)
+    assert state_space.solution_draws_statistics is None
+    expected = state_space.get_attribute("expected_value_functions").copy()
+
+    options = {
+        **options,
+        "solution_adaptive_tolerance": 0.01,
+        "solution_adaptive_block_size": 25,
+    }
+    state_space = get_solve_func(params, options)(params)
+    statistics = state_space.solution_draws_statistics
+
+    assert isinstance(statistics, pd.DataFrame)
+    assert statistics.index.name == "period"
+    assert (statistics["max"] <= options["solution_draws"]).all()
+    assert (statistics["min"] >= options["solution_adaptive_block_size"]).all()
+    np.testing.assert_allclose(
+        state_space.get_attribute("expected_value_functions"), expected, rtol=0.05
+    )
+
+
+def test_admissible_choices_are_compressed_rows_of_is_inadmissible():
+    params, options = process_model_or_seed("kw_97_basic")
+    options = {**options, "n_periods": 10}
+    state_space = get_solve_func(params, options)(params)
+
+    pointers = state_space.admissible_choices_pointers
+    states, choices = np.nonzero(~state_space.is_inadmissible)
+
+    assert state_space.is_inadmissible.any()
+    np.testing.assert_array_equal(
+        np.repeat(np.arange(pointers.shape[0] - 1), np.diff(pointers)), states
+    )
+    np.testing.assert_array_equal(state_space.admissible_choices, choices)
+
+
+@pytest.mark.parametrize("control_variate", [False, True])
+def test_skipping_inadmissible_choices_is_equal_to_a_dominating_penalty(
+    control_variate,
+):
+    params, options = process_model_or_seed("kw_97_basic")
+    options = {
+        **options,
+        "n_periods": 10,
+        "solution_draws": 100,
+        "solution_control_variate": control_variate,
+    }
+    state_space = get_solve_func(params, options)(params)
+    expected = apply_to_attributes_of_two_state_spaces(
+        state_space.get_attribute("expected_value_functions"),
+        state_space.get_attribute("expected_value_functions"),
+        lambda x, _: x.copy(),
+    )
+
+    options = {**options, "skip_inadmissible_choices": True}
+    state_space = get_solve_func(params, options)(params)
+
+    apply_to_attributes_of_two_state_spaces(
+        state_space.get_attribute("expected_value_functions"),
+        expected,
+        np.testing.assert_allclose,
+    )
+
+
+@pytest.mark.parametrize(
+    "model, interpolation_points",
+    [("kw_94_one", -1), ("kw_97_basic", -1), ("kw_94_one", 50)],
+)
+def test_solve_many_is_equal_to_solving_each_parameter_vector(
+    model, interpolation_points
+):
+    params, options = process_model_or_seed(model)
+    options = {**options, "interpolation_points": interpolation_points}
+    params_list = [params] + [
+        add_noise_to_params(params, options, seed=seed) for seed in range(2)
+    ]
+
+    solve = get_solve_func(params, options)
+    solution = solve_many(params_list, **solve.keywords)
+
+    for i, params_ in enumerate(params_list):
+        state_space = get_solve_func(params_, options)(params_)
+        for attribute in ["wages", "nonpecs", "expected_value_functions_w_sentinel"]:
+            expected = state_space.get_attribute(attribute)
+            if isinstance(expected, dict):
+                expected = np.stack(list(expected.values()))
+            np.testing.assert_array_equal(
+                solution[attribute][i].reshape(expected.shape), expected
+            )